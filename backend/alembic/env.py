@@ -12,6 +12,7 @@ from app.models.device import Device
 from app.models.employee import Employee
 from app.models.attendance import Attendance
 from app.models.network_log import NetworkLog
+from app.models.site import Site, EmployeeSite, DeviceSite
 from app.models.base import Base
 
 # this is the Alembic Config object, which provides
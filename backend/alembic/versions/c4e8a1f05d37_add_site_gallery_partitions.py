@@ -0,0 +1,57 @@
+"""add_site_gallery_partitions
+
+Revision ID: c4e8a1f05d37
+Revises: 42d521089533
+Create Date: 2026-10-17 14:03:51.402817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e8a1f05d37'
+down_revision = '42d521089533'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('sites',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('site_id', sa.String(50), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('allow_global_fallback', sa.Boolean(), nullable=False, server_default=sa.true()),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_sites_id'), 'sites', ['id'], unique=False)
+    op.create_index(op.f('ix_sites_site_id'), 'sites', ['site_id'], unique=True)
+
+    # Employees admitted at each site
+    op.create_table('employee_sites',
+        sa.Column('employee_id', sa.String(), nullable=False),
+        sa.Column('site_id', sa.String(50), nullable=False),
+        sa.ForeignKeyConstraint(['employee_id'], ['employees.employee_id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['site_id'], ['sites.site_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('employee_id', 'site_id')
+    )
+    op.create_index(op.f('ix_employee_sites_site_id'), 'employee_sites', ['site_id'], unique=False)
+
+    # Site of each kiosk
+    op.create_table('device_sites',
+        sa.Column('device_id', sa.String(), nullable=False),
+        sa.Column('site_id', sa.String(50), nullable=False),
+        sa.ForeignKeyConstraint(['device_id'], ['devices.device_id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['site_id'], ['sites.site_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('device_id')
+    )
+    op.create_index(op.f('ix_device_sites_site_id'), 'device_sites', ['site_id'], unique=False)
+
+def downgrade():
+    op.drop_index(op.f('ix_device_sites_site_id'), table_name='device_sites')
+    op.drop_table('device_sites')
+    op.drop_index(op.f('ix_employee_sites_site_id'), table_name='employee_sites')
+    op.drop_table('employee_sites')
+    op.drop_index(op.f('ix_sites_site_id'), table_name='sites')
+    op.drop_index(op.f('ix_sites_id'), table_name='sites')
+    op.drop_table('sites')
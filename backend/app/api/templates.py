@@ -10,6 +10,7 @@ import numpy as np
 from app.config.database import get_db
 from app.services.template_manager_service import TemplateManagerService
 from app.services.enhanced_recognition_service import get_enhanced_recognition_service
+from app.services.template_index import get_template_index
 from app.models.employee import Employee
 from app.models.face_template import FaceTemplate
 import io
@@ -379,6 +380,53 @@ async def update_recognition_thresholds(
         logger.error(f"Error updating thresholds: {e}")
         raise HTTPException(status_code=500, detail=f"Update error: {str(e)}")
 
+@router.get("/index")
+async def get_template_index_status(db: Session = Depends(get_db)):
+    """
+    Resident template index status
+    Compare the index version before/after an enrollment to confirm it was applied
+    """
+    try:
+        template_index = get_template_index()
+        template_index.ensure_loaded(db)
+        
+        stats = template_index.get_stats()
+        database_count = db.query(FaceTemplate).count()
+        
+        return {
+            "success": True,
+            "index": stats,
+            "database_templates": database_count,
+            "in_sync": stats["templates"] == database_count
+        }
+        
+    except Exception as e:
+        logger.error(f"Error getting template index status: {e}")
+        raise HTTPException(status_code=500, detail=f"Index error: {str(e)}")
+
+@router.post("/index/recall")
+async def measure_template_index_recall(
+    sample_size: int = 200,
+    noise: float = 0.3,
+    db: Session = Depends(get_db)
+):
+    """
+    Measure ANN recall against exact search on the resident templates
+    Run after changing MATCHER_BACKEND / ANN_TOP_K / HNSW_EF_SEARCH / IVF_NPROBE
+    """
+    try:
+        template_index = get_template_index()
+        template_index.ensure_loaded(db)
+
+        return {
+            "success": True,
+            "recall": template_index.measure_recall(sample_size=sample_size, noise=noise)
+        }
+
+    except Exception as e:
+        logger.error(f"Error measuring template index recall: {e}")
+        raise HTTPException(status_code=500, detail=f"Recall error: {str(e)}")
+
 @router.get("/health")
 async def template_system_health():
     """Check template system health"""
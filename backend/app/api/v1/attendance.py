@@ -1,18 +1,23 @@
 """
 API lấy lịch sử chấm công và nhận batch dữ liệu offline - Multi-Kiosk Optimized
 """
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Request
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Request, WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import Session
-from app.config.database import get_db
+from app.config.database import get_db, SessionLocal
 from app.models.attendance import Attendance
 from app.schemas.attendance import AttendanceOut
 from app.services.device_manager import get_device_manager, DeviceManager
-from app.config.multi_kiosk_config_fixed import get_device_upload_path
+from app.config.multi_kiosk_config_fixed import get_device_upload_path, multi_kiosk_settings
+from app.services.frame import Frame
+from app.services.face_tracker import get_face_tracker_registry
+from app.services.inference_executor import get_inference_executor
+from app.core.exceptions import InferenceTimeoutException
 import datetime
 import os
 import logging
 import time
 import asyncio
+from typing import List
 
 def format_vietnam_time(utc_datetime):
     """Convert UTC datetime to Vietnam timezone (UTC+7) and format"""
@@ -24,10 +29,41 @@ router = APIRouter()
 
 UPLOAD_DIR = './data/uploads/faces/originals/'
 
+def _save_attendance_image(device_id: str, image_data: bytes, timestamp: datetime.datetime) -> str:
+    """Store the kiosk's image in the device-specific upload directory"""
+    device_upload_dir = get_device_upload_path(device_id, UPLOAD_DIR)
+    os.makedirs(device_upload_dir, exist_ok=True)
+    
+    timestamp_str = timestamp.strftime("%Y%m%d_%H%M%S_%f")
+    file_path = os.path.join(device_upload_dir, f"attendance_{device_id}_{timestamp_str}.jpg")
+    with open(file_path, "wb") as f:
+        f.write(image_data)
+    return file_path
+
+def _log_attendance(db: Session, employee_id: str, device_id: str, similarity: float,
+                    timestamp: datetime.datetime, file_path: str, attendance_type: str) -> Attendance:
+    """Save an attendance record for a recognition that met the threshold"""
+    # Convert frontend attendance_type (IN/OUT) to database action_type (CHECK_IN/CHECK_OUT)
+    action_type = "CHECK_IN" if attendance_type.upper() == "IN" else "CHECK_OUT"
+    
+    # Save attendance record (remove fields not in model)
+    attendance = Attendance(
+        employee_id=employee_id,
+        device_id=device_id,
+        confidence=similarity,
+        timestamp=timestamp,
+        image_path=file_path,
+        action_type=action_type  # Use converted action_type
+    )
+    db.add(attendance)
+    db.commit()
+    db.refresh(attendance)
+    return attendance
+
 @router.post("/check")
 async def check_attendance(
     request: Request,
-    image: UploadFile = File(...),
+    image: List[UploadFile] = File(...),  # One frame, or a burst of up to BURST_MAX_FRAMES frames
     device_id: str = Form(...),
     attendance_type: str = Form(default="IN"),  # Frontend gửi IN/OUT
     db: Session = Depends(get_db),
@@ -35,6 +71,7 @@ async def check_attendance(
 ):
     """
     Multi-Kiosk Optimized Endpoint cho kiosk app để gửi ảnh và nhận kết quả chấm công
+    Several "image" fields form a burst: the server picks the best frame(s) to recognize
     """
     start_time = time.time()
     client_ip = request.client.host if request.client else "unknown"
@@ -54,47 +91,46 @@ async def check_attendance(
             # Debug logging
             logger.info(f"🎯 Processing request from device {device_id} at {client_ip}")
             logger.info(f"📝 Attendance type received: {attendance_type}")
-            logger.info(f"Received file: {image.filename}")
-            logger.info(f"Content type: {image.content_type}")
-            logger.info(f"File size: {image.size if hasattr(image, 'size') else 'Unknown'}")
+            logger.info(f"Received {len(image)} frame(s): {[upload.filename for upload in image]}")
             
-            # Validate image - allow files without content type or with image content type
-            if image.content_type and not image.content_type.startswith('image/'):
-                logger.error(f"Invalid content type: {image.content_type}")
-                raise HTTPException(status_code=400, detail="File must be an image")
+            if len(image) > multi_kiosk_settings.BURST_MAX_FRAMES:
+                raise HTTPException(status_code=400, detail=f"At most {multi_kiosk_settings.BURST_MAX_FRAMES} frames per request")
             
-            # If no content type, try to validate by reading the file
-            if not image.content_type:
-                logger.warning("No content type provided, will validate by file content")
+            # Validate image - allow files without content type or with image content type
+            for upload in image:
+                if upload.content_type and not upload.content_type.startswith('image/'):
+                    logger.error(f"Invalid content type: {upload.content_type}")
+                    raise HTTPException(status_code=400, detail="File must be an image")
+                
+                # If no content type, try to validate by reading the file
+                if not upload.content_type:
+                    logger.warning("No content type provided, will validate by file content")
             
             # Use enhanced face recognition with template system
             from app.services.enhanced_recognition_service import get_enhanced_recognition_service
-            import cv2
-            import numpy as np
             
             enhanced_recognition_service = get_enhanced_recognition_service()
             
-            # Convert uploaded image to OpenCV format
-            image_data = await image.read()
-            nparr = np.frombuffer(image_data, np.uint8)
-            camera_image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            if camera_image is None:
-                raise HTTPException(status_code=400, detail="Invalid image format")
+            # Decode once (large JPEGs at 1/2 or 1/4 scale); every stage reuses these frames
+            frames = []
+            for upload in image:
+                frame = Frame.from_bytes(await upload.read(), multi_kiosk_settings.DECODE_TARGET_SIDE)
+                if frame is None:
+                    raise HTTPException(status_code=400, detail="Invalid image format")
+                frames.append(frame)
             
-            # Save image to device-specific directory
-            device_upload_dir = get_device_upload_path(device_id, UPLOAD_DIR)
-            os.makedirs(device_upload_dir, exist_ok=True)
+            # Enhanced face recognition with template learning
+            # Only the device's site partition is searched (global fallback if the site allows it)
+            # Bursts: only the best-scored frame(s) go through anti-spoofing and embedding
+            recognition_result = await enhanced_recognition_service.recognize_burst(
+                db, frames, device_id=device_id
+            )
             
+            # Save the frame that was recognized to the device-specific directory
             timestamp = datetime.datetime.utcnow()
-            timestamp_str = timestamp.strftime("%Y%m%d_%H%M%S_%f")
-            file_path = os.path.join(device_upload_dir, f"attendance_{device_id}_{timestamp_str}.jpg")
-            
-            with open(file_path, "wb") as f:
-                f.write(image_data)
-            
-            # Enhanced face recognition with template learning
-            recognition_result = await enhanced_recognition_service.recognize_face(db, camera_image)
+            selected = recognition_result.get("burst", {}).get("selected", 0)
+            file_path = _save_attendance_image(device_id, frames[selected].data, timestamp)
+            burst_details = {"frames": len(frames), "selected": selected}
         
         # DEBUG: Always get employee info if available
         employee_info = recognition_result.get("employee")
@@ -111,25 +147,7 @@ async def check_attendance(
                 # High confidence - log attendance
                 logger.info(f"✅ High confidence recognition: {employee_id} with similarity {similarity:.3f}")
                 
-                # Get full employee information for attendance logging
-                from app.services.employee_service import get_employee
-                employee = get_employee(db, employee_id)
-                
-                # Convert frontend attendance_type (IN/OUT) to database action_type (CHECK_IN/CHECK_OUT)
-                action_type = "CHECK_IN" if attendance_type.upper() == "IN" else "CHECK_OUT"
-                
-                # Save attendance record (remove fields not in model)
-                attendance = Attendance(
-                    employee_id=employee_id,
-                    device_id=device_id,
-                    confidence=similarity,
-                    timestamp=timestamp,
-                    image_path=file_path,
-                    action_type=action_type  # Use converted action_type
-                )
-                db.add(attendance)
-                db.commit()
-                db.refresh(attendance)
+                attendance = _log_attendance(db, employee_id, device_id, similarity, timestamp, file_path, attendance_type)
                 
                 return {
                     "success": True,
@@ -143,7 +161,8 @@ async def check_attendance(
                     "recognition_details": {
                         "confidence_level": recognition_result.get("confidence_level", "HIGH"),
                         "template_id": recognition_result.get("template_id"),
-                        "is_primary": recognition_result.get("is_primary", False)
+                        "is_primary": recognition_result.get("is_primary", False),
+                        "burst": burst_details
                     }
                 }
             else:
@@ -162,7 +181,8 @@ async def check_attendance(
                         "threshold_met": False,
                         "employee_found": True,
                         "employee_id": employee_id,
-                        "threshold_required": threshold
+                        "threshold_required": threshold,
+                        "burst": burst_details
                     }
                 }
         
@@ -179,10 +199,19 @@ async def check_attendance(
                 "device_id": device_id,
                 "recognition_details": {
                     "best_similarity": recognition_result.get("best_similarity", 0.0),
-                    "confidence_level": "NONE"
+                    "confidence_level": "NONE",
+                    "burst": burst_details
                 }
             }
-        
+            if recognition_result.get("retake"):
+                # Rejected by the quality gate before the models ran - kiosk should capture again
+                response_data["retake"] = True
+                response_data["recognition_details"]["quality"] = {
+                    "stage": recognition_result.get("quality_stage"),
+                    "reason": recognition_result.get("reason"),
+                    "value": recognition_result.get("quality_value")
+                }
+
         # Update device statistics
         processing_time = time.time() - start_time
         await device_manager.update_device_stats(device_id, processing_time)
@@ -208,6 +237,154 @@ async def check_attendance(
         
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+def _track_decision(recognition_result: dict, frame: Frame, device_id: str, attendance_type: str) -> dict:
+    """
+    Settled outcome of a streamed face track; recognized employees are logged once, here
+    Blocking (image write + DB commit) - runs on the inference executor with a session of its own
+    """
+    if recognition_result.get("is_real") is False:
+        return {"status": "spoof", "message": recognition_result.get("message")}
+    
+    employee_id = recognition_result.get("employee_id")
+    similarity = recognition_result.get("similarity", 0.0)
+    if not recognition_result.get("recognized", False):
+        return {
+            "status": "low_confidence" if employee_id else "unknown",
+            "message": recognition_result.get("message", "Person not recognized"),
+            "similarity": similarity
+        }
+    
+    timestamp = datetime.datetime.utcnow()
+    file_path = _save_attendance_image(device_id, frame.data, timestamp)
+    db = SessionLocal()
+    try:
+        attendance = _log_attendance(db, employee_id, device_id, similarity, timestamp, file_path, attendance_type)
+    finally:
+        db.close()
+    logger.info(f"✅ Stream recognition: {employee_id} with similarity {similarity:.3f} on device {device_id}")
+    return {
+        "status": "recognized",
+        "message": "Chấm công thành công!",
+        "employee": recognition_result.get("employee"),
+        "attendance_id": attendance.id,
+        "timestamp": timestamp.isoformat(),
+        "formatted_time": format_vietnam_time(timestamp),
+        "similarity": similarity
+    }
+
+@router.websocket("/stream")
+async def stream_attendance(
+    websocket: WebSocket,
+    device_id: str,
+    attendance_type: str = "IN",
+    device_manager: DeviceManager = Depends(get_device_manager)
+):
+    """
+    Persistent kiosk channel: binary messages are low-resolution JPEG frames,
+    each processed frame is answered with one JSON message listing its face tracks
+    Faces are tracked across frames; full recognition runs once per track, on its
+    first frame that passes the quality gate, and later frames reuse the decision
+    Only the newest frame is processed - frames arriving meanwhile are dropped
+    No DB session is held for the stream's lifetime: each recognized track opens a
+    short-lived one, so idle kiosks don't pin connections of the pool
+    """
+    await websocket.accept()
+    client_ip = websocket.client.host if websocket.client else "unknown"
+    await device_manager.register_device(
+        device_id=device_id,
+        device_name=f"Kiosk_{device_id}",
+        ip_address=client_ip
+    )
+    
+    from app.services.enhanced_recognition_service import get_enhanced_recognition_service
+    enhanced_recognition_service = get_enhanced_recognition_service()
+    inference = get_inference_executor()
+    trackers = get_face_tracker_registry()
+    tracker = trackers.open(device_id)
+    logger.info(f"📡 Frame stream opened for device {device_id} at {client_ip}")
+    
+    latest = {"data": None, "closed": False}
+    frame_ready = asyncio.Event()
+    
+    async def receive_frames():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes"):
+                    latest["data"] = message["bytes"]
+                    frame_ready.set()
+        finally:
+            latest["closed"] = True
+            frame_ready.set()
+    
+    receiver = asyncio.ensure_future(receive_frames())
+    frame_id = 0
+    try:
+        while True:
+            await frame_ready.wait()
+            frame_ready.clear()
+            if latest["closed"]:
+                break
+            image_data, latest["data"] = latest["data"], None
+            if image_data is None:
+                continue
+            
+            start_time = time.time()
+            frame_id += 1
+            frame = Frame.from_bytes(image_data, multi_kiosk_settings.DECODE_TARGET_SIDE)
+            if frame is None:
+                await websocket.send_json({"type": "error", "frame_id": frame_id, "message": "Invalid image format"})
+                continue
+            
+            detections = await enhanced_recognition_service.detect_faces(frame)
+            faces = []
+            for track in tracker.update([bbox for bbox, _ in detections]):
+                cached = track.decision is not None
+                if cached:
+                    tracker.reused_decisions += 1
+                else:
+                    track.attempts += 1
+                    recognition_result = await enhanced_recognition_service.recognize_face(
+                        None, frame, bbox=list(track.bbox), device_id=device_id
+                    )
+                    if recognition_result.get("success") or recognition_result.get("is_real") is False:
+                        try:
+                            track.decision = await inference.run(
+                                "persist", _track_decision, recognition_result, frame, device_id, attendance_type
+                            )
+                            tracker.recognitions += 1
+                        except InferenceTimeoutException as e:
+                            recognition_result = {"message": e.message}
+                    if track.decision is None:
+                        # Quality rejection, timeout or error - retried on the track's next frame
+                        faces.append({
+                            **track.to_dict(),
+                            "status": "retake" if recognition_result.get("retake") else "pending",
+                            "message": recognition_result.get("message"),
+                            "cached": False
+                        })
+                        continue
+                faces.append({**track.to_dict(), **track.decision, "cached": cached})
+            
+            processing_time = time.time() - start_time
+            await device_manager.update_device_stats(device_id, processing_time)
+            await websocket.send_json({
+                "type": "frame",
+                "frame_id": frame_id,
+                "faces": faces,
+                "processing_time": round(processing_time, 3)
+            })
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Error in frame stream for device {device_id}: {e}")
+    finally:
+        receiver.cancel()
+        trackers.close(device_id, tracker)
+        logger.info(f"📡 Frame stream closed for device {device_id} ({frame_id} frames, {tracker.get_stats()})")
+
 @router.post("/upload")
 def upload_attendance(
     image: UploadFile = File(...),
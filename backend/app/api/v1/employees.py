@@ -15,6 +15,7 @@ from app.config.database import get_db
 from app.schemas.employee import EmployeeCreate, EmployeeOut
 from app.services.employee_service import create_employee, get_employees, get_employee, update_employee, delete_employee
 from app.services.enhanced_face_embedding_service import face_embedding_service
+from app.services.real_ai_service import get_ai_service
 from app.models.employee import Employee
 from app.models.face_template import FaceTemplate
 
@@ -75,7 +76,7 @@ async def create_employee_with_photo(
             )
             
             # Use local photo for face recognition processing
-            ai_service = RealAIService()
+            ai_service = get_ai_service()
             
             # Convert to numpy array for AI processing
             image_array = np.array(image)
@@ -383,7 +384,7 @@ async def upload_face(
         image_array = np.array(image)
         
         # Process face detection and embedding with enhanced AI
-        ai_service = RealAIService()
+        ai_service = get_ai_service()
         
         # Use optimized async processing
         result = await ai_service.process_recognition(image_array)
@@ -561,7 +562,7 @@ async def upload_additional_photo(
         )
         
         # Process with AI for face recognition
-        ai_service = RealAIService()
+        ai_service = get_ai_service()
         image_array = np.array(image)
         result = await ai_service.process_recognition(image_array)
         
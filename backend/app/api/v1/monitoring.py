@@ -4,6 +4,9 @@ API giám sát hệ thống nhiều kiosk devices
 """
 from fastapi import APIRouter, Depends, HTTPException
 from app.services.device_manager import get_device_manager, DeviceManager
+from app.services.real_ai_service import get_ai_service_pool_stats
+from app.services.model_registry import get_model_registry
+from app.services.face_tracker import get_face_tracker_registry
 from app.config.database import get_db
 from sqlalchemy.orm import Session
 from sqlalchemy import text
@@ -159,6 +162,9 @@ async def get_performance_metrics(device_manager: DeviceManager = Depends(get_de
                 "avg_response_time": device_stats["avg_response_time"],
                 "total_requests": device_stats["total_requests"],
                 "requests_per_minute": _calculate_rpm(device_stats),
+                "ai_service_pool": get_ai_service_pool_stats(),
+                "models": get_model_registry().get_stats(),
+                "streams": get_face_tracker_registry().get_stats(),
                 "system_load": {
                     "cpu": psutil.cpu_percent(),
                     "memory": psutil.virtual_memory().percent,
@@ -6,8 +6,8 @@ from sqlalchemy.orm import Session
 from app.config.database import get_db
 from app.services.enhanced_recognition_service import get_enhanced_recognition_service
 from app.services.real_ai_service import get_ai_service
-import cv2
-import numpy as np
+from app.config.multi_kiosk_config_fixed import multi_kiosk_settings
+from app.services.frame import Frame
 import logging
 
 logger = logging.getLogger(__name__)
@@ -29,15 +29,14 @@ async def recognize_face(
         # Read image data
         image_data = await image.read()
         
-        # Convert to OpenCV format
-        nparr = np.frombuffer(image_data, np.uint8)
-        camera_image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        # Decode once (large JPEGs at 1/2 or 1/4 scale); every stage reuses this frame
+        frame = Frame.from_bytes(image_data, multi_kiosk_settings.DECODE_TARGET_SIDE)
         
-        if camera_image is None:
+        if frame is None:
             raise HTTPException(status_code=400, detail="Invalid image format")
         
         # Use enhanced recognition service with template system
-        result = await enhanced_recognition_service.recognize_face(db, camera_image)
+        result = await enhanced_recognition_service.recognize_face(db, frame)
         
         # Add device context
         result["device_id"] = device_id
@@ -62,16 +61,15 @@ async def register_face(
         # Read image data
         image_data = await image.read()
         
-        # Convert to OpenCV format
-        nparr = np.frombuffer(image_data, np.uint8)
-        camera_image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        # Decode once at full resolution - enrollment quality matters more than speed
+        frame = Frame.from_bytes(image_data)
         
-        if camera_image is None:
+        if frame is None:
             raise HTTPException(status_code=400, detail="Invalid image format")
         
         # Use enhanced recognition service for registration
         result = await enhanced_recognition_service.register_face(
-            db, camera_image, employee_id, device_id
+            db, frame, employee_id, device_id
         )
         
         if not result.get("success"):
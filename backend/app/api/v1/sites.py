@@ -0,0 +1,147 @@
+"""
+Site / Device Group API
+Gán nhân viên và kiosk vào từng site để mỗi kiosk chỉ so khớp với gallery của site đó
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from app.config.database import get_db
+from app.models.site import Site, EmployeeSite, DeviceSite
+from app.services.gallery_partitions import get_gallery_partitions
+from typing import List, Optional
+from pydantic import BaseModel
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+class SiteCreateRequest(BaseModel):
+    site_id: str
+    name: Optional[str] = None
+    allow_global_fallback: bool = True
+
+class SiteEmployeesRequest(BaseModel):
+    employee_ids: List[str]
+
+class SiteDevicesRequest(BaseModel):
+    device_ids: List[str]
+
+def _get_site_or_404(db: Session, site_id: str) -> Site:
+    site = db.query(Site).filter(Site.site_id == site_id).first()
+    if not site:
+        raise HTTPException(status_code=404, detail=f"Site {site_id} not found")
+    return site
+
+@router.get("/")
+async def list_sites(db: Session = Depends(get_db)):
+    """List sites with their employee and device counts"""
+    try:
+        employee_counts = dict(
+            db.query(EmployeeSite.site_id, func.count(EmployeeSite.employee_id))
+            .group_by(EmployeeSite.site_id).all()
+        )
+        device_counts = dict(
+            db.query(DeviceSite.site_id, func.count(DeviceSite.device_id))
+            .group_by(DeviceSite.site_id).all()
+        )
+
+        return {
+            "success": True,
+            "sites": [
+                {
+                    "site_id": site.site_id,
+                    "name": site.name,
+                    "allow_global_fallback": site.allow_global_fallback,
+                    "employees": employee_counts.get(site.site_id, 0),
+                    "devices": device_counts.get(site.site_id, 0)
+                }
+                for site in db.query(Site).order_by(Site.site_id).all()
+            ]
+        }
+
+    except Exception as e:
+        logger.error(f"List sites error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/")
+async def create_site(request: SiteCreateRequest, db: Session = Depends(get_db)):
+    """Create a site (or update its name / fallback policy)"""
+    try:
+        site = db.query(Site).filter(Site.site_id == request.site_id).first()
+        if site is None:
+            site = Site(site_id=request.site_id)
+            db.add(site)
+        site.name = request.name
+        site.allow_global_fallback = request.allow_global_fallback
+        db.commit()
+        get_gallery_partitions().invalidate()
+
+        return {"success": True, "site_id": site.site_id}
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Create site error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.put("/{site_id}/employees")
+async def set_site_employees(site_id: str, request: SiteEmployeesRequest, db: Session = Depends(get_db)):
+    """Replace the employees admitted at a site"""
+    try:
+        _get_site_or_404(db, site_id)
+        db.query(EmployeeSite).filter(EmployeeSite.site_id == site_id).delete(synchronize_session=False)
+        db.add_all(EmployeeSite(employee_id=employee_id, site_id=site_id) for employee_id in set(request.employee_ids))
+        db.commit()
+        get_gallery_partitions().invalidate()
+
+        logger.info(f"✅ Site {site_id}: {len(set(request.employee_ids))} employees assigned")
+        return {"success": True, "site_id": site_id, "employees": len(set(request.employee_ids))}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Assign site employees error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.put("/{site_id}/devices")
+async def set_site_devices(site_id: str, request: SiteDevicesRequest, db: Session = Depends(get_db)):
+    """Assign kiosks to a site (a device belongs to one site)"""
+    try:
+        _get_site_or_404(db, site_id)
+        device_ids = set(request.device_ids)
+        db.query(DeviceSite).filter(
+            (DeviceSite.site_id == site_id) | (DeviceSite.device_id.in_(device_ids))
+        ).delete(synchronize_session=False)
+        db.add_all(DeviceSite(device_id=device_id, site_id=site_id) for device_id in device_ids)
+        db.commit()
+        get_gallery_partitions().invalidate()
+
+        logger.info(f"✅ Site {site_id}: {len(device_ids)} devices assigned")
+        return {"success": True, "site_id": site_id, "devices": len(device_ids)}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Assign site devices error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/{site_id}")
+async def delete_site(site_id: str, db: Session = Depends(get_db)):
+    """Delete a site; its devices go back to the global gallery"""
+    try:
+        site = _get_site_or_404(db, site_id)
+        db.query(EmployeeSite).filter(EmployeeSite.site_id == site_id).delete(synchronize_session=False)
+        db.query(DeviceSite).filter(DeviceSite.site_id == site_id).delete(synchronize_session=False)
+        db.delete(site)
+        db.commit()
+        get_gallery_partitions().invalidate()
+
+        return {"success": True, "site_id": site_id}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Delete site error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -45,6 +45,53 @@ class MultiKioskSettings(BaseSettings):
     AI_SERVICE_POOL_SIZE: int = Field(default=3, env="AI_SERVICE_POOL_SIZE")
     RECOGNITION_TIMEOUT_SECONDS: int = Field(default=15, env="RECOGNITION_TIMEOUT_SECONDS")
     TEMPLATE_CACHE_SIZE: int = Field(default=1000, env="TEMPLATE_CACHE_SIZE")
+    EMPLOYEE_CACHE_SIZE: int = Field(default=5000, env="EMPLOYEE_CACHE_SIZE")
+    EMPLOYEE_CACHE_TTL_SECONDS: int = Field(default=300, env="EMPLOYEE_CACHE_TTL_SECONDS")  # Bounds staleness across workers
+    MICRO_BATCH_ENABLED: bool = Field(default=True, env="MICRO_BATCH_ENABLED")  # Batch concurrent kiosk requests
+    MICRO_BATCH_WINDOW_MS: float = Field(default=10.0, env="MICRO_BATCH_WINDOW_MS")  # Max wait to fill a batch
+    MICRO_BATCH_MAX_SIZE: int = Field(default=16, env="MICRO_BATCH_MAX_SIZE")
+    PIPELINED_RECOGNITION: bool = Field(default=True, env="PIPELINED_RECOGNITION")  # Anti-spoof concurrently with embed + match
+    INFERENCE_WORKER_PROCESSES: int = Field(default=0, env="INFERENCE_WORKER_PROCESSES")  # 0 = models in the API process
+    INFERENCE_SHM_SLOTS: int = Field(default=32, env="INFERENCE_SHM_SLOTS")  # Shared-memory frame slots
+    INFERENCE_SHM_SLOT_MB: int = Field(default=8, env="INFERENCE_SHM_SLOT_MB")  # Fits a 1080p BGR frame
+    MODEL_PROFILE: str = Field(default="fp32", env="MODEL_PROFILE")  # fp32 | int8 (built by app.services.model_quantization)
+    QUANTIZED_MIN_COSINE_AGREEMENT: float = Field(default=0.98, env="QUANTIZED_MIN_COSINE_AGREEMENT")  # INT8 vs FP32 embeddings
+    
+    # === FRAME QUALITY GATE ===
+    QUALITY_GATE_ENABLED: bool = Field(default=True, env="QUALITY_GATE_ENABLED")  # Reject bad frames before the models
+    QUALITY_ANALYSIS_WIDTH: int = Field(default=320, env="QUALITY_ANALYSIS_WIDTH")  # Longer side of the downscaled view checked
+    QUALITY_MIN_BRIGHTNESS: float = Field(default=40.0, env="QUALITY_MIN_BRIGHTNESS")  # Mean gray level 0-255
+    QUALITY_MAX_BRIGHTNESS: float = Field(default=230.0, env="QUALITY_MAX_BRIGHTNESS")
+    QUALITY_MIN_SHARPNESS: float = Field(default=25.0, env="QUALITY_MIN_SHARPNESS")  # Laplacian variance at analysis width
+    QUALITY_MIN_FACE_PX: int = Field(default=48, env="QUALITY_MIN_FACE_PX")  # Shorter face box side, decoded-frame pixels
+    DECODE_TARGET_SIDE: int = Field(default=960, env="DECODE_TARGET_SIDE")  # JPEGs decoded at 1/2 or 1/4 down to this; 0 = full
+    ADAPTIVE_DETECTOR_SIZE: bool = Field(default=True, env="ADAPTIVE_DETECTOR_SIZE")  # Smallest detector input that finds min-size faces
+    BURST_MAX_FRAMES: int = Field(default=8, env="BURST_MAX_FRAMES")  # Frames accepted per /attendance/check request
+    BURST_RECOGNITION_ATTEMPTS: int = Field(default=2, env="BURST_RECOGNITION_ATTEMPTS")  # Best frames given the full models
+    
+    # === KIOSK FRAME STREAMING ===
+    STREAM_TRACK_IOU_THRESHOLD: float = Field(default=0.3, env="STREAM_TRACK_IOU_THRESHOLD")  # Box overlap that continues a track
+    STREAM_TRACK_MAX_AGE_SECONDS: float = Field(default=1.5, env="STREAM_TRACK_MAX_AGE_SECONDS")  # Unseen longer -> track dropped
+    
+    # === TEMPLATE MATCHING ===
+    MATCHER_BACKEND: str = Field(default="exact", env="MATCHER_BACKEND")  # exact | hnsw | ivf
+    ANN_TOP_K: int = Field(default=64, env="ANN_TOP_K")  # Candidates re-ranked exactly
+    ANN_MIN_TEMPLATES: int = Field(default=20000, env="ANN_MIN_TEMPLATES")  # Exact search below this size
+    HNSW_M: int = Field(default=32, env="HNSW_M")
+    HNSW_EF_CONSTRUCTION: int = Field(default=200, env="HNSW_EF_CONSTRUCTION")
+    HNSW_EF_SEARCH: int = Field(default=128, env="HNSW_EF_SEARCH")
+    IVF_NLIST: int = Field(default=1024, env="IVF_NLIST")
+    IVF_NPROBE: int = Field(default=16, env="IVF_NPROBE")
+    INDEX_STORAGE_DTYPE: str = Field(default="float32", env="INDEX_STORAGE_DTYPE")  # float32 | float16 | int8
+    INDEX_RERANK_TOP_K: int = Field(default=0, env="INDEX_RERANK_TOP_K")  # >0 keeps a float32 copy for re-ranking
+    TEMPLATE_SNAPSHOT_ENABLED: bool = Field(default=True, env="TEMPLATE_SNAPSHOT_ENABLED")  # Share index across workers
+    EMBEDDINGS_CACHE_PATH: str = Field(default="data/embeddings/cache", env="EMBEDDINGS_CACHE_PATH")
+    TEMPLATE_SNAPSHOT_POLL_SECONDS: float = Field(default=1.0, env="TEMPLATE_SNAPSHOT_POLL_SECONDS")
+    TEMPLATE_SNAPSHOT_MAX_CHANGES: int = Field(default=500, env="TEMPLATE_SNAPSHOT_MAX_CHANGES")  # Change-log versions before a rewrite
+    
+    # === GALLERY PARTITIONS ===
+    GALLERY_PARTITIONS_ENABLED: bool = Field(default=True, env="GALLERY_PARTITIONS_ENABLED")  # Per-site search
+    GALLERY_PARTITION_REFRESH_SECONDS: int = Field(default=60, env="GALLERY_PARTITION_REFRESH_SECONDS")
     
     # === MONITORING ===
     ENABLE_DEVICE_MONITORING: bool = Field(default=True, env="ENABLE_DEVICE_MONITORING")
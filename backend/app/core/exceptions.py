@@ -50,6 +50,16 @@ class FaceRecognitionException(FaceAttendanceException):
     pass
 
 
+class InferenceTimeoutException(FaceRecognitionException):
+    """A recognition stage did not finish within RECOGNITION_TIMEOUT_SECONDS"""
+    pass
+
+
+class FrameQualityException(FaceRecognitionException):
+    """Frame rejected by the quality gate before the models ran - the kiosk should retake"""
+    pass
+
+
 class DeviceException(FaceAttendanceException):
     """Device related exceptions"""
     pass
@@ -124,6 +134,7 @@ class ErrorCodes:
     MULTIPLE_FACES_DETECTED = "MULTIPLE_FACES_DETECTED"
     FACE_RECOGNITION_FAILED = "FACE_RECOGNITION_FAILED"
     LOW_RECOGNITION_CONFIDENCE = "LOW_RECOGNITION_CONFIDENCE"
+    LOW_FRAME_QUALITY = "LOW_FRAME_QUALITY"
     
     # Device errors
     DEVICE_NOT_FOUND = "DEVICE_NOT_FOUND"
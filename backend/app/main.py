@@ -5,10 +5,12 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
-from app.api.v1 import employees, devices, attendance, auth, network, recognition, discovery, monitoring, device_management
+from app.api.v1 import employees, devices, attendance, auth, network, recognition, discovery, monitoring, device_management, sites
 from app.api import templates
 from app.config.database import test_connection
 from app.services.device_manager import device_manager
+from app.services.inference_executor import get_inference_executor
+from app.services.inference_workers import get_inference_worker_pool
 import logging
 import os
 from pathlib import Path
@@ -28,12 +30,17 @@ async def startup_event():
     # Start device manager cleanup task
     await device_manager.start_cleanup_task(interval_minutes=1)
     logger.info("✅ Device manager initialized")
+    
+    # Model-serving worker processes (INFERENCE_WORKER_PROCESSES > 0)
+    get_inference_worker_pool().start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("🛑 Shutting down Multi-Kiosk Face Attendance System...")
     await device_manager.stop_cleanup_task()
+    get_inference_worker_pool().shutdown()
+    get_inference_executor().shutdown()
     logger.info("✅ Cleanup completed")
 
 @app.get("/health")
@@ -84,6 +91,7 @@ app.include_router(recognition.router, prefix="/api/v1/recognition", tags=["Reco
 app.include_router(discovery.router, prefix="/api/v1/discovery", tags=["Discovery"])
 app.include_router(monitoring.router, prefix="/api/v1/monitoring", tags=["System Monitoring"])
 app.include_router(device_management.router, prefix="/api/v1/device-management", tags=["Device Management"])
+app.include_router(sites.router, prefix="/api/v1/sites", tags=["Sites"])
 
 # Include new Template Management API
 app.include_router(templates.router, tags=["Template Management"])
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, true
+from app.models.base import Base
+import datetime
+
+class Site(Base):
+    """Site / device group with its own gallery partition"""
+    __tablename__ = "sites"
+
+    id = Column(Integer, primary_key=True, index=True)
+    site_id = Column(String(50), unique=True, index=True, nullable=False)
+    name = Column(String, nullable=True)
+    # Retry against the whole company gallery when the site partition has no match
+    allow_global_fallback = Column(Boolean, nullable=False, default=True, server_default=true())
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class EmployeeSite(Base):
+    """Employees admitted at a site; employees with no rows are admitted everywhere"""
+    __tablename__ = "employee_sites"
+
+    employee_id = Column(String, ForeignKey("employees.employee_id", ondelete="CASCADE"), primary_key=True)
+    site_id = Column(String(50), ForeignKey("sites.site_id", ondelete="CASCADE"), primary_key=True, index=True)
+
+class DeviceSite(Base):
+    """Site a kiosk belongs to; devices with no row search the global gallery"""
+    __tablename__ = "device_sites"
+
+    device_id = Column(String, ForeignKey("devices.device_id", ondelete="CASCADE"), primary_key=True)
+    site_id = Column(String(50), ForeignKey("sites.site_id", ondelete="CASCADE"), nullable=False, index=True)
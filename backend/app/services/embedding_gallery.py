@@ -0,0 +1,83 @@
+"""
+Embedding Gallery
+Pre-stacked embedding matrix with per-employee segments for vectorized
+top-k matching (argpartition + segment max, no Python-level sorting)
+"""
+import numpy as np
+from typing import List, Sequence, Tuple
+
+def top_k_indices(values: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest values, best first - O(n + k log k)"""
+    n = len(values)
+    if n == 0 or k <= 0:
+        return np.empty(0, dtype=np.int64)
+    k = min(k, n)
+    top = np.argpartition(values, n - k)[n - k:]
+    return top[np.argsort(values[top])[::-1]]
+
+def group_segments(codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Group rows by integer code
+    Returns: (order, segment_starts, segment_codes) - rows[order] are contiguous per code
+    """
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    if len(sorted_codes) == 0:
+        return order, np.empty(0, dtype=np.int64), sorted_codes
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    return order, starts, sorted_codes[starts]
+
+def segment_max(values: np.ndarray, segment_starts: np.ndarray) -> np.ndarray:
+    """Max of each contiguous segment of values (rows grouped by group_segments)"""
+    if len(segment_starts) == 0:
+        return np.empty(0, dtype=values.dtype)
+    return np.maximum.reduceat(values, segment_starts)
+
+class EmbeddingGallery:
+    """
+    Normalized embeddings stacked once, grouped by employee
+    Build it when the embeddings change and reuse it for every query
+    """
+
+    def __init__(self, ids: Sequence[str], embeddings):
+        matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        labels, codes = np.unique(np.asarray(ids), return_inverse=True)
+        order, starts, _ = group_segments(codes)
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+
+        self.labels = labels
+        self.matrix = np.ascontiguousarray(matrix[order] / norms[order])
+        self.segment_starts = starts
+
+    @classmethod
+    def from_pairs(cls, pairs: Sequence[Tuple[str, np.ndarray]]) -> "EmbeddingGallery":
+        """Build from (id, embedding) tuples"""
+        return cls([pair[0] for pair in pairs], [pair[1] for pair in pairs])
+
+    def __len__(self) -> int:
+        return len(self.matrix)
+
+    def top_k(self, query_embedding: np.ndarray, k: int = 1,
+              threshold: float = 0.0) -> List[Tuple[str, float]]:
+        """
+        Employee-level top-k: best template score per employee, best first
+        Returns: [(id, similarity)] with similarity >= threshold
+        """
+        if len(self.matrix) == 0:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+
+        # Clamped like CosineSimilarityCalculator
+        similarities = np.clip(self.matrix @ (query / norm), 0.0, 1.0)
+        employee_best = segment_max(similarities, self.segment_starts)
+
+        return [
+            (str(self.labels[i]), float(employee_best[i]))
+            for i in top_k_indices(employee_best, k)
+            if employee_best[i] >= threshold
+        ]
@@ -0,0 +1,139 @@
+"""
+Employee Cache
+Read-through cache of employee display records used in recognition responses
+"""
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+from sqlalchemy.orm import Session
+from app.models.employee import Employee
+from app.config.multi_kiosk_config_fixed import multi_kiosk_settings
+
+logger = logging.getLogger(__name__)
+
+class EmployeeRecord:
+    """Detached display fields of an employee - safe to share across sessions"""
+
+    __slots__ = ("employee_id", "name", "department", "position", "email", "avatar_url")
+
+    def __init__(self, employee_id: str, name: str, department: Optional[str],
+                 position: Optional[str], email: Optional[str]):
+        self.employee_id = employee_id
+        self.name = name
+        self.department = department
+        self.position = position
+        self.email = email
+        self.avatar_url = f"/api/v1/employees/{employee_id}/photo"
+
+    def to_dict(self) -> Dict:
+        return {
+            "employee_id": self.employee_id,
+            "name": self.name,
+            "department": self.department or "N/A",
+            "position": self.position or "N/A",
+            "email": self.email or "N/A",
+            "avatar_url": self.avatar_url
+        }
+
+class EmployeeCache:
+    """
+    LRU cache of EmployeeRecord keyed by employee_id
+    - Invalidated by EmployeeService.update_employee / delete_employee
+    - Entries expire after EMPLOYEE_CACHE_TTL_SECONDS so edits made through
+      another worker process show up without a restart
+    """
+
+    def __init__(self, max_size: int = 5000, ttl_seconds: int = 300):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._records: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, employee_id: str, now: float) -> Optional[EmployeeRecord]:
+        entry = self._records.get(employee_id)
+        if entry is None:
+            return None
+        record, loaded_at = entry
+        if now - loaded_at > self.ttl_seconds:
+            del self._records[employee_id]
+            return None
+        self._records.move_to_end(employee_id)
+        return record
+
+    def get(self, db: Session, employee_id: str) -> Optional[EmployeeRecord]:
+        """Employee display record, loaded from the database on a miss"""
+        return self.get_many(db, [employee_id]).get(employee_id)
+
+    def get_many(self, db: Session, employee_ids: Iterable[str]) -> Dict[str, EmployeeRecord]:
+        """Records for several employees; all misses are loaded with one query"""
+        now = time.monotonic()
+        found: Dict[str, EmployeeRecord] = {}
+        missing = []
+        with self._lock:
+            for employee_id in set(employee_ids):
+                record = self._lookup(employee_id, now)
+                if record is None:
+                    missing.append(employee_id)
+                else:
+                    found[employee_id] = record
+            self.hits += len(found)
+            self.misses += len(missing)
+
+        if not missing:
+            return found
+
+        rows = db.query(
+            Employee.employee_id,
+            Employee.name,
+            Employee.department,
+            Employee.position,
+            Employee.email
+        ).filter(Employee.employee_id.in_(missing)).all()
+
+        with self._lock:
+            for row in rows:
+                record = EmployeeRecord(*row)
+                found[record.employee_id] = record
+                self._records[record.employee_id] = (record, now)
+                self._records.move_to_end(record.employee_id)
+            while len(self._records) > self.max_size:
+                self._records.popitem(last=False)
+
+        return found
+
+    def invalidate(self, employee_id: Optional[str] = None):
+        """Drop one employee (or everything) from the cache"""
+        with self._lock:
+            if employee_id is None:
+                self._records.clear()
+            else:
+                self._records.pop(employee_id, None)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._records),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0
+            }
+
+# Singleton instance
+_employee_cache = None
+
+def get_employee_cache() -> EmployeeCache:
+    """Get process-wide employee cache"""
+    global _employee_cache
+    if _employee_cache is None:
+        _employee_cache = EmployeeCache(
+            max_size=multi_kiosk_settings.EMPLOYEE_CACHE_SIZE,
+            ttl_seconds=multi_kiosk_settings.EMPLOYEE_CACHE_TTL_SECONDS
+        )
+    return _employee_cache
@@ -7,6 +7,7 @@ from fastapi import HTTPException
 from app.models.employee import Employee
 from app.schemas.employee import EmployeeCreate
 from app.utils.id_generator import generate_employee_id, validate_employee_id
+from app.services.employee_cache import get_employee_cache
 import logging
 
 logger = logging.getLogger(__name__)
@@ -92,6 +93,7 @@ class EmployeeService:
             db_employee.phone = employee.phone
             db_employee.position = employee.position
             db.commit()
+            get_employee_cache().invalidate(employee_id)
             db.refresh(db_employee)
             logger.info(f"Updated employee: {employee_id}")
             return db_employee
@@ -125,6 +127,7 @@ class EmployeeService:
             # Now delete the employee
             db.delete(db_employee)
             db.commit()
+            get_employee_cache().invalidate(employee_id)
             
             logger.info(f"Successfully deleted employee {employee_id} and all related data")
             return {
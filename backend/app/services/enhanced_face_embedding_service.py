@@ -24,6 +24,7 @@ except ImportError:
 
 from app.models.face_template import FaceTemplate
 from app.models.employee import Employee
+from app.utils.embedding_codec import embedding_columns, store_embedding
 from app.config.database import get_db
 
 logger = logging.getLogger(__name__)
@@ -35,25 +36,21 @@ class FaceEmbeddingService:
         self.base_photos_dir = Path("C:/Users/ADMIN/.vscode/face-attendace-system/backend/data/employee_photos")
         self.base_photos_dir.mkdir(parents=True, exist_ok=True)
         
-        # Initialize face analysis model
-        self.face_analyzer = None
-        self._init_face_analyzer()
-    
-    def _init_face_analyzer(self):
-        """Initialize InsightFace model for face embedding"""
-        if INSIGHTFACE_AVAILABLE:
-            try:
-                self.face_analyzer = FaceAnalysis(
-                    providers=['CPUExecutionProvider'],  # Use CPU for now
-                    allowed_modules=['detection', 'recognition']
-                )
-                self.face_analyzer.prepare(ctx_id=0, det_size=(640, 640))
-                logger.info("InsightFace model loaded successfully")
-            except Exception as e:
-                logger.error(f"Failed to load InsightFace model: {e}")
-                self.face_analyzer = None
-        else:
-            logger.warning("InsightFace not available. Face embedding will use dummy data.")
+    @property
+    def face_analyzer(self):
+        """
+        InsightFace model shared with recognition (via the model registry), so
+        enrollment and recognition embeddings come from the same model instance
+        Loaded on first use instead of at import time
+        """
+        if not INSIGHTFACE_AVAILABLE:
+            return None
+        try:
+            from app.services.real_ai_service import get_ai_service
+            return get_ai_service().face_recognizer
+        except Exception as e:
+            logger.error(f"Failed to load InsightFace model: {e}")
+            return None
     
     def get_employee_photo_dir(self, employee_id: str) -> Path:
         """Get the photo directory for a specific employee"""
@@ -257,7 +254,7 @@ class FaceEmbeddingService:
                     image_id=result['image_id'],
                     filename=result['filename'],
                     file_path=result['file_path'],
-                    embedding_vector=result['embedding'],
+                    **embedding_columns(FaceTemplate, result['embedding']),
                     is_primary=result['is_primary'],
                     created_from='ADMIN_UPLOAD',
                     quality_score=result['quality_score'],
@@ -363,7 +360,7 @@ class FaceEmbeddingService:
             image_id=result['image_id'],
             filename=result['filename'],
             file_path=result['file_path'],
-            embedding_vector=result['embedding'],
+            **embedding_columns(FaceTemplate, result['embedding']),
             is_primary=result['is_primary'],
             created_from='ADMIN_UPLOAD',
             quality_score=result['quality_score'],
@@ -379,7 +376,7 @@ class FaceEmbeddingService:
         # Update template fields
         template.filename = result['filename']
         template.file_path = result['file_path']
-        template.embedding_vector = result['embedding']
+        store_embedding(template, result['embedding'])
         template.quality_score = result['quality_score']
         template.confidence_score = result['confidence_score']
         template.updated_at = datetime.datetime.utcnow()
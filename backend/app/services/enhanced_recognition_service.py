@@ -6,12 +6,25 @@ import numpy as np
 import cv2
 import os
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Union
 from sqlalchemy.orm import Session
 from app.models.face_template import FaceTemplate
 from app.models.employee import Employee
+from app.config.database import SessionLocal
+from app.utils.embedding_codec import embedding_columns
 from app.services.enhanced_face_embedding_service import face_embedding_service as template_manager
-from app.services.real_ai_service import get_ai_service
+from app.services.real_ai_service import get_ai_service, get_ai_service_pool, get_ai_service_pool_stats
+from app.services.template_index import get_template_index
+from app.services.gallery_partitions import GalleryPartition, get_gallery_partitions
+from app.services.employee_cache import get_employee_cache
+from app.services.inference_executor import get_inference_executor
+from app.services.inference_batcher import create_micro_batcher
+from app.services.inference_workers import get_inference_worker_pool
+from app.services.quality_gate import QualityGate, get_quality_gate
+from app.services.frame import Frame, as_frame, get_frame_stats
+from app.config.multi_kiosk_config_fixed import multi_kiosk_settings
+from app.core.exceptions import InferenceTimeoutException, FrameQualityException, ErrorCodes
+import asyncio
 import logging
 import datetime
 
@@ -26,8 +39,25 @@ class EnhancedRecognitionService:
     """
     
     def __init__(self):
-        self.ai_service = get_ai_service()
         self.template_manager = template_manager
+        self.template_index = get_template_index()
+        self.gallery_partitions = get_gallery_partitions()
+        self.employee_cache = get_employee_cache()
+        self.inference = get_inference_executor()
+        self.worker_pool = get_inference_worker_pool()
+        self.quality_gate = get_quality_gate()
+        self.frame_stats = get_frame_stats()
+        
+        # Cross-kiosk micro-batching: concurrent requests share one forward pass
+        self.micro_batching = multi_kiosk_settings.MICRO_BATCH_ENABLED
+        self.spoof_batcher = create_micro_batcher(
+            "anti_spoof", lambda items: self._pooled("batch_anti_spoofing", [frame for frame, _ in items], [bbox for _, bbox in items])
+        )
+        self.embedding_batcher = create_micro_batcher("embed", lambda faces: self._pooled("embed_faces", faces))
+        
+        # Anti-spoofing concurrently with embedding + matching (in-process models)
+        self.pipelined = multi_kiosk_settings.PIPELINED_RECOGNITION
+        self.pipeline_stats = {"pipelined": 0, "cancelled_on_spoof": 0}
         
         # Recognition thresholds - LOWERED FOR TESTING
         self.RECOGNITION_THRESHOLD = 0.6  # Lowered from 0.75
@@ -42,9 +72,22 @@ class EnhancedRecognitionService:
         self.uploads_dir = Path("data/uploads")
         self.uploads_dir.mkdir(parents=True, exist_ok=True)
     
-    def _save_recognition_image(self, image: np.ndarray, employee_id: str = None, 
+    @property
+    def ai_service(self):
+        """
+        In-process models, loaded on first use
+        With the inference worker pool running, recognition never touches them
+        """
+        return get_ai_service()
+    
+    def _pooled(self, method: str, *args):
+        """Call a model method on an instance checked out of the AI service pool (blocking)"""
+        with get_ai_service_pool().checkout() as ai_service:
+            return getattr(ai_service, method)(*args)
+    
+    def _save_recognition_image(self, image: Union[np.ndarray, Frame], employee_id: str = None, 
                                similarity: float = None) -> str:
-        """Save recognition image with timestamp and info"""
+        """Save recognition image with timestamp and info (uploaded bytes as-is when available)"""
         try:
             timestamp = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%S_%f")[:-3]
             if employee_id and similarity:
@@ -53,7 +96,12 @@ class EnhancedRecognitionService:
                 filename = f"recognition_unknown_{timestamp}.jpg"
             
             filepath = self.uploads_dir / filename
-            cv2.imwrite(str(filepath), image)
+            frame = as_frame(image)
+            if frame.data is not None:
+                # Already-encoded upload - no re-encode
+                filepath.write_bytes(frame.data)
+            else:
+                cv2.imwrite(str(filepath), frame.image)
             
             logger.info(f"💾 Saved recognition image: {filename}")
             return str(filepath)
@@ -62,27 +110,38 @@ class EnhancedRecognitionService:
             logger.error(f"Failed to save image: {e}")
             return ""
     
-    async def recognize_face(self, db: Session, face_image: np.ndarray, 
-                           bbox: Optional[List[int]] = None) -> Dict:
+    async def recognize_face(self, db: Optional[Session], face_image: Union[np.ndarray, Frame], 
+                           bbox: Optional[List[int]] = None,
+                           device_id: Optional[str] = None) -> Dict:
         """
         Recognize face using rolling template system with anti-spoofing check
+        If the device belongs to a site, only that site's gallery partition is searched
+        Every stage runs on the inference executor so the event loop stays responsive
+        All stages share one Frame: the image is decoded once and derived views are cached
+        Stages that touch the database open sessions of their own; db is never handed
+        to a stage the executor can abandon on timeout, so callers without one pass None
         """
+        frame = as_frame(face_image)
         try:
-            # 1. Anti-spoofing check - ENABLED FOR SECURITY
-            is_real = self.ai_service.anti_spoofing(face_image, bbox)
+            deadline = self.inference.deadline()
+            
+            # 0. Cheap quality cascade on the downscaled frame - bad frames never reach the models
+            self.quality_gate.check_frame(frame, bbox)
+            
+            # 1-3. Anti-spoofing check (ENABLED FOR SECURITY) + embedding of the aligned face
+            # + match against the device's gallery partition (or all templates)
+            is_real, input_embedding, matched = await self._analyze_and_match(frame, bbox, device_id, deadline)
             if not is_real:
                 logger.warning("🚨 SPOOF DETECTED - rejecting recognition attempt")
                 return {
                     "success": False,
                     "message": "Hệ thống phát hiện khuôn mặt không hợp lệ – vui lòng dùng khuôn mặt thật.",
-                    "recognized": False
+                    "recognized": False,
+                    "is_real": False
                 }
             
             logger.info("✅ Anti-spoofing check passed - proceeding with recognition")
             
-            # 2. Extract embedding from input face
-            input_embedding = self.ai_service.extract_embedding(face_image, bbox)
-            
             if input_embedding is None:
                 return {
                     "success": False,
@@ -90,163 +149,437 @@ class EnhancedRecognitionService:
                     "recognized": False
                 }
             
-            # Get all active templates from database
-            all_templates = db.query(FaceTemplate).all()
-            
-            if not all_templates:
+            if matched is None:
                 return {
                     "success": True,
                     "message": "No templates available for recognition",
                     "recognized": False
                 }
             
-            # Calculate similarities with all templates
-            best_match = await self._find_best_template_match(
-                input_embedding, all_templates
-            )
-            
-            if not best_match:
-                # Save unrecognized face image
-                saved_image_path = self._save_recognition_image(face_image)
-                
-                return {
-                    "success": True,
-                    "message": f"🚫 No matching template found | Recognition Threshold: {self.RECOGNITION_THRESHOLD} | Image saved: {os.path.basename(saved_image_path) if saved_image_path else 'Failed'}",
-                    "recognized": False,
-                    "similarity_scores": [],
-                    "saved_image": saved_image_path,
-                    "thresholds": {
-                        "recognition": self.RECOGNITION_THRESHOLD,
-                        "high_confidence": self.HIGH_CONFIDENCE_THRESHOLD,
-                        "very_high_confidence": self.VERY_HIGH_CONFIDENCE_THRESHOLD
-                    }
-                }
-            
-            template, similarity, employee = best_match
-            
-            # Save recognition image
-            saved_image_path = self._save_recognition_image(face_image, employee.employee_id, similarity)
-            
-            # DEBUG: TEMPORARILY ALWAYS RETURN EMPLOYEE INFO (regardless of threshold)
-            logger.info(f"🔍 DEBUG: Best match - Employee {employee.employee_id} with similarity {similarity:.4f}")
-            logger.info(f"🎯 Thresholds - Recognition: {self.RECOGNITION_THRESHOLD}, High: {self.HIGH_CONFIDENCE_THRESHOLD}, Very High: {self.VERY_HIGH_CONFIDENCE_THRESHOLD}")
-            
-            # Determine if recognition meets threshold (but still return employee info)
-            meets_threshold = similarity >= self.RECOGNITION_THRESHOLD
-            recognition_status = "recognized" if meets_threshold else "low_similarity"
-            
-            if meets_threshold:
-                # Update template performance - direct database update
-                template.match_count += 1
-                template.last_matched = datetime.datetime.utcnow()
-                if template.avg_match_confidence == 0.0:
-                    template.avg_match_confidence = similarity
-                else:
-                    template.avg_match_confidence = (
-                        (template.avg_match_confidence * (template.match_count - 1) + similarity) / template.match_count
-                    )
-                db.commit()
-                
-                # Check if we should learn from this recognition
-                await self._consider_template_learning(
-                    db, employee.employee_id, face_image, similarity
-                )
+            match, gallery = matched
+            return (await self.inference.run(
+                "persist", self._persist_results, [frame], [match], [gallery], deadline=deadline
+            ))[0]
             
-            # Get confidence level
-            confidence_level = self._get_confidence_level(similarity)
+        except FrameQualityException as e:
+            return self._retake_result(e)
+        except InferenceTimeoutException as e:
+            logger.error(f"Face recognition timed out: {e.message}")
+            return {
+                "success": False,
+                "message": "Recognition timed out - please try again",
+                "recognized": False,
+                "timeout_stage": e.details.get("stage")
+            }
+        except Exception as e:
+            logger.error(f"Error in face recognition: {e}")
+            return {
+                "success": False,
+                "message": f"Recognition error: {str(e)}",
+                "recognized": False
+            }
+        finally:
+            self.frame_stats.record(frame)
+    
+    async def recognize_burst(self, db: Optional[Session], face_images: List[Union[np.ndarray, Frame]],
+                              device_id: Optional[str] = None) -> Dict:
+        """
+        Recognize one check-in attempt sent as a burst of frames
+        Every frame gets the face located and the cheap quality metrics; anti-spoofing,
+        embedding and matching run only on the best BURST_RECOGNITION_ATTEMPTS frames,
+        best first, stopping at the first settled result
+        The result carries "burst": frame count, selected index and the ranking
+        """
+        frames = [as_frame(face_image) for face_image in face_images]
+        if len(frames) == 1:
+            result = await self.recognize_face(db, frames[0], device_id=device_id)
+            result["burst"] = {"frames": 1, "selected": 0}
+            return result
+        
+        try:
+            deadline = self.inference.deadline()
+            faces = await asyncio.gather(*[self._locate(frame, deadline) for frame in frames])
+        except InferenceTimeoutException as e:
+            logger.error(f"Burst face location timed out: {e.message}")
+            return {
+                "success": False,
+                "message": "Recognition timed out - please try again",
+                "recognized": False,
+                "timeout_stage": e.details.get("stage")
+            }
+        
+        ranking = self.quality_gate.score_burst(frames, faces)
+        burst = {"frames": len(frames), "selected": ranking[0]["index"], "ranking": ranking}
+        usable = [entry for entry in ranking if entry["rejection"] is None]
+        if not usable:
+            rejection = ranking[0]["rejection"]
+            logger.info(f"🚫 Burst of {len(frames)} frames rejected: best frame {rejection['reason']}")
+            result = self._retake_result(FrameQualityException(
+                QualityGate.RETAKE_MESSAGES[rejection["reason"]],
+                code=ErrorCodes.LOW_FRAME_QUALITY,
+                details=rejection
+            ))
+            result["burst"] = burst
+            return result
+        
+        result = None
+        for entry in usable[:multi_kiosk_settings.BURST_RECOGNITION_ATTEMPTS]:
+            burst["selected"] = entry["index"]
+            result = await self.recognize_face(db, frames[entry["index"]], device_id=device_id)
+            if result.get("success") or result.get("is_real") is False:
+                break
+            logger.info(f"🔁 Burst frame {entry['index']} not settled ({result.get('message')}) - trying next best")
+        result["burst"] = burst
+        return result
+    
+    async def _locate(self, frame: Frame, deadline: float):
+        """
+        Located face for burst ranking - in a model worker when the pool is started
+        In-process, the face is cached on the frame, so the selected frame is not detected twice
+        """
+        if self.worker_pool.started:
+            return await self.worker_pool.locate_face(frame.image, deadline)
+        return await self.inference.run("detect", self._pooled, "locate_face", frame, deadline=deadline)
+    
+    async def detect_faces(self, frame: Frame) -> List[Tuple[tuple, float]]:
+        """All confident faces in a streamed frame: [(bbox, score)], most confident first"""
+        deadline = self.inference.deadline()
+        if self.worker_pool.started:
+            return await self.worker_pool.detect_faces(frame.image, deadline)
+        return await self.inference.run("detect", self._pooled, "detect_faces", frame, deadline=deadline)
+    
+    def _retake_result(self, rejection: FrameQualityException) -> Dict:
+        """Fast response for a frame the quality gate rejected"""
+        return {
+            "success": False,
+            "message": rejection.message,
+            "recognized": False,
+            "retake": True,
+            "quality_stage": rejection.details.get("stage"),
+            "reason": rejection.details.get("reason"),
+            "quality_value": rejection.details.get("value")
+        }
+    
+    async def _analyze_and_match(self, frame: Frame, bbox: Optional[tuple], device_id: Optional[str],
+                                 deadline: float) -> Tuple[bool, Optional[np.ndarray], Optional[Tuple]]:
+        """
+        Liveness, embedding and gallery match for one frame
+        Pipelined mode: after detection, anti-spoofing runs concurrently with
+        embedding + matching; a negative spoof verdict cancels the pending stages.
+        The index is loaded and the partition picked next to detection, so the
+        cancellable stages only search the in-memory index - never the database
+        Returns: (is_real, embedding or None, _match_embedding result or None)
+        """
+        if not self.pipelined or self.worker_pool.started:
+            # Sequential (workers already analyze liveness and embedding in one batch)
+            is_real, embedding = await self._analyze_frame(frame, bbox, deadline)
+            if not is_real or embedding is None:
+                return is_real, embedding, None
+            return True, embedding, await self._match(embedding, device_id, deadline)
+        
+        face, (available, partition) = await asyncio.gather(
+            self._detect(frame, bbox, deadline),
+            self.inference.run("match", self._match_scope, device_id, deadline=deadline)
+        )
+        spoof = asyncio.ensure_future(self._anti_spoof(frame, face.bbox if face is not None else bbox, deadline))
+        recognition = asyncio.ensure_future(self._embed_and_match(frame, face, bbox, available, partition, deadline))
+        self.pipeline_stats["pipelined"] += 1
+        try:
+            done, _ = await asyncio.wait({spoof, recognition}, return_when=asyncio.FIRST_COMPLETED)
+            if spoof in done and not spoof.result():
+                self.pipeline_stats["cancelled_on_spoof"] += int(not recognition.done())
+                return False, None, None
+            if not await spoof:
+                return False, None, None
+            embedding, matched = await recognition
+            return True, embedding, matched
+        finally:
+            # Spoof verdict negative or a stage failed: drop the work still pending
+            for task in (spoof, recognition):
+                if not task.done():
+                    task.cancel()
+    
+    async def _analyze_frame(self, frame: Frame, bbox: Optional[tuple],
+                             deadline: float) -> Tuple[bool, Optional[np.ndarray]]:
+        """
+        Liveness and embedding for one frame
+        Runs in a model worker process when the pool is started, otherwise in-process
+        Returns: (is_real, embedding or None)
+        Raises FrameQualityException when the detected face is too small
+        """
+        if self.worker_pool.started:
+            analysis = await self.worker_pool.analyze(frame.image, bbox, deadline)
+            if bbox is None:
+                self.quality_gate.check_face_size(analysis["bbox"])
+            return analysis["is_real"], analysis["embedding"]
+        
+        face = await self._detect(frame, bbox, deadline)
+        if not await self._anti_spoof(frame, face.bbox if face is not None else bbox, deadline):
+            return False, None
+        return True, await self._embed_frame(frame, face, bbox, deadline)
+    
+    async def _detect(self, frame: Frame, bbox: Optional[tuple], deadline: float):
+        """
+        Detect + align once; the box is shared by anti-spoofing and embedding
+        Raises FrameQualityException when the detected face is too small
+        """
+        face = await self.inference.run("detect", self._pooled, "detect_and_align", frame, bbox, deadline=deadline)
+        if face is not None and bbox is None:
+            # Kiosk boxes were already checked with the frame
+            self.quality_gate.check_face_size(face.bbox)
+        return face
+    
+    async def _embed_frame(self, frame: Frame, face, bbox: Optional[tuple], deadline: float) -> Optional[np.ndarray]:
+        """Embedding of the aligned face, or of the frame when the single-pass models are missing"""
+        if face is not None:
+            return await self._embed(face, deadline)
+        if self.worker_pool.started:
+            # Workers run the frame fallback themselves - never load models here
+            return None
+        if not self.ai_service.single_pass_available:
+            return await self.inference.run("embed", self._pooled, "extract_embedding", frame, bbox, deadline=deadline)
+        return None
+    
+    async def _embed_and_match(self, frame: Frame, face, bbox: Optional[tuple], available: bool,
+                               partition: Optional[GalleryPartition], deadline: float) -> Tuple[Optional[np.ndarray], Optional[Tuple]]:
+        """Embedding + index search only (no session) - safe to cancel on a spoof verdict"""
+        embedding = await self._embed_frame(frame, face, bbox, deadline)
+        if embedding is None or not available:
+            return embedding, None
+        return embedding, await self.inference.run(
+            "match", self._find_best_template_match, embedding, partition, deadline=deadline
+        )
+    
+    async def _match(self, embedding: np.ndarray, device_id: Optional[str], deadline: float) -> Optional[Tuple]:
+        return await self.inference.run("match", self._match_embedding, embedding, device_id, deadline=deadline)
+    
+    async def _anti_spoof(self, frame: Frame, bbox: Optional[tuple], deadline: float) -> bool:
+        """Liveness check, batched with other kiosks' frames when micro-batching is on"""
+        if self.micro_batching:
+            return await self.spoof_batcher.submit((frame, bbox), deadline)
+        return await self.inference.run("anti_spoof", self._pooled, "anti_spoofing", frame, bbox, deadline=deadline)
+    
+    async def _embed(self, face, deadline: float) -> Optional[np.ndarray]:
+        """ArcFace embedding of an aligned face, batched across concurrent requests"""
+        if self.micro_batching:
+            return await self.embedding_batcher.submit(face, deadline)
+        return (await self.inference.run("embed", self._pooled, "embed_faces", [face], deadline=deadline))[0]
+    
+    def _match_embedding(self, input_embedding: np.ndarray,
+                         device_id: Optional[str] = None) -> Optional[Tuple[Optional[Tuple], str]]:
+        """
+        Best template match for one embedding (blocking - runs on the inference executor)
+        Returns: (index match or None, gallery searched), or None when there are no templates
+        """
+        available, partition = self._match_scope(device_id)
+        if not available:
+            return None
+        return self._find_best_template_match(input_embedding, partition)
+    
+    def _match_scope(self, device_id: Optional[str] = None) -> Tuple[bool, Optional[GalleryPartition]]:
+        """
+        Load the template index if needed and pick the device's gallery partition (blocking)
+        Uses a session of its own - the executor abandons the stage on timeout
+        Returns: (templates available, partition or None for the global gallery)
+        """
+        db = SessionLocal()
+        try:
+            # Make sure the resident template matrix is loaded
+            self.template_index.ensure_loaded(db)
+            if len(self.template_index) == 0:
+                return False, None
+            return True, self.gallery_partitions.partition_for_device(db, device_id)
+        finally:
+            db.close()
+    
+    def _match_embeddings(self, query_matrix: np.ndarray,
+                          device_id: Optional[str] = None) -> Optional[Tuple[List[Optional[Tuple]], List[str]]]:
+        """
+        Best template match for each row of query_matrix with one GEMM (blocking)
+        Uses a session of its own - the executor abandons the stage on timeout
+        Returns: (index matches, galleries searched), or None when there are no templates
+        """
+        db = SessionLocal()
+        try:
+            self.template_index.ensure_loaded(db)
+            if len(self.template_index) == 0:
+                return None
+            partition = self.gallery_partitions.partition_for_device(db, device_id)
+        finally:
+            db.close()
+        
+        matches = self.template_index.match_batch(query_matrix, partition=partition)
+        galleries = [partition.site_id if partition is not None else "global"] * len(matches)
+        
+        if partition is not None and partition.allow_global_fallback:
+            retry = [j for j, match in enumerate(matches) if match is None or match[2] < self.RECOGNITION_THRESHOLD]
+            if retry:
+                global_matches = self.template_index.match_batch(query_matrix[retry])
+                for j, global_match in zip(retry, global_matches):
+                    if global_match is not None and (matches[j] is None or global_match[2] > matches[j][2]):
+                        matches[j] = global_match
+                        galleries[j] = "global"
+        
+        return matches, galleries
+    
+    def _persist_results(self, face_images: List[Union[np.ndarray, Frame]],
+                         matches: List[Optional[Tuple[int, str, float]]], galleries: List[str]) -> List[Dict]:
+        """
+        Resolve index matches and build their recognition results (blocking)
+        Runs on a session of its own: the executor may abandon the stage on
+        timeout while the request's session is reused or rolled back
+        """
+        db = SessionLocal()
+        try:
+            resolved = self._resolve_matches(db, matches)
+            return [
+                self._build_recognition_result(db, face_image, best_match, gallery)
+                for face_image, best_match, gallery in zip(face_images, resolved, galleries)
+            ]
+        finally:
+            db.close()
+    
+    def _build_recognition_result(self, db: Session, face_image: Union[np.ndarray, Frame],
+                                  best_match: Optional[Tuple], gallery: str = "global") -> Dict:
+        """
+        Recognition response for a resolved (template, similarity, employee) match
+        Blocking (image save + DB update) - runs on the inference executor
+        """
+        if not best_match:
+            # Save unrecognized face image
+            saved_image_path = self._save_recognition_image(face_image)
             
-            # ALWAYS return employee information for debugging
             return {
                 "success": True,
-                "recognized": meets_threshold,  # True only if meets threshold
-                "employee_id": employee.employee_id,
-                "employee_name": employee.name,  # Use 'name' instead of 'full_name'
-                "similarity": similarity,
-                "confidence_level": confidence_level,
-                "template_id": template.id,
-                "image_id": template.image_id,
-                "is_primary": template.is_primary,
-                "template_source": template.created_from,
+                "message": f"🚫 No matching template found | Recognition Threshold: {self.RECOGNITION_THRESHOLD} | Image saved: {os.path.basename(saved_image_path) if saved_image_path else 'Failed'}",
+                "recognized": False,
+                "similarity_scores": [],
+                "gallery": gallery,
                 "saved_image": saved_image_path,
                 "thresholds": {
                     "recognition": self.RECOGNITION_THRESHOLD,
                     "high_confidence": self.HIGH_CONFIDENCE_THRESHOLD,
                     "very_high_confidence": self.VERY_HIGH_CONFIDENCE_THRESHOLD
-                },
-                "message": f"🎯 {recognition_status} | Similarity: {similarity:.4f} | Recognition Threshold: {self.RECOGNITION_THRESHOLD} | High: {self.HIGH_CONFIDENCE_THRESHOLD} | Very High: {self.VERY_HIGH_CONFIDENCE_THRESHOLD} | Image saved: {os.path.basename(saved_image_path) if saved_image_path else 'Failed'}",
-                "employee": {  # Add full employee object for kiosk
-                    "employee_id": employee.employee_id,
-                    "name": employee.name,  # Use correct field name
-                    "department": employee.department or "N/A",
-                    "position": employee.position or "N/A", 
-                    "email": employee.email or "N/A",
-                    "avatar_url": f"/api/v1/employees/{employee.employee_id}/photo"  # Generate avatar URL
                 }
             }
+        
+        template, similarity, employee = best_match
+        
+        # Save recognition image
+        saved_image_path = self._save_recognition_image(face_image, employee.employee_id, similarity)
+        
+        # DEBUG: TEMPORARILY ALWAYS RETURN EMPLOYEE INFO (regardless of threshold)
+        logger.info(f"🔍 DEBUG: Best match - Employee {employee.employee_id} with similarity {similarity:.4f}")
+        logger.info(f"🎯 Thresholds - Recognition: {self.RECOGNITION_THRESHOLD}, High: {self.HIGH_CONFIDENCE_THRESHOLD}, Very High: {self.VERY_HIGH_CONFIDENCE_THRESHOLD}")
+        
+        # Determine if recognition meets threshold (but still return employee info)
+        meets_threshold = similarity >= self.RECOGNITION_THRESHOLD
+        recognition_status = "recognized" if meets_threshold else "low_similarity"
+        
+        if meets_threshold:
+            # Update template performance - direct database update
+            template.match_count += 1
+            template.last_matched = datetime.datetime.utcnow()
+            if template.avg_match_confidence == 0.0:
+                template.avg_match_confidence = similarity
+            else:
+                template.avg_match_confidence = (
+                    (template.avg_match_confidence * (template.match_count - 1) + similarity) / template.match_count
+                )
+            db.commit()
             
-        except Exception as e:
-            logger.error(f"Error in face recognition: {e}")
-            return {
-                "success": False,
-                "message": f"Recognition error: {str(e)}",
-                "recognized": False
-            }
+            # Check if we should learn from this recognition
+            self._consider_template_learning(
+                db, employee.employee_id, face_image, similarity
+            )
+        
+        # Get confidence level
+        confidence_level = self._get_confidence_level(similarity)
+        
+        # ALWAYS return employee information for debugging
+        return {
+            "success": True,
+            "recognized": meets_threshold,  # True only if meets threshold
+            "employee_id": employee.employee_id,
+            "employee_name": employee.name,  # Use 'name' instead of 'full_name'
+            "similarity": similarity,
+            "confidence_level": confidence_level,
+            "template_id": template.id,
+            "image_id": template.image_id,
+            "is_primary": template.is_primary,
+            "template_source": template.created_from,
+            "gallery": gallery,
+            "saved_image": saved_image_path,
+            "thresholds": {
+                "recognition": self.RECOGNITION_THRESHOLD,
+                "high_confidence": self.HIGH_CONFIDENCE_THRESHOLD,
+                "very_high_confidence": self.VERY_HIGH_CONFIDENCE_THRESHOLD
+            },
+            "message": f"🎯 {recognition_status} | Similarity: {similarity:.4f} | Recognition Threshold: {self.RECOGNITION_THRESHOLD} | High: {self.HIGH_CONFIDENCE_THRESHOLD} | Very High: {self.VERY_HIGH_CONFIDENCE_THRESHOLD} | Image saved: {os.path.basename(saved_image_path) if saved_image_path else 'Failed'}",
+            "employee": employee.to_dict()  # Full employee object for kiosk
+        }
     
-    async def _find_best_template_match(self, input_embedding: np.ndarray,
-                                      templates: List[FaceTemplate]) -> Optional[Tuple]:
-        """Find best matching template"""
-        
-        best_similarity = 0.0
-        best_template = None
-        best_employee = None
-        
-        # Group templates by employee for better processing
-        employee_templates = {}
-        for template in templates:
-            if template.employee_id not in employee_templates:
-                employee_templates[template.employee_id] = []
-            employee_templates[template.employee_id].append(template)
-        
-        # Find best match per employee, then overall best
-        for employee_id, emp_templates in employee_templates.items():
-            # Calculate similarity with all templates for this employee
-            similarities = []
-            
-            for template in emp_templates:
-                template_embedding = np.array(template.embedding_vector)
-                # Use CosineSimilarityCalculator directly
-                from app.services.real_ai_service import CosineSimilarityCalculator
-                similarity = CosineSimilarityCalculator.calculate(
-                    input_embedding, template_embedding
-                )
-                similarities.append((template, similarity))
+    def _find_best_template_match(self, input_embedding: np.ndarray,
+                                  partition=None) -> Tuple[Optional[Tuple], str]:
+        """
+        Find best matching template using the resident template index
+        Returns: ((template_id, employee_id, similarity) or None, gallery searched)
+        """
+        match = self.template_index.match(input_embedding, partition=partition)
+        gallery = partition.site_id if partition is not None else "global"
+        
+        if partition is not None and partition.allow_global_fallback and (
+            match is None or match[2] < self.RECOGNITION_THRESHOLD
+        ):
+            # Visitor from another site - retry against the whole company
+            global_match = self.template_index.match(input_embedding)
+            if global_match is not None and (match is None or global_match[2] > match[2]):
+                match = global_match
+                gallery = "global"
+        
+        return match, gallery
+    
+    def _resolve_matches(self, db: Session,
+                         matches: List[Optional[Tuple[int, str, float]]]) -> List[Optional[Tuple]]:
+        """
+        Load the templates for index matches with one query; employees come
+        from the read-through employee cache
+        Returns: (template, similarity, EmployeeRecord) or None per match
+        """
+        template_ids = {match[0] for match in matches if match}
+        employee_ids = {match[1] for match in matches if match}
+        if not template_ids:
+            return [None] * len(matches)
+        
+        templates = {
+            template.id: template
+            for template in db.query(FaceTemplate).filter(FaceTemplate.id.in_(template_ids)).all()
+        }
+        employees = self.employee_cache.get_many(db, employee_ids)
+        
+        resolved = []
+        for match in matches:
+            if match is None:
+                resolved.append(None)
+                continue
             
-            # Get best template for this employee
-            if similarities:
-                best_emp_template, best_emp_similarity = max(
-                    similarities, key=lambda x: x[1]
-                )
-                
-                # Check if this is overall best
-                if best_emp_similarity > best_similarity:
-                    best_similarity = best_emp_similarity
-                    best_template = best_emp_template
-                    # Get employee info
-                    from sqlalchemy.orm import Session
-                    if hasattr(templates[0], '_sa_instance_state'):
-                        # Get session from template instance
-                        session = Session.object_session(templates[0])
-                        best_employee = session.query(Employee).filter(
-                            Employee.employee_id == employee_id
-                        ).first()
-        
-        if best_template and best_employee:
-            return (best_template, best_similarity, best_employee)
+            template_id, employee_id, best_similarity = match
+            best_template = templates.get(template_id)
+            best_employee = employees.get(employee_id)
+            
+            if best_template and best_employee:
+                resolved.append((best_template, best_similarity, best_employee))
+                continue
+            
+            # Index refers to rows that no longer exist - reload on next recognition
+            logger.warning(f"Template index is stale (template {template_id}), scheduling reload")
+            self.template_index.invalidate()
+            resolved.append(None)
         
-        return None
+        return resolved
     
-    async def _consider_template_learning(self, db: Session, employee_id: str,
-                                        face_image: np.ndarray, match_confidence: float):
+    def _consider_template_learning(self, db: Session, employee_id: str,
+                                    face_image: Union[np.ndarray, Frame], match_confidence: float):
         """Consider if we should learn from this recognition"""
         
         try:
@@ -287,17 +620,13 @@ class EnhancedRecognitionService:
         except Exception as e:
             logger.error(f"Error in template learning: {e}")
     
-    def _calculate_image_quality(self, image: np.ndarray) -> float:
+    def _calculate_image_quality(self, image: Union[np.ndarray, Frame]) -> float:
         """Calculate basic image quality score"""
         try:
-            # Convert to grayscale if needed
-            if len(image.shape) == 3:
-                gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            else:
-                gray = image
+            # Grayscale view of the frame (shared with other stages)
+            gray = as_frame(image).gray() if isinstance(image, Frame) or image.ndim == 3 else image
             
             # Calculate Laplacian variance (focus measure)
-            import cv2
             laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
             
             # Normalize to 0-1 range (threshold at 100 for decent focus)
@@ -374,17 +703,123 @@ class EnhancedRecognitionService:
             logger.error(f"Error getting recognition stats: {e}")
             return {"error": str(e)}
     
-    async def batch_recognize_faces(self, db: Session, face_images: List[np.ndarray],
-                                  bboxes: Optional[List[List[int]]] = None) -> List[Dict]:
-        """Recognize multiple faces in batch"""
-        results = []
-        
-        for i, face_image in enumerate(face_images):
-            bbox = bboxes[i] if bboxes and i < len(bboxes) else None
-            result = await self.recognize_face(db, face_image, bbox)
-            results.append(result)
-        
-        return results
+    async def batch_recognize_faces(self, db: Session, face_images: List[Union[np.ndarray, Frame]],
+                                  bboxes: Optional[List[List[int]]] = None,
+                                  device_id: Optional[str] = None) -> List[Dict]:
+        """
+        Recognize multiple faces in batch
+        - Embeddings for all images come from batched recognition inference
+        - All query embeddings are matched with one GEMM against the template matrix
+        Returns one result per image, in the same shape as recognize_face
+        """
+        results: List[Optional[Dict]] = [None] * len(face_images)
+        frames = [as_frame(face_image) for face_image in face_images]
+        try:
+            deadline = self.inference.deadline()
+            image_bboxes = [bboxes[i] if bboxes and i < len(bboxes) else None for i in range(len(face_images))]
+            
+            # 0. Quality cascade - rejected frames get a retake result and skip the models
+            candidates = []
+            for i, frame in enumerate(frames):
+                try:
+                    self.quality_gate.check_frame(frame, image_bboxes[i])
+                    candidates.append(i)
+                except FrameQualityException as e:
+                    results[i] = self._retake_result(e)
+            if not candidates:
+                return results
+            
+            # 1. Anti-spoofing check per image
+            if self.worker_pool.started:
+                # Workers batch the frames themselves and embed in the same pass
+                analyses = dict(zip(candidates, await asyncio.gather(*[
+                    self.worker_pool.analyze(frames[i].image, image_bboxes[i], deadline)
+                    for i in candidates
+                ])))
+                liveness = [analyses[i]["is_real"] for i in candidates]
+            else:
+                liveness = await self.inference.run(
+                    "anti_spoof", self._pooled, "batch_anti_spoofing",
+                    [frames[i] for i in candidates], [image_bboxes[i] for i in candidates],
+                    deadline=deadline
+                )
+            live_positions = []
+            for i, is_real in zip(candidates, liveness):
+                if is_real:
+                    live_positions.append(i)
+                else:
+                    logger.warning(f"🚨 SPOOF DETECTED in batch image {i} - rejecting")
+                    results[i] = {
+                        "success": False,
+                        "message": "Hệ thống phát hiện khuôn mặt không hợp lệ – vui lòng dùng khuôn mặt thật.",
+                        "recognized": False
+                    }
+            
+            # 2. Batched embedding extraction
+            if self.worker_pool.started:
+                embeddings = [analyses[i]["embedding"] for i in live_positions]
+            else:
+                embeddings = await self.inference.run(
+                    "embed", self._pooled, "batch_extract_embeddings",
+                    [frames[i] for i in live_positions],
+                    [image_bboxes[i] for i in live_positions],
+                    deadline=deadline
+                )
+            
+            query_positions = []
+            query_embeddings = []
+            for i, embedding in zip(live_positions, embeddings):
+                if embedding is None:
+                    results[i] = {
+                        "success": False,
+                        "message": "Failed to extract face embedding",
+                        "recognized": False
+                    }
+                else:
+                    query_positions.append(i)
+                    query_embeddings.append(embedding)
+            
+            if not query_positions:
+                return results
+            
+            # 3. One GEMM for all queries
+            matched = await self.inference.run(
+                "match", self._match_embeddings, np.stack(query_embeddings), device_id, deadline=deadline
+            )
+            
+            if matched is None:
+                for i in query_positions:
+                    results[i] = {
+                        "success": True,
+                        "message": "No templates available for recognition",
+                        "recognized": False
+                    }
+                return results
+            
+            # 4. Per-image results, same as recognize_face
+            matches, galleries = matched
+            built = await self.inference.run(
+                "persist", self._persist_results, [frames[i] for i in query_positions], matches, galleries,
+                deadline=deadline
+            )
+            for i, result in zip(query_positions, built):
+                results[i] = result
+            
+            return results
+            
+        except Exception as e:
+            logger.error(f"Error in batch face recognition: {e}")
+            return [
+                result or {
+                    "success": False,
+                    "message": f"Recognition error: {str(e)}",
+                    "recognized": False
+                }
+                for result in results
+            ]
+        finally:
+            for frame in frames:
+                self.frame_stats.record(frame)
     
     async def update_recognition_thresholds(self, recognition_threshold: float = None,
                                           high_confidence_threshold: float = None,
@@ -400,14 +835,17 @@ class EnhancedRecognitionService:
         logger.info(f"Updated thresholds: Recognition={self.RECOGNITION_THRESHOLD}, "
                    f"High={self.HIGH_CONFIDENCE_THRESHOLD}, VeryHigh={self.VERY_HIGH_CONFIDENCE_THRESHOLD}")
     
-    async def register_face(self, db: Session, face_image: np.ndarray, 
+    async def register_face(self, db: Session, face_image: Union[np.ndarray, Frame], 
                            employee_id: str, device_id: str = None) -> Dict:
         """
         Register a new face for an employee with anti-spoofing check
         """
+        face_image = as_frame(face_image)
         try:
-            # 1. Anti-spoofing check - ENABLED FOR SECURITY
-            is_real = self.ai_service.anti_spoofing(face_image)
+            deadline = self.inference.deadline()
+            
+            # 1-3. Anti-spoofing check (ENABLED FOR SECURITY), detect + align, embed
+            is_real, face_found, input_embedding = await self._analyze_registration(face_image, deadline)
             if not is_real:
                 logger.warning(f"🚨 SPOOF DETECTED during registration for employee {employee_id}")
                 return {
@@ -418,17 +856,13 @@ class EnhancedRecognitionService:
             
             logger.info(f"✅ Anti-spoofing check passed for employee {employee_id} registration")
             
-            # 2. Detect face
-            found, bbox = self.ai_service.detect_face(face_image)
-            if not found:
+            if not face_found:
                 return {
                     "success": False,
                     "message": "No face detected in registration image",
                     "employee_id": employee_id
                 }
             
-            # 3. Extract embedding
-            input_embedding = self.ai_service.extract_embedding(face_image, bbox)
             if input_embedding is None:
                 return {
                     "success": False,
@@ -436,66 +870,12 @@ class EnhancedRecognitionService:
                     "employee_id": employee_id
                 }
             
-            # 4. Check if employee exists
-            employee = db.query(Employee).filter(Employee.employee_id == employee_id).first()
-            if not employee:
-                return {
-                    "success": False,
-                    "message": f"Employee {employee_id} not found in database",
-                    "employee_id": employee_id
-                }
-            
-            # 5. Find next available image_id for this employee
-            existing_templates = db.query(FaceTemplate).filter(
-                FaceTemplate.employee_id == employee_id
-            ).order_by(FaceTemplate.image_id).all()
-            
-            used_image_ids = [t.image_id for t in existing_templates]
-            next_image_id = 0  # Start with 0 (avatar)
-            while next_image_id in used_image_ids and next_image_id < 4:
-                next_image_id += 1
-            
-            if next_image_id >= 4:
-                return {
-                    "success": False,
-                    "message": f"Maximum templates (4) already exist for employee {employee_id}",
-                    "employee_id": employee_id,
-                    "existing_templates": len(existing_templates)
-                }
-            
-            # 6. Create new face template
-            new_template = FaceTemplate(
-                employee_id=employee_id,
-                image_id=next_image_id,
-                embedding_vector=input_embedding.tolist(),
-                created_from="registration",
-                is_primary=(next_image_id == 0),  # First template is primary
-                match_count=0,
-                avg_match_confidence=0.0,
-                created_at=datetime.datetime.utcnow()
+            # 4-7. Store the template (blocking DB + disk work)
+            return await self.inference.run(
+                "persist", self._store_registration,
+                face_image, employee_id, device_id, input_embedding, deadline=deadline
             )
             
-            db.add(new_template)
-            db.commit()
-            db.refresh(new_template)
-            
-            # 7. Save registration image
-            saved_image_path = self._save_recognition_image(face_image, employee_id, 1.0)
-            
-            logger.info(f"✅ Registered face template for employee {employee_id} with image_id {next_image_id}")
-            
-            return {
-                "success": True,
-                "message": f"Face registered successfully for employee {employee_id}",
-                "employee_id": employee_id,
-                "template_id": new_template.id,
-                "image_id": next_image_id,
-                "is_primary": new_template.is_primary,
-                "total_templates": len(existing_templates) + 1,
-                "saved_image": saved_image_path,
-                "device_id": device_id
-            }
-            
         except Exception as e:
             logger.error(f"Error in face registration for employee {employee_id}: {e}")
             db.rollback()
@@ -505,6 +885,97 @@ class EnhancedRecognitionService:
                 "employee_id": employee_id
             }
     
+    async def _analyze_registration(self, frame: Frame, deadline: float) -> Tuple[bool, bool, Optional[np.ndarray]]:
+        """
+        Liveness, face detection and embedding of a registration image
+        One analyze pass in a model worker when the pool is started, otherwise in-process
+        Returns: (is_real, face found, embedding or None)
+        """
+        if self.worker_pool.started:
+            analysis = await self.worker_pool.analyze(frame.image, None, deadline)
+            face_found = analysis["bbox"] is not None or analysis["embedding"] is not None
+            return analysis["is_real"], face_found, analysis["embedding"]
+        
+        if not await self.inference.run("anti_spoof", self._pooled, "anti_spoofing", frame, deadline=deadline):
+            return False, False, None
+        face = await self.inference.run("detect", self._pooled, "locate_face", frame, deadline=deadline)
+        if face is None:
+            return True, False, None
+        return True, True, (await self.inference.run("embed", self._pooled, "embed_faces", [face], deadline=deadline))[0]
+    
+    def _store_registration(self, face_image: Union[np.ndarray, Frame], employee_id: str,
+                            device_id: Optional[str], input_embedding: np.ndarray) -> Dict:
+        """Store a registration on a session of its own - the executor abandons the stage on timeout"""
+        db = SessionLocal()
+        try:
+            return self._store_registration_template(db, face_image, employee_id, device_id, input_embedding)
+        finally:
+            db.close()
+    
+    def _store_registration_template(self, db: Session, face_image: Union[np.ndarray, Frame], employee_id: str,
+                                     device_id: Optional[str], input_embedding: np.ndarray) -> Dict:
+        """Create the next face template for a registration (blocking - runs on the inference executor)"""
+        # 4. Check if employee exists
+        employee = db.query(Employee).filter(Employee.employee_id == employee_id).first()
+        if not employee:
+            return {
+                "success": False,
+                "message": f"Employee {employee_id} not found in database",
+                "employee_id": employee_id
+            }
+        
+        # 5. Find next available image_id for this employee
+        existing_templates = db.query(FaceTemplate).filter(
+            FaceTemplate.employee_id == employee_id
+        ).order_by(FaceTemplate.image_id).all()
+        
+        used_image_ids = [t.image_id for t in existing_templates]
+        next_image_id = 0  # Start with 0 (avatar)
+        while next_image_id in used_image_ids and next_image_id < 4:
+            next_image_id += 1
+        
+        if next_image_id >= 4:
+            return {
+                "success": False,
+                "message": f"Maximum templates (4) already exist for employee {employee_id}",
+                "employee_id": employee_id,
+                "existing_templates": len(existing_templates)
+            }
+        
+        # 6. Create new face template
+        new_template = FaceTemplate(
+            employee_id=employee_id,
+            image_id=next_image_id,
+            **embedding_columns(FaceTemplate, input_embedding),
+            created_from="registration",
+            is_primary=(next_image_id == 0),  # First template is primary
+            match_count=0,
+            avg_match_confidence=0.0,
+            created_at=datetime.datetime.utcnow()
+        )
+        
+        db.add(new_template)
+        db.commit()
+        db.refresh(new_template)
+        
+        # 7. Save registration image
+        saved_image_path = self._save_recognition_image(face_image, employee_id, 1.0)
+        
+        logger.info(f"✅ Registered face template for employee {employee_id} with image_id {next_image_id}")
+        
+        return {
+            "success": True,
+            "message": f"Face registered successfully for employee {employee_id}",
+            "employee_id": employee_id,
+            "template_id": new_template.id,
+            "image_id": next_image_id,
+            "is_primary": new_template.is_primary,
+            "total_templates": len(existing_templates) + 1,
+            "template_index_version": self.template_index.version,
+            "saved_image": saved_image_path,
+            "device_id": device_id
+        }
+    
     def get_service_status(self) -> Dict:
         """
         Get enhanced recognition service status
@@ -514,11 +985,7 @@ class EnhancedRecognitionService:
                 "status": "active",
                 "service_type": "enhanced_recognition",
                 "ai_enabled": True,
-                "models": {
-                    "face_detection": self.ai_service.face_detector is not None,
-                    "anti_spoofing": self.ai_service.anti_spoof_model is not None,
-                    "face_recognition": self.ai_service.face_recognizer is not None
-                },
+                "models": self._model_status(),
                 "thresholds": {
                     "recognition": self.RECOGNITION_THRESHOLD,
                     "high_confidence": self.HIGH_CONFIDENCE_THRESHOLD,
@@ -526,7 +993,21 @@ class EnhancedRecognitionService:
                     "min_quality_learning": self.MIN_QUALITY_FOR_LEARNING,
                     "min_confidence_learning": self.MIN_CONFIDENCE_FOR_LEARNING
                 },
-                "model_path": str(self.ai_service.model_path),
+                "template_index": self.template_index.get_stats(),
+                "gallery_partitions": self.gallery_partitions.get_stats(),
+                "employee_cache": self.employee_cache.get_stats(),
+                "quality_gate": self.quality_gate.get_stats(),
+                "frames": self.frame_stats.get_stats(),
+                "inference_executor": self.inference.get_stats(),
+                "inference_workers": self.worker_pool.get_stats(),
+                "ai_service_pool": get_ai_service_pool_stats(),
+                "micro_batching": {
+                    "enabled": self.micro_batching,
+                    "anti_spoof": self.spoof_batcher.get_stats(),
+                    "embed": self.embedding_batcher.get_stats()
+                },
+                "pipeline": {"enabled": self.pipelined, **self.pipeline_stats},
+                "model_path": str(self.ai_service.model_path) if not self.worker_pool.started else None,
                 "uploads_dir": str(self.uploads_dir)
             }
             
@@ -539,24 +1020,31 @@ class EnhancedRecognitionService:
                 "error": str(e)
             }
     
+    def _model_status(self) -> Dict[str, bool]:
+        """
+        Which models are loaded; with the worker pool started this comes from the
+        workers' stats, so status and health probes never load models in-process
+        """
+        if self.worker_pool.started:
+            ready = any(worker["ready"] for worker in self.worker_pool.get_stats()["workers"])
+            return {"face_detection": ready, "anti_spoofing": ready, "face_recognition": ready}
+        return {
+            "face_detection": self.ai_service.face_detector is not None,
+            "anti_spoofing": self.ai_service.anti_spoof_model is not None,
+            "face_recognition": self.ai_service.face_recognizer is not None
+        }
+    
     def health_check(self) -> Dict:
         """
         Enhanced recognition service health check
         """
         try:
-            # Check if AI service is available
-            if not self.ai_service:
-                return {
-                    "healthy": False,
-                    "message": "AI service not available",
-                    "models": {}
-                }
-            
-            # Test if models are loaded
+            # Test if models are loaded (in the workers when the pool serves inference)
+            models = self._model_status()
             models_loaded = {
-                "detection": self.ai_service.face_detector is not None,
-                "anti_spoofing": self.ai_service.anti_spoof_model is not None, 
-                "recognition": self.ai_service.face_recognizer is not None
+                "detection": models["face_detection"],
+                "anti_spoofing": models["anti_spoofing"],
+                "recognition": models["face_recognition"]
             }
             
             all_models_loaded = all(models_loaded.values())
@@ -567,6 +1055,7 @@ class EnhancedRecognitionService:
                 "service_type": "enhanced_recognition",
                 "thresholds_configured": True,
                 "uploads_dir_exists": self.uploads_dir.exists(),
+                "inference_workers": self.worker_pool.get_stats(),
                 "message": "All AI models loaded and service ready" if all_models_loaded else "Some AI models missing"
             }
             
@@ -0,0 +1,137 @@
+"""
+Face Tracker
+Follows faces across the frames a kiosk streams so each person is recognized
+once: detections are associated with existing tracks by bounding-box IoU, and
+a track keeps the recognition decision made on its first usable frame
+"""
+import itertools
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+from app.config.multi_kiosk_config_fixed import multi_kiosk_settings
+
+def box_iou(a: Sequence[float], b: Sequence[float]) -> float:
+    """Intersection over union of two (x1, y1, x2, y2) boxes"""
+    inter_w = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    inter_h = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = inter_w * inter_h
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+class FaceTrack:
+    """One person in front of the kiosk; decision is the recognition result once settled"""
+
+    def __init__(self, track_id: int, bbox: tuple, now: float):
+        self.track_id = track_id
+        self.bbox = bbox
+        self.started_at = now
+        self.last_seen = now
+        self.frames = 1
+        self.attempts = 0
+        self.decision: Optional[Dict] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "track_id": self.track_id,
+            "bbox": [int(v) for v in self.bbox],
+            "frames": self.frames,
+            "attempts": self.attempts,
+            "age_seconds": round(self.last_seen - self.started_at, 2)
+        }
+
+class FaceTracker:
+    """
+    Greedy IoU tracker for one kiosk stream
+    - Each detection joins the unmatched track it overlaps most (IoU >= iou_threshold)
+    - Unmatched detections start new tracks
+    - Tracks not seen for max_age_seconds are dropped, so a returning person is recognized again
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, max_age_seconds: float = 1.5):
+        self.iou_threshold = iou_threshold
+        self.max_age_seconds = max_age_seconds
+        self.tracks: Dict[int, FaceTrack] = {}
+        self._ids = itertools.count(1)
+        self.tracks_started = 0
+        self.recognitions = 0
+        self.reused_decisions = 0
+
+    def update(self, boxes: List[tuple], now: Optional[float] = None) -> List[FaceTrack]:
+        """Associate this frame's face boxes with tracks; returns the track of each box, in order"""
+        now = time.monotonic() if now is None else now
+        self.tracks = {
+            track_id: track for track_id, track in self.tracks.items()
+            if now - track.last_seen <= self.max_age_seconds
+        }
+
+        pairs: List[Tuple[float, int, int]] = sorted(
+            ((box_iou(box, track.bbox), i, track_id)
+             for i, box in enumerate(boxes) for track_id, track in self.tracks.items()),
+            reverse=True
+        )
+        assigned: Dict[int, FaceTrack] = {}
+        used_tracks = set()
+        for overlap, i, track_id in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if i in assigned or track_id in used_tracks:
+                continue
+            track = self.tracks[track_id]
+            track.bbox = boxes[i]
+            track.last_seen = now
+            track.frames += 1
+            assigned[i] = track
+            used_tracks.add(track_id)
+
+        for i, box in enumerate(boxes):
+            if i not in assigned:
+                track = FaceTrack(next(self._ids), box, now)
+                self.tracks[track.track_id] = track
+                self.tracks_started += 1
+                assigned[i] = track
+
+        return [assigned[i] for i in range(len(boxes))]
+
+    def get_stats(self) -> Dict:
+        return {
+            "active_tracks": len(self.tracks),
+            "tracks_started": self.tracks_started,
+            "recognitions": self.recognitions,
+            "reused_decisions": self.reused_decisions
+        }
+
+class FaceTrackerRegistry:
+    """Tracker per connected kiosk stream; one stream per device"""
+
+    def __init__(self, iou_threshold: float = 0.3, max_age_seconds: float = 1.5):
+        self.iou_threshold = iou_threshold
+        self.max_age_seconds = max_age_seconds
+        self._trackers: Dict[str, FaceTracker] = {}
+
+    def open(self, device_id: str) -> FaceTracker:
+        """Fresh tracker for a (re)connected kiosk; replaces any previous stream of the device"""
+        tracker = FaceTracker(self.iou_threshold, self.max_age_seconds)
+        self._trackers[device_id] = tracker
+        return tracker
+
+    def close(self, device_id: str, tracker: FaceTracker):
+        if self._trackers.get(device_id) is tracker:
+            del self._trackers[device_id]
+
+    def get_stats(self) -> Dict:
+        return {
+            "active_streams": len(self._trackers),
+            "devices": {device_id: tracker.get_stats() for device_id, tracker in self._trackers.items()}
+        }
+
+# Singleton instance
+_face_tracker_registry = None
+
+def get_face_tracker_registry() -> FaceTrackerRegistry:
+    """Get process-wide registry of kiosk stream trackers"""
+    global _face_tracker_registry
+    if _face_tracker_registry is None:
+        _face_tracker_registry = FaceTrackerRegistry(
+            iou_threshold=multi_kiosk_settings.STREAM_TRACK_IOU_THRESHOLD,
+            max_age_seconds=multi_kiosk_settings.STREAM_TRACK_MAX_AGE_SECONDS
+        )
+    return _face_tracker_registry
@@ -0,0 +1,156 @@
+"""
+Frame
+One decoded kiosk frame shared by every recognition stage: the BGR buffer is
+decoded once and derived views (downscaled, grayscale, RGB, face crop,
+aligned face) are computed on first use and cached on the frame, so stages
+reuse each other's work instead of making their own copies
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, Union
+import numpy as np
+import cv2
+from app.utils.image_decode import decode_image
+
+def _nbytes(value: Any) -> int:
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    aligned = getattr(value, "aligned", None)
+    return aligned.nbytes if isinstance(aligned, np.ndarray) else 0
+
+class Frame:
+    """
+    Decoded frame + lazily computed views
+    - image: decoded BGR buffer, never modified by any stage
+    - data: original encoded bytes when known - saved to disk as-is, never re-encoded
+    - allocated_bytes / views_computed / view_hits: memory traffic of this request
+    Views may be requested from several inference threads at once; each is computed once
+    """
+
+    def __init__(self, image: np.ndarray, data: Optional[bytes] = None, decode_factor: int = 1):
+        self.image = image
+        self.data = data
+        self.decode_factor = decode_factor
+        self._views: Dict[Hashable, Any] = {}
+        self._lock = threading.Lock()
+        self.allocated_bytes = image.nbytes
+        self.views_computed = 0
+        self.view_hits = 0
+
+    @classmethod
+    def from_bytes(cls, data: bytes, target_side: int = 0) -> Optional["Frame"]:
+        """Decode once (large JPEGs at reduced scale); None if the bytes are not an image"""
+        image, factor = decode_image(data, target_side)
+        return cls(image, data, factor) if image is not None else None
+
+    @property
+    def height(self) -> int:
+        return self.image.shape[0]
+
+    @property
+    def width(self) -> int:
+        return self.image.shape[1]
+
+    def view(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Cached derived value for key, computed with compute() on first use"""
+        with self._lock:
+            if key in self._views:
+                self.view_hits += 1
+                return self._views[key]
+        value = compute()
+        with self._lock:
+            if key in self._views:
+                # Another stage computed it concurrently - keep the first copy
+                self.view_hits += 1
+                return self._views[key]
+            self._views[key] = value
+            self.views_computed += 1
+            self.allocated_bytes += _nbytes(value)
+        return value
+
+    def scale_for(self, max_side: Optional[int]) -> float:
+        """Factor that fits the longer side into max_side (never upscales)"""
+        if not max_side:
+            return 1.0
+        return min(max_side / max(self.height, self.width), 1.0)
+
+    def _size_key(self, max_side: Optional[int]) -> Optional[int]:
+        # Views that would not shrink the frame share the full-resolution entry
+        return max_side if self.scale_for(max_side) < 1.0 else None
+
+    def downscaled(self, max_side: Optional[int]) -> np.ndarray:
+        """BGR frame with the longer side fitted into max_side"""
+        max_side = self._size_key(max_side)
+        if max_side is None:
+            return self.image
+        scale = self.scale_for(max_side)
+        size = (max(1, round(self.width * scale)), max(1, round(self.height * scale)))
+        return self.view(("downscaled", max_side), lambda: cv2.resize(self.image, size, interpolation=cv2.INTER_AREA))
+
+    def gray(self, max_side: Optional[int] = None) -> np.ndarray:
+        max_side = self._size_key(max_side)
+        return self.view(("gray", max_side), lambda: cv2.cvtColor(self.downscaled(max_side), cv2.COLOR_BGR2GRAY))
+
+    def rgb(self, max_side: Optional[int] = None) -> np.ndarray:
+        max_side = self._size_key(max_side)
+        return self.view(("rgb", max_side), lambda: cv2.cvtColor(self.downscaled(max_side), cv2.COLOR_BGR2RGB))
+
+    def face_crop(self, bbox, padding: int = 0) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """
+        RGB crop around bbox (+padding px) at full decoded resolution
+        Returns: (rgb_crop, (x_offset, y_offset)); the whole frame if the crop is empty
+        """
+        x1, y1, x2, y2 = [int(v) for v in bbox[:4]]
+        x1, y1 = max(0, x1 - padding), max(0, y1 - padding)
+        x2, y2 = min(self.width, x2 + padding), min(self.height, y2 + padding)
+        if x2 <= x1 or y2 <= y1:
+            return self.rgb(), (0, 0)
+        crop = self.image[y1:y2, x1:x2]  # Slice of the decoded buffer, no copy
+        return self.view(("face_crop", x1, y1, x2, y2), lambda: cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)), (x1, y1)
+
+def as_frame(image: Union[np.ndarray, Frame]) -> Frame:
+    """Frame for stage inputs that may still be plain arrays (wraps without copying)"""
+    return image if isinstance(image, Frame) else Frame(image)
+
+def as_array(image: Union[np.ndarray, Frame]) -> np.ndarray:
+    """Decoded BGR buffer for models that take arrays"""
+    return image.image if isinstance(image, Frame) else image
+
+class FrameStats:
+    """Per-request memory traffic of recognition frames"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.allocated_bytes = 0
+        self.views_computed = 0
+        self.view_hits = 0
+        self.reduced_decodes = 0
+
+    def record(self, frame: Frame):
+        with self._lock:
+            self.frames += 1
+            self.allocated_bytes += frame.allocated_bytes
+            self.views_computed += frame.views_computed
+            self.view_hits += frame.view_hits
+            self.reduced_decodes += int(frame.decode_factor > 1)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            frames = max(self.frames, 1)
+            return {
+                "frames": self.frames,
+                "avg_allocated_kb": round(self.allocated_bytes / frames / 1024, 1),
+                "avg_views_computed": round(self.views_computed / frames, 2),
+                "avg_view_hits": round(self.view_hits / frames, 2),
+                "reduced_decodes": self.reduced_decodes
+            }
+
+# Singleton instance
+_frame_stats = None
+
+def get_frame_stats() -> FrameStats:
+    """Get process-wide frame allocation counters"""
+    global _frame_stats
+    if _frame_stats is None:
+        _frame_stats = FrameStats()
+    return _frame_stats
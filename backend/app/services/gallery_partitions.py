@@ -0,0 +1,120 @@
+"""
+Gallery Partitions
+Per-site subsets of the template gallery so a kiosk is only matched
+against the staff admitted at its site
+"""
+import threading
+import time
+import logging
+from typing import Dict, FrozenSet, Optional
+from sqlalchemy.orm import Session
+from app.models.site import Site, EmployeeSite, DeviceSite
+from app.config.multi_kiosk_config_fixed import multi_kiosk_settings
+
+logger = logging.getLogger(__name__)
+
+class GalleryPartition:
+    """
+    Employees searched for one site
+    Employees not assigned to any site are admitted everywhere
+    """
+
+    def __init__(self, site_id: str, employee_ids: FrozenSet[str],
+                 assigned_employee_ids: FrozenSet[str], allow_global_fallback: bool, version: int):
+        self.site_id = site_id
+        self.employee_ids = employee_ids
+        self.assigned_employee_ids = assigned_employee_ids
+        self.allow_global_fallback = allow_global_fallback
+        # Bumped on every reload; keys the template index's cached partition rows
+        self.version = version
+
+    def includes(self, employee_id: str) -> bool:
+        return employee_id in self.employee_ids or employee_id not in self.assigned_employee_ids
+
+class GalleryPartitions:
+    """
+    Site assignments (sites, employee_sites, device_sites) held in memory
+    Reloaded after invalidate() or every GALLERY_PARTITION_REFRESH_SECONDS so
+    assignments made through another worker are picked up
+    """
+
+    def __init__(self):
+        self.enabled = multi_kiosk_settings.GALLERY_PARTITIONS_ENABLED
+        self.refresh_seconds = multi_kiosk_settings.GALLERY_PARTITION_REFRESH_SECONDS
+        self._lock = threading.Lock()
+        self._loaded_at: Optional[float] = None
+        self._version = 0
+        self._partitions: Dict[str, GalleryPartition] = {}
+        self._device_sites: Dict[str, str] = {}
+
+    def invalidate(self):
+        """Reload assignments on next use"""
+        with self._lock:
+            self._loaded_at = None
+
+    def _ensure_loaded(self, db: Session):
+        loaded_at = self._loaded_at
+        if loaded_at is not None and time.monotonic() - loaded_at < self.refresh_seconds:
+            return
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_seconds:
+                return
+            self._load(db)
+
+    def _load(self, db: Session):
+        sites = db.query(Site.site_id, Site.allow_global_fallback).all()
+        memberships = db.query(EmployeeSite.site_id, EmployeeSite.employee_id).all()
+        device_sites = db.query(DeviceSite.device_id, DeviceSite.site_id).all()
+
+        site_employees: Dict[str, set] = {site_id: set() for site_id, _ in sites}
+        for site_id, employee_id in memberships:
+            site_employees.setdefault(site_id, set()).add(employee_id)
+        assigned = frozenset(employee_id for _, employee_id in memberships)
+
+        self._version += 1
+        self._partitions = {
+            site_id: GalleryPartition(
+                site_id,
+                frozenset(site_employees.get(site_id, ())),
+                assigned,
+                allow_global_fallback if allow_global_fallback is not None else True,
+                self._version
+            )
+            for site_id, allow_global_fallback in sites
+        }
+        self._device_sites = dict(device_sites)
+        self._loaded_at = time.monotonic()
+        logger.info(f"Gallery partitions loaded: {len(self._partitions)} sites, "
+                    f"{len(self._device_sites)} devices assigned")
+
+    def partition_for_device(self, db: Session, device_id: Optional[str]) -> Optional[GalleryPartition]:
+        """Partition searched for a kiosk, or None to search the global gallery"""
+        if not self.enabled or not device_id:
+            return None
+        self._ensure_loaded(db)
+        site_id = self._device_sites.get(device_id)
+        return self._partitions.get(site_id) if site_id else None
+
+    def get_stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "sites": {
+                site_id: {
+                    "employees": len(partition.employee_ids),
+                    "allow_global_fallback": partition.allow_global_fallback
+                }
+                for site_id, partition in self._partitions.items()
+            },
+            "devices_assigned": len(self._device_sites),
+            "version": self._version
+        }
+
+# Singleton instance
+_gallery_partitions = None
+
+def get_gallery_partitions() -> GalleryPartitions:
+    """Get process-wide gallery partitions"""
+    global _gallery_partitions
+    if _gallery_partitions is None:
+        _gallery_partitions = GalleryPartitions()
+    return _gallery_partitions
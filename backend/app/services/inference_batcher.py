@@ -0,0 +1,141 @@
+"""
+Inference Micro-Batcher
+Collects work items from concurrent requests (e.g. 20 kiosks posting at
+shift start) for a few milliseconds and runs them through the model as one
+batched forward pass, then fans the results back to each waiting request
+"""
+import asyncio
+import bisect
+import threading
+import time
+import logging
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from app.services.inference_executor import get_inference_executor
+from app.core.exceptions import InferenceTimeoutException
+from app.config.multi_kiosk_config_fixed import multi_kiosk_settings
+
+logger = logging.getLogger(__name__)
+
+class Histogram:
+    """Fixed-bucket histogram; a value lands in the first bucket whose bound is >= value"""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+        self.samples = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.samples += 1
+
+    def to_dict(self) -> Dict:
+        labels = [f"<={bound:g}" for bound in self.bounds] + [f">{self.bounds[-1]:g}"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "count": self.samples,
+            "avg": round(self.total / self.samples, 3) if self.samples else 0.0
+        }
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching for one model stage
+    - The first item of a batch opens a window of window_ms; the batch is
+      flushed when the window closes or max_batch_size items are waiting
+    - batch_fn(items) -> results (same length/order) runs on the inference executor
+    - A failed batch fails every request in it
+    """
+
+    BATCH_SIZE_BOUNDS = (1, 2, 4, 8, 16, 32, 64)
+    QUEUE_WAIT_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100)
+
+    def __init__(self, name: str, batch_fn: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = 16, window_ms: float = 10.0):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.window_ms = window_ms
+        self.inference = get_inference_executor()
+        self._pending: List[tuple] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Histogram(self.BATCH_SIZE_BOUNDS)
+        self._queue_wait_ms = Histogram(self.QUEUE_WAIT_BOUNDS_MS)
+
+    async def submit(self, item: Any, deadline: Optional[float] = None) -> Any:
+        """Queue one item and wait for its result from the next batch"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future, time.perf_counter()))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window_ms / 1000.0, self._flush)
+
+        timeout = max(deadline - loop.time(), 0) if deadline is not None else None
+        try:
+            # Shielded: a timed-out request must not cancel the batch it shares with others
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            raise InferenceTimeoutException(
+                f"Recognition stage '{self.name}' exceeded its deadline",
+                code="INFERENCE_TIMEOUT",
+                details={"stage": self.name}
+            )
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending[:self.max_batch_size], self._pending[self.max_batch_size:]
+        if self._pending:
+            # Overflow from a burst starts the next window immediately
+            self._flush_handle = asyncio.get_running_loop().call_soon(self._flush)
+
+        now = time.perf_counter()
+        with self._stats_lock:
+            self._batch_sizes.observe(len(batch))
+            for _, _, queued_at in batch:
+                self._queue_wait_ms.observe((now - queued_at) * 1000)
+
+        asyncio.ensure_future(self._run_batch(batch))
+
+    async def _run_batch(self, batch: List[tuple]):
+        try:
+            results = await self.inference.run(self.name, self.batch_fn, [item for item, _, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"{self.name} batch returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            logger.error(f"Micro-batch '{self.name}' failed ({len(batch)} items): {e}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def get_stats(self) -> Dict:
+        with self._stats_lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "window_ms": self.window_ms,
+                "pending": len(self._pending),
+                "batch_size": self._batch_sizes.to_dict(),
+                "queue_wait_ms": self._queue_wait_ms.to_dict()
+            }
+
+def create_micro_batcher(name: str, batch_fn: Callable[[List[Any]], List[Any]]) -> MicroBatcher:
+    """MicroBatcher configured from MultiKioskSettings"""
+    return MicroBatcher(
+        name,
+        batch_fn,
+        max_batch_size=multi_kiosk_settings.MICRO_BATCH_MAX_SIZE,
+        window_ms=multi_kiosk_settings.MICRO_BATCH_WINDOW_MS
+    )
@@ -0,0 +1,127 @@
+"""
+Inference Executor
+Runs CPU-bound recognition stages (detection, anti-spoofing, embedding,
+matching, DB writes) on a bounded thread pool so the asyncio event loop keeps
+serving heartbeats and dashboard calls while a frame is being processed
+"""
+import asyncio
+import functools
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from app.core.exceptions import InferenceTimeoutException
+from app.config.multi_kiosk_config_fixed import multi_kiosk_settings
+
+logger = logging.getLogger(__name__)
+
+class InferenceExecutor:
+    """
+    Bounded thread pool for recognition stages
+    - WORKER_THREADS threads; ONNX Runtime / PyTorch / numpy release the GIL
+      while they compute, so the threads run inference in parallel
+    - At most RECOGNITION_QUEUE_SIZE stages queued or running; callers beyond
+      that wait for a slot (within their deadline) instead of piling up
+    - Every request gets a RECOGNITION_TIMEOUT_SECONDS deadline; each stage
+      is awaited for the time remaining until it
+    """
+
+    def __init__(self, max_workers: int = 4, queue_size: int = 50, timeout_seconds: float = 15):
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self.timeout_seconds = timeout_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._stats_lock = threading.Lock()
+        self._stage_stats: Dict[str, Dict[str, float]] = {}
+
+    def deadline(self) -> float:
+        """Event-loop time by which a recognition request must finish"""
+        return asyncio.get_running_loop().time() + self.timeout_seconds
+
+    async def run(self, stage: str, func: Callable, *args,
+                  deadline: Optional[float] = None, **kwargs) -> Any:
+        """
+        Run func(*args, **kwargs) on the pool and await it
+        Raises InferenceTimeoutException when the deadline passes first; the
+        worker thread cannot be interrupted and finishes in the background, so
+        func must not share request state such as the request's DB session
+        """
+        loop = asyncio.get_running_loop()
+        if deadline is None:
+            deadline = loop.time() + self.timeout_seconds
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.queue_size)
+
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            self._record(stage, started, timed_out=True)
+            raise self._timeout(stage)
+
+        try:
+            future = loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+            result = await asyncio.wait_for(future, max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            self._record(stage, started, timed_out=True)
+            logger.warning(f"⏱️ Inference stage '{stage}' timed out")
+            raise self._timeout(stage)
+        finally:
+            self._slots.release()
+
+        self._record(stage, started)
+        return result
+
+    def _timeout(self, stage: str) -> InferenceTimeoutException:
+        return InferenceTimeoutException(
+            f"Recognition stage '{stage}' exceeded {self.timeout_seconds}s",
+            code="INFERENCE_TIMEOUT",
+            details={"stage": stage, "timeout_seconds": self.timeout_seconds}
+        )
+
+    def _record(self, stage: str, started: float, timed_out: bool = False):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            stats = self._stage_stats.setdefault(stage, {"calls": 0, "timeouts": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stats["calls"] += 1
+            stats["timeouts"] += int(timed_out)
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+    def get_stats(self) -> Dict:
+        with self._stats_lock:
+            stages = {
+                stage: {
+                    "calls": int(stats["calls"]),
+                    "timeouts": int(stats["timeouts"]),
+                    "avg_ms": round(stats["total_ms"] / stats["calls"], 2) if stats["calls"] else 0.0,
+                    "max_ms": round(stats["max_ms"], 2)
+                }
+                for stage, stats in self._stage_stats.items()
+            }
+        return {
+            "max_workers": self.max_workers,
+            "queue_size": self.queue_size,
+            "timeout_seconds": self.timeout_seconds,
+            "stages": stages
+        }
+
+    def shutdown(self):
+        """Stop accepting work; running stages are allowed to finish"""
+        self._executor.shutdown(wait=False)
+
+# Singleton instance
+_inference_executor = None
+
+def get_inference_executor() -> InferenceExecutor:
+    """Get process-wide inference executor"""
+    global _inference_executor
+    if _inference_executor is None:
+        _inference_executor = InferenceExecutor(
+            max_workers=multi_kiosk_settings.WORKER_THREADS,
+            queue_size=multi_kiosk_settings.RECOGNITION_QUEUE_SIZE,
+            timeout_seconds=multi_kiosk_settings.RECOGNITION_TIMEOUT_SECONDS
+        )
+    return _inference_executor
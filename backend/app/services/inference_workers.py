@@ -0,0 +1,502 @@
+"""
+Inference Worker Pool
+Dedicated model-serving processes that own the detector, anti-spoofing and
+recognition models, so torch/ultralytics/onnxruntime never share a GIL (or a
+crash) with the API process
+- Decoded frames are copied into a shared-memory ring; only (slot, shape) is
+  sent to the worker - frames are never pickled
+- Workers return small results: face box, liveness, 512-dim embedding (or just
+  the detected faces for the "detect" and "locate" commands used by streaming
+  kiosks and burst ranking)
+- A supervisor thread restarts workers that die or hang; workers that keep
+  failing to load their models are retried with exponential backoff and
+  given up on after MAX_LOAD_FAILURES attempts in a row
+"""
+import os
+import asyncio
+import itertools
+import logging
+import queue
+import threading
+import time
+import multiprocessing as mp
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import cv2
+from app.core.exceptions import FaceRecognitionException, InferenceTimeoutException
+from app.config.multi_kiosk_config_fixed import multi_kiosk_settings
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = 1.0
+RESTART_BACKOFF_SECONDS = 2.0
+MAX_RESTART_BACKOFF_SECONDS = 60.0
+MAX_LOAD_FAILURES = 5
+
+class SharedFrameRing:
+    """
+    Fixed-size frame slots in one shared-memory block
+    The API process owns slot allocation; workers only attach and read
+    """
+
+    def __init__(self, slots: int, slot_bytes: int, name: Optional[str] = None):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self._free: "queue.Queue[int]" = queue.Queue()
+        if self.owner:
+            for slot in range(slots):
+                self._free.put(slot)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def try_acquire(self) -> Optional[int]:
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            return None
+
+    def release(self, slot: int):
+        self._free.put(slot)
+
+    def free_slots(self) -> int:
+        return self._free.qsize()
+
+    def view(self, slot: int, shape: Tuple[int, ...], dtype: str) -> np.ndarray:
+        return np.ndarray(shape, dtype=np.dtype(dtype), buffer=self.shm.buf, offset=slot * self.slot_bytes)
+
+    def write(self, slot: int, frame: np.ndarray):
+        self.view(slot, frame.shape, frame.dtype.str)[...] = frame
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+def _task_frames(ring: SharedFrameRing, tasks: List[tuple]) -> List[np.ndarray]:
+    return [ring.view(slot, shape, dtype) for _, _, slot, shape, dtype, _ in tasks]
+
+def _analyze_batch(ai_service, ring: SharedFrameRing, tasks: List[tuple]) -> List[Dict]:
+    """Detect + align, anti-spoof and embed a batch of frames in one worker"""
+    frames = _task_frames(ring, tasks)
+    faces = [ai_service.detect_and_align(frame, task[5]) for frame, task in zip(frames, tasks)]
+    liveness = ai_service.batch_anti_spoofing(
+        frames, [face.bbox if face is not None else task[5] for face, task in zip(faces, tasks)]
+    )
+    embeddings = iter(ai_service.embed_faces([face for face in faces if face is not None]))
+
+    results = []
+    for frame, task, face, is_real in zip(frames, tasks, faces, liveness):
+        if face is not None:
+            embedding = next(embeddings)
+        elif not ai_service.single_pass_available:
+            embedding = ai_service.extract_embedding(frame, task[5])
+        else:
+            embedding = None
+        results.append({
+            "bbox": face.bbox if face is not None else None,
+            "det_score": face.det_score if face is not None else None,
+            "is_real": bool(is_real),
+            "embedding": embedding
+        })
+    return results
+
+def _detect_batch(ai_service, ring: SharedFrameRing, tasks: List[tuple]) -> List[List[Tuple[tuple, float]]]:
+    """Every confident face per frame: [(bbox, score)]"""
+    return [ai_service.detect_faces(frame) for frame in _task_frames(ring, tasks)]
+
+def _locate_batch(ai_service, ring: SharedFrameRing, tasks: List[tuple]) -> List[Optional[object]]:
+    """Located, landmarked and aligned face per frame (AlignedFace or None)"""
+    return [ai_service.locate_face(frame) for frame in _task_frames(ring, tasks)]
+
+# Commands a worker serves; tasks are (task_id, command, slot, shape, dtype, bbox)
+WORKER_COMMANDS = {
+    "analyze": _analyze_batch,
+    "detect": _detect_batch,
+    "locate": _locate_batch
+}
+
+def _worker_main(worker_key: Tuple[int, int], shm_name: str, slots: int, slot_bytes: int,
+                 requests: "mp.Queue", responses: "mp.Queue", batch_size: int, num_threads: int):
+    """Entry point of a model-serving process"""
+    logging.basicConfig(level=logging.INFO)
+    ring = SharedFrameRing(slots, slot_bytes, name=shm_name)
+    try:
+        import torch
+        torch.set_num_threads(num_threads)
+    except ImportError:
+        pass
+    try:
+        from app.services.real_ai_service import RealAIService
+        ai_service = RealAIService(num_threads=num_threads)
+        ai_service.warm_up_models()
+    except Exception as e:
+        responses.put(("failed", worker_key, None, str(e)))
+        ring.close()
+        return
+
+    responses.put(("ready", worker_key, None, os.getpid()))
+    stopping = False
+    while not stopping:
+        try:
+            task = requests.get(timeout=HEARTBEAT_SECONDS)
+        except queue.Empty:
+            responses.put(("heartbeat", worker_key, None, None))
+            continue
+        if task is None:
+            break
+
+        # Drain whatever else is queued so concurrent frames share one forward pass
+        tasks = [task]
+        while len(tasks) < batch_size:
+            try:
+                task = requests.get_nowait()
+            except queue.Empty:
+                break
+            if task is None:
+                stopping = True
+                break
+            tasks.append(task)
+
+        for command in {task[1] for task in tasks}:
+            batch = [task for task in tasks if task[1] == command]
+            try:
+                for task, result in zip(batch, WORKER_COMMANDS[command](ai_service, ring, batch)):
+                    responses.put(("result", worker_key, task[0], result))
+            except Exception as e:
+                for task in batch:
+                    responses.put(("error", worker_key, task[0], str(e)))
+
+    ring.close()
+
+class _WorkerHandle:
+    def __init__(self, worker_id: int):
+        self.worker_id = worker_id
+        self.generation = 0
+        self.process = None
+        self.requests = None
+        self.ready = False
+        self.pid = None
+        self.last_seen = 0.0
+        self.started_at = 0.0
+        self.restarts = 0
+        self.load_failures = 0  # Consecutive model load failures
+        self.failed = False     # Gave up after MAX_LOAD_FAILURES - never restarted
+        self.last_error = None
+        self.in_flight: Dict[int, float] = {}
+
+    @property
+    def key(self) -> Tuple[int, int]:
+        return (self.worker_id, self.generation)
+
+    @property
+    def restart_backoff(self) -> float:
+        """Delay before a restart, doubling with each consecutive load failure"""
+        return min(RESTART_BACKOFF_SECONDS * (2 ** self.load_failures), MAX_RESTART_BACKOFF_SECONDS)
+
+class InferenceWorkerPool:
+    """
+    Pool of model-serving processes (INFERENCE_WORKER_PROCESSES, 0 = run models in-process)
+    Frames go through a SharedFrameRing of INFERENCE_SHM_SLOTS slots
+    """
+
+    def __init__(self, processes: int = 0, slots: int = 32, slot_bytes: int = 8 << 20,
+                 timeout_seconds: float = 15, batch_size: int = 16):
+        self.processes = processes
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.timeout_seconds = timeout_seconds
+        self.batch_size = batch_size
+        self.hang_seconds = timeout_seconds * 2
+        # Split the cores between workers so their ONNX / torch thread pools don't oversubscribe
+        self.threads_per_worker = max(1, (os.cpu_count() or 1) // max(1, processes))
+        self._ctx = mp.get_context("spawn")  # Never fork a process holding CUDA / ORT state
+        self._lock = threading.Lock()
+        self._workers: List[_WorkerHandle] = []
+        self._tasks: Dict[int, Tuple[Future, int, int]] = {}
+        self._task_ids = itertools.count(1)
+        self._ring: Optional[SharedFrameRing] = None
+        self._responses = None
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.processes > 0
+
+    @property
+    def started(self) -> bool:
+        return self._ring is not None
+
+    def start(self):
+        """Create the frame ring and launch the workers"""
+        if not self.enabled or self.started:
+            return
+        self._ring = SharedFrameRing(self.slots, self.slot_bytes)
+        self._responses = self._ctx.Queue()
+        self._workers = [_WorkerHandle(worker_id) for worker_id in range(self.processes)]
+        for worker in self._workers:
+            self._spawn(worker)
+
+        for target, name in ((self._listen, "inference-listener"), (self._supervise, "inference-supervisor")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"🚀 Inference worker pool started: {self.processes} processes, "
+                    f"{self.slots} x {self.slot_bytes >> 20}MB frame slots")
+
+    def _spawn(self, worker: _WorkerHandle):
+        worker.generation += 1
+        worker.ready = False
+        worker.pid = None
+        worker.requests = self._ctx.Queue()
+        worker.process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker.key, self._ring.name, self.slots, self.slot_bytes,
+                  worker.requests, self._responses, self.batch_size, self.threads_per_worker),
+            name=f"inference-worker-{worker.worker_id}",
+            daemon=True
+        )
+        worker.started_at = worker.last_seen = time.monotonic()
+        worker.process.start()
+
+    async def analyze(self, frame: np.ndarray, bbox: Optional[tuple] = None,
+                      deadline: Optional[float] = None) -> Dict:
+        """
+        Run detection, anti-spoofing and embedding for one frame in a worker
+        Returns: {"bbox", "det_score", "is_real", "embedding"}
+        """
+        result, _ = await self._submit("analyze", frame, bbox, deadline)
+        return result
+
+    async def detect_faces(self, frame: np.ndarray, deadline: Optional[float] = None) -> List[Tuple[tuple, float]]:
+        """All confident faces in a frame, detected in a worker: [(bbox, score)], most confident first"""
+        detections, scale = await self._submit("detect", frame, None, deadline)
+        if scale == 1.0:
+            return detections
+        return [(tuple(int(v / scale) for v in box), score) for box, score in detections]
+
+    async def locate_face(self, frame: np.ndarray, deadline: Optional[float] = None):
+        """Located face of a frame (AlignedFace or None), found in a worker"""
+        face, scale = await self._submit("locate", frame, None, deadline)
+        if face is not None and scale != 1.0:
+            face.bbox = tuple(v / scale for v in face.bbox)
+            face.landmarks = face.landmarks / scale
+        return face
+
+    async def _submit(self, command: str, frame: np.ndarray, bbox: Optional[tuple],
+                      deadline: Optional[float]) -> Tuple[object, float]:
+        """
+        Run a worker command on one frame
+        Returns: (result, scale the frame was shrunk by to fit a slot)
+        """
+        loop = asyncio.get_running_loop()
+        if deadline is None:
+            deadline = loop.time() + self.timeout_seconds
+
+        frame = np.ascontiguousarray(frame)
+        scale = 1.0
+        if frame.nbytes > self.slot_bytes:
+            # Oversized frame - shrink it into a slot (recognition doesn't need the extra pixels)
+            scale = (self.slot_bytes / frame.nbytes) ** 0.5 * 0.99
+            frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            if bbox is not None:
+                bbox = tuple(int(v * scale) for v in bbox)
+
+        slot = None
+        while True:
+            with self._lock:
+                if all(worker.failed for worker in self._workers):
+                    if slot is not None:
+                        self._ring.release(slot)
+                    raise FaceRecognitionException("All inference workers failed to load their models")
+                workers = [worker for worker in self._workers if worker.ready]
+                if slot is None:
+                    slot = self._ring.try_acquire()
+                if workers and slot is not None:
+                    worker = min(workers, key=lambda w: len(w.in_flight))
+                    task_id = next(self._task_ids)
+                    future: Future = Future()
+                    self._ring.write(slot, frame)
+                    self._tasks[task_id] = (future, worker.worker_id, slot)
+                    worker.in_flight[task_id] = time.monotonic()
+                    worker.requests.put((task_id, command, slot, frame.shape, frame.dtype.str, bbox))
+                    break
+            if loop.time() >= deadline:
+                if slot is not None:
+                    self._ring.release(slot)
+                raise InferenceTimeoutException(
+                    "No inference worker available",
+                    code="INFERENCE_TIMEOUT",
+                    details={"stage": "worker_dispatch"}
+                )
+            await asyncio.sleep(0.002)
+
+        try:
+            # Shielded: the slot stays reserved until the worker answers, even if we stop waiting
+            result = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            raise InferenceTimeoutException(
+                "Inference worker did not answer in time",
+                code="INFERENCE_TIMEOUT",
+                details={"stage": "worker"}
+            )
+        return result, scale
+
+    def _worker(self, worker_key: Tuple[int, int]) -> Optional[_WorkerHandle]:
+        worker_id, generation = worker_key
+        if worker_id < len(self._workers) and self._workers[worker_id].generation == generation:
+            return self._workers[worker_id]
+        return None  # Message from a worker generation that was already replaced
+
+    def _complete(self, task_id: int, result=None, error: Optional[Exception] = None):
+        """Resolve a task and free its frame slot (caller holds the lock)"""
+        entry = self._tasks.pop(task_id, None)
+        if entry is None:
+            return
+        future, worker_id, slot = entry
+        self._workers[worker_id].in_flight.pop(task_id, None)
+        self._ring.release(slot)
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _listen(self):
+        while not self._stopping.is_set():
+            try:
+                kind, worker_key, task_id, payload = self._responses.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+
+            with self._lock:
+                worker = self._worker(worker_key)
+                if worker is None:
+                    continue
+                worker.last_seen = time.monotonic()
+
+                if kind == "result":
+                    self._complete(task_id, result=payload)
+                elif kind == "error":
+                    self._complete(task_id, error=FaceRecognitionException(f"Inference worker error: {payload}"))
+                elif kind == "ready":
+                    worker.ready = True
+                    worker.pid = payload
+                    worker.load_failures = 0
+                    logger.info(f"✅ Inference worker {worker.worker_id} ready (pid {payload})")
+                elif kind == "failed":
+                    worker.load_failures += 1
+                    worker.last_error = payload
+                    if worker.load_failures >= MAX_LOAD_FAILURES:
+                        worker.failed = True
+                        logger.critical(f"🛑 Inference worker {worker.worker_id} failed to load models "
+                                        f"{worker.load_failures} times in a row - giving up: {payload}")
+                    else:
+                        logger.error(f"❌ Inference worker {worker.worker_id} failed to load models "
+                                     f"(attempt {worker.load_failures}, retry in {worker.restart_backoff:.0f}s): {payload}")
+
+    def _supervise(self):
+        while not self._stopping.wait(HEARTBEAT_SECONDS):
+            now = time.monotonic()
+            with self._lock:
+                for worker in self._workers:
+                    if worker.failed:
+                        continue
+                    alive = worker.process.is_alive()
+                    hung = any(now - started > self.hang_seconds for started in worker.in_flight.values())
+                    if alive and not hung:
+                        continue
+                    if now - worker.started_at < worker.restart_backoff:
+                        continue
+
+                    if alive:
+                        logger.error(f"⏱️ Inference worker {worker.worker_id} hung - killing pid {worker.pid}")
+                        worker.process.kill()
+                    else:
+                        logger.error(f"💥 Inference worker {worker.worker_id} exited "
+                                     f"(code {worker.process.exitcode}) - restarting")
+                    worker.process.join(timeout=5)
+
+                    for task_id in list(worker.in_flight):
+                        self._complete(task_id, error=FaceRecognitionException("Inference worker crashed"))
+                    worker.restarts += 1
+                    self._spawn(worker)
+
+    def shutdown(self):
+        """Stop the workers and release the shared memory"""
+        if not self.started:
+            return
+        self._stopping.set()
+        for worker in self._workers:
+            try:
+                worker.requests.put(None)
+            except (OSError, ValueError):
+                pass
+        for worker in self._workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.kill()
+        for thread in self._threads:
+            thread.join(timeout=2)
+
+        with self._lock:
+            for task_id in list(self._tasks):
+                self._complete(task_id, error=FaceRecognitionException("Inference worker pool stopped"))
+        self._ring.close()
+        self._ring = None
+        logger.info("🛑 Inference worker pool stopped")
+
+    def get_stats(self) -> Dict:
+        if not self.started:
+            return {"enabled": self.enabled, "started": False}
+        with self._lock:
+            return {
+                "enabled": True,
+                "started": True,
+                "free_frame_slots": self._ring.free_slots(),
+                "frame_slots": self.slots,
+                "in_flight": len(self._tasks),
+                "failed_workers": sum(worker.failed for worker in self._workers),
+                "workers": [
+                    {
+                        "worker_id": worker.worker_id,
+                        "pid": worker.pid,
+                        "ready": worker.ready,
+                        "alive": worker.process.is_alive(),
+                        "in_flight": len(worker.in_flight),
+                        "restarts": worker.restarts,
+                        "load_failures": worker.load_failures,
+                        "failed": worker.failed,
+                        "last_error": worker.last_error
+                    }
+                    for worker in self._workers
+                ]
+            }
+
+# Singleton instance
+_inference_worker_pool = None
+
+def get_inference_worker_pool() -> InferenceWorkerPool:
+    """Get process-wide inference worker pool (started by the app on startup)"""
+    global _inference_worker_pool
+    if _inference_worker_pool is None:
+        _inference_worker_pool = InferenceWorkerPool(
+            processes=multi_kiosk_settings.INFERENCE_WORKER_PROCESSES,
+            slots=multi_kiosk_settings.INFERENCE_SHM_SLOTS,
+            slot_bytes=multi_kiosk_settings.INFERENCE_SHM_SLOT_MB << 20,
+            timeout_seconds=multi_kiosk_settings.RECOGNITION_TIMEOUT_SECONDS,
+            batch_size=multi_kiosk_settings.MICRO_BATCH_MAX_SIZE
+        )
+    return _inference_worker_pool
@@ -0,0 +1,208 @@
+"""
+Matcher Backends for the Template Index
+Exact brute-force search or approximate nearest-neighbour (FAISS HNSW / IVF)
+candidate generation over the normalized template matrix
+"""
+import numpy as np
+import logging
+from typing import Dict, Optional
+
+# Optional ANN dependency
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+    logging.warning("FAISS not available. Template matching will use exact search only.")
+
+logger = logging.getLogger(__name__)
+
+class ExactBackend:
+    """
+    Brute-force backend - every row is a candidate
+    The template index scores them all with one matrix-vector product
+    """
+
+    name = "exact"
+    approximate = False
+    needs_rebuild = False
+
+    def rebuild(self, vectors: np.ndarray, rows: np.ndarray):
+        pass
+
+    def add(self, row: int, vector: np.ndarray):
+        pass
+
+    def remove(self, row: int):
+        pass
+
+    def search(self, query: np.ndarray, top_k: int) -> Optional[np.ndarray]:
+        """Returns candidate rows, or None to scan the whole matrix"""
+        return None
+
+    def get_params(self) -> Dict:
+        return {}
+
+class FaissBackend:
+    """
+    Base class for FAISS inner-product backends
+    Rows are used as FAISS ids; candidates are re-ranked exactly by the index
+    """
+
+    name = "faiss"
+    approximate = True
+
+    # Rebuild once this fraction of graph entries point at removed/re-used rows
+    REBUILD_STALE_RATIO = 0.3
+
+    def __init__(self, dim: int):
+        if not FAISS_AVAILABLE:
+            raise ImportError("faiss is required for ANN matching - pip install faiss-cpu")
+        self.dim = dim
+        self._index = None
+        self._entries = 0
+        self._stale = 0
+        self._needs_rebuild = False
+
+    def _create_index(self, vectors: np.ndarray, rows: np.ndarray):
+        raise NotImplementedError
+
+    @property
+    def needs_rebuild(self) -> bool:
+        return self._needs_rebuild
+
+    def rebuild(self, vectors: np.ndarray, rows: np.ndarray):
+        """Rebuild over the float32 vectors of the given rows"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self._index = self._create_index(vectors, rows)
+        if self._index is not None and len(rows) > 0:
+            self._index.add_with_ids(vectors, rows.astype(np.int64))
+        self._entries = len(rows)
+        self._stale = 0
+        self._needs_rebuild = False
+        logger.info(f"🔧 {self.name} backend built over {len(rows)} templates")
+
+    def add(self, row: int, vector: np.ndarray):
+        if self._index is None:
+            return
+        self._index.add_with_ids(
+            np.ascontiguousarray(vector.reshape(1, -1), dtype=np.float32),
+            np.array([row], dtype=np.int64)
+        )
+        self._entries += 1
+
+    def remove(self, row: int):
+        # Removed rows stay in the graph and are filtered out during re-ranking
+        self._stale += 1
+        if self._entries and self._stale > self._entries * self.REBUILD_STALE_RATIO:
+            self._needs_rebuild = True
+
+    def search(self, query: np.ndarray, top_k: int) -> Optional[np.ndarray]:
+        if self._index is None:
+            return None
+        _, ids = self._index.search(np.ascontiguousarray(query.reshape(1, -1), dtype=np.float32), top_k)
+        ids = ids[0]
+        return np.unique(ids[ids >= 0])
+
+class HNSWBackend(FaissBackend):
+    """HNSW graph over normalized embeddings (inner product == cosine)"""
+
+    name = "hnsw"
+
+    def __init__(self, dim: int, m: int = 32, ef_construction: int = 200, ef_search: int = 128):
+        super().__init__(dim)
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+
+    def _create_index(self, vectors: np.ndarray, rows: np.ndarray):
+        hnsw = faiss.IndexHNSWFlat(self.dim, self.m, faiss.METRIC_INNER_PRODUCT)
+        hnsw.hnsw.efConstruction = self.ef_construction
+        hnsw.hnsw.efSearch = self.ef_search
+        return faiss.IndexIDMap(hnsw)
+
+    def get_params(self) -> Dict:
+        return {
+            "m": self.m,
+            "ef_construction": self.ef_construction,
+            "ef_search": self.ef_search,
+            "entries": self._entries,
+            "stale_entries": self._stale
+        }
+
+class IVFBackend(FaissBackend):
+    """Inverted-file index; falls back to exact search until there is enough data to train"""
+
+    name = "ivf"
+
+    # Training needs a few points per list to give useful centroids
+    MIN_POINTS_PER_LIST = 39
+
+    def __init__(self, dim: int, nlist: int = 1024, nprobe: int = 16):
+        super().__init__(dim)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self._quantizer = None
+        self._built_with = 0
+
+    def _create_index(self, vectors: np.ndarray, rows: np.ndarray):
+        self._built_with = len(vectors)
+        nlist = min(self.nlist, len(vectors) // self.MIN_POINTS_PER_LIST)
+        if nlist < 1:
+            logger.info(f"IVF backend: {len(vectors)} templates is too few to train, using exact search")
+            return None
+
+        quantizer = faiss.IndexFlatIP(self.dim)
+        ivf = faiss.IndexIVFFlat(quantizer, self.dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        ivf.train(vectors)
+        ivf.nprobe = min(self.nprobe, nlist)
+        # The IVF index does not own its quantizer - keep it alive here
+        self._quantizer = quantizer
+        return ivf
+
+    def add(self, row: int, vector: np.ndarray):
+        if self._index is None:
+            self._entries += 1
+            # Retry training once the gallery has doubled since the last attempt
+            if self._entries >= max(self.MIN_POINTS_PER_LIST, 2 * self._built_with):
+                self._needs_rebuild = True
+            return
+        super().add(row, vector)
+
+    def remove(self, row: int):
+        if self._index is None:
+            self._entries = max(0, self._entries - 1)
+            return
+        # IVF supports real removal, no tombstones needed
+        self._index.remove_ids(np.array([row], dtype=np.int64))
+        self._entries = max(0, self._entries - 1)
+
+    def get_params(self) -> Dict:
+        return {
+            "nlist": self.nlist,
+            "nprobe": self.nprobe,
+            "trained": self._index is not None,
+            "entries": self._entries
+        }
+
+def create_matcher_backend(name: str, dim: int, settings) -> object:
+    """
+    Create the configured matcher backend
+    Falls back to exact search if the ANN backend is unavailable
+    """
+    name = (name or "exact").lower()
+    try:
+        if name == "hnsw":
+            return HNSWBackend(
+                dim,
+                m=settings.HNSW_M,
+                ef_construction=settings.HNSW_EF_CONSTRUCTION,
+                ef_search=settings.HNSW_EF_SEARCH
+            )
+        if name == "ivf":
+            return IVFBackend(dim, nlist=settings.IVF_NLIST, nprobe=settings.IVF_NPROBE)
+        if name != "exact":
+            logger.warning(f"Unknown matcher backend '{name}', using exact search")
+    except ImportError as e:
+        logger.warning(f"⚠️ {e} - using exact search")
+    return ExactBackend()
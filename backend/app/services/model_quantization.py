@@ -0,0 +1,289 @@
+"""
+INT8 Model Quantization
+Builds the "int8" model profile: static INT8 variants of the YOLO detector,
+the YOLO anti-spoof classifier and the InsightFace buffalo_l pack, calibrated
+on real kiosk captures and stored next to the FP32 models (data/models_int8)
+
+Usage:
+    python -m app.services.model_quantization --calibration data/calibration --holdout data/holdout
+"""
+import argparse
+import json
+import shutil
+import tempfile
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import cv2
+from app.services.onnx_models import OnnxYoloClassifier, OnnxYoloDetector, export_yolo_onnx
+from app.core.exceptions import ValidationException
+from app.config.multi_kiosk_config_fixed import multi_kiosk_settings
+
+# Quantization tooling is only needed to build the profile, not to serve it
+try:
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+    QUANTIZATION_AVAILABLE = True
+except ImportError:
+    CalibrationDataReader = object
+    QUANTIZATION_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp"}
+
+# FP32 sources in load priority order (same as RealAIService)
+DETECTOR_WEIGHTS = ["detection/yolov11s.pt", "detection/yolov8n-face.pt", "detection/yolov8n.pt"]
+ANTI_SPOOF_WEIGHTS = ["classification/yolov11s-cls.pt", "classification/yolov8n-cls.pt"]
+RECOGNITION_PACKS = ["recognition/buffalo_l", "recognition/buffalo_s"]
+
+def quantized_model_dir(model_path: Path) -> Path:
+    """INT8 profile directory next to the FP32 model directory (data/models -> data/models_int8)"""
+    return model_path.parent / f"{model_path.name}_int8"
+
+def read_manifest(quantized_dir: Path) -> Optional[Dict]:
+    manifest_path = quantized_dir / MANIFEST_NAME
+    if not manifest_path.exists():
+        return None
+    return json.loads(manifest_path.read_text())
+
+def recognizer_gate(quantized_dir: Path, min_agreement: float) -> Tuple[bool, Optional[float]]:
+    """
+    Whether the quantized recognizer may be activated under the configured bound
+    Returns: (allowed, measured mean cosine agreement with the FP32 model)
+    """
+    manifest = read_manifest(quantized_dir) or {}
+    recognition = manifest.get("models", {}).get("recognition")
+    if not recognition or "cosine_agreement" not in recognition:
+        return False, None
+    agreement = recognition["cosine_agreement"]["mean"]
+    return agreement >= min_agreement, agreement
+
+class _FeedReader(CalibrationDataReader):
+    """Feeds precomputed input tensors to the calibrator one at a time"""
+
+    def __init__(self, input_name: str, tensors: Iterable[np.ndarray]):
+        self._feeds = iter([{input_name: tensor} for tensor in tensors])
+
+    def get_next(self):
+        return next(self._feeds, None)
+
+def _load_images(folder: Path, limit: int) -> List[np.ndarray]:
+    """BGR images, as the YOLO models receive frames"""
+    images = []
+    for path in sorted(folder.rglob("*")):
+        if path.suffix.lower() not in IMAGE_SUFFIXES:
+            continue
+        image = cv2.imread(str(path))
+        if image is not None:
+            images.append(image)
+        if len(images) >= limit:
+            break
+    return images
+
+def _first_existing(model_path: Path, candidates: List[str]) -> Optional[Path]:
+    for candidate in candidates:
+        if (model_path / candidate).exists():
+            return model_path / candidate
+    return None
+
+def _quantize(source: Path, target: Path, input_name: str, tensors: List[np.ndarray]):
+    """Static INT8 quantization (QDQ, per-channel weights) calibrated on tensors"""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        prepared = Path(tmp) / "prepared.onnx"
+        try:
+            # Shape inference + graph cleanup recommended before static quantization
+            quant_pre_process(str(source), str(prepared))
+        except Exception as e:
+            logger.warning(f"⚠️ Pre-processing skipped for {source.name}: {e}")
+            prepared = source
+
+        quantize_static(
+            str(prepared),
+            str(target),
+            _FeedReader(input_name, tensors),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True
+        )
+
+    # Keep export metadata (class names, image size) the runtime reads
+    fp32_model, int8_model = onnx.load(str(source)), onnx.load(str(target))
+    if fp32_model.metadata_props and not int8_model.metadata_props:
+        int8_model.metadata_props.extend(fp32_model.metadata_props)
+        onnx.save(int8_model, str(target))
+
+    logger.info(f"✅ {source.name}: {source.stat().st_size / (1024 * 1024):.1f}MB -> "
+                f"{target.stat().st_size / (1024 * 1024):.1f}MB INT8")
+
+def _quantize_yolo(weights: Path, model_class, imgsz: int, output_dir: Path,
+                   model_path: Path, images: List[np.ndarray]) -> Dict:
+    fp32 = export_yolo_onnx(weights, imgsz=imgsz) if weights.suffix == ".pt" else weights
+    model = model_class(fp32)
+    if model_class is OnnxYoloDetector:
+        tensors = [model.preprocess([image])[0] for image in images]
+    else:
+        tensors = [model.preprocess([image]) for image in images]
+
+    relative = weights.relative_to(model_path).with_suffix(".onnx")
+    _quantize(fp32, output_dir / relative, model.input_name, tensors)
+    return {"source": str(fp32), "artifact": str(relative)}
+
+def _scrfd_blob(det_model, image: np.ndarray) -> np.ndarray:
+    """SCRFD input for an RGB image exactly as insightface's detector builds it (aspect-preserving resize, top-left pad)"""
+    input_w, input_h = det_model.input_size
+    ratio = min(input_h / image.shape[0], input_w / image.shape[1])
+    new_w, new_h = int(image.shape[1] * ratio), int(image.shape[0] * ratio)
+    canvas = np.zeros((input_h, input_w, 3), dtype=np.uint8)
+    canvas[:new_h, :new_w] = cv2.resize(image, (new_w, new_h))
+    return cv2.dnn.blobFromImage(canvas, 1.0 / det_model.input_std, (input_w, input_h),
+                                 (det_model.input_mean,) * 3, swapRB=True)
+
+def _aligned_blobs(face_analysis, images: List[np.ndarray]) -> List[np.ndarray]:
+    """ArcFace inputs from RGB images: largest face per image, aligned with the FP32 detector's landmarks"""
+    from insightface.utils import face_align
+    rec_model = face_analysis.models["recognition"]
+    blobs = []
+    for image in images:
+        faces = face_analysis.get(image)
+        if not faces:
+            continue
+        face = max(faces, key=lambda f: (f.bbox[2] - f.bbox[0]) * (f.bbox[3] - f.bbox[1]))
+        aligned = face_align.norm_crop(image, landmark=face.kps, image_size=rec_model.input_size[0])
+        blobs.append(cv2.dnn.blobFromImage(aligned, 1.0 / rec_model.input_std, rec_model.input_size,
+                                           (rec_model.input_mean,) * 3, swapRB=True))
+    return blobs
+
+def _embeddings(model_file: Path, blobs: List[np.ndarray]) -> np.ndarray:
+    import onnxruntime as ort
+    session = ort.InferenceSession(str(model_file), providers=["CPUExecutionProvider"])
+    input_name = session.get_inputs()[0].name
+    embeddings = np.concatenate([session.run(None, {input_name: blob})[0] for blob in blobs])
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+def _quantize_recognition(pack: Path, output_dir: Path, model_path: Path, calibration: List[np.ndarray],
+                          holdout: List[np.ndarray], min_agreement: float) -> Dict:
+    import insightface
+    face_analysis = insightface.app.FaceAnalysis(
+        name=pack.name, root=str(pack.parent), providers=["CPUExecutionProvider"],
+        allowed_modules=["detection", "recognition"]
+    )
+    face_analysis.prepare(ctx_id=0, det_size=(640, 640))
+    det_model, rec_model = face_analysis.det_model, face_analysis.models["recognition"]
+
+    # The service feeds the InsightFace models RGB frames (Frame.rgb) - calibrate and gate on the same
+    calibration = [cv2.cvtColor(image, cv2.COLOR_BGR2RGB) for image in calibration]
+    holdout = [cv2.cvtColor(image, cv2.COLOR_BGR2RGB) for image in holdout]
+
+    calibration_faces = _aligned_blobs(face_analysis, calibration)
+    holdout_faces = _aligned_blobs(face_analysis, holdout)
+    if not calibration_faces or not holdout_faces:
+        raise ValidationException(
+            "No faces found in the calibration or held-out images",
+            code="QUANTIZATION_NO_FACES",
+            details={"calibration_faces": len(calibration_faces), "holdout_faces": len(holdout_faces)}
+        )
+
+    # Unquantized modules (landmarks, gender/age) are copied so the pack stays complete;
+    # the layout under the root mirrors wherever FaceAnalysis resolved the pack from
+    relative = pack.relative_to(model_path)
+    shutil.copytree(pack, output_dir / relative, dirs_exist_ok=True)
+    det_file, rec_file = Path(det_model.model_file), Path(rec_model.model_file)
+    target_pack = output_dir / relative.parent / rec_file.parent.relative_to(pack.parent)
+    if target_pack != output_dir / relative:
+        shutil.copytree(rec_file.parent, target_pack, dirs_exist_ok=True)
+
+    _quantize(det_file, target_pack / det_file.name, det_model.input_name,
+              [_scrfd_blob(det_model, image) for image in calibration])
+    _quantize(rec_file, target_pack / rec_file.name, rec_model.input_name, calibration_faces)
+
+    # Accuracy gate: same aligned held-out crops through both recognizers
+    agreement = np.sum(_embeddings(rec_file, holdout_faces) * _embeddings(target_pack / rec_file.name, holdout_faces), axis=1)
+    result = {
+        "source": str(pack),
+        "artifact": str(relative),
+        "cosine_agreement": {
+            "mean": round(float(agreement.mean()), 5),
+            "min": round(float(agreement.min()), 5),
+            "p05": round(float(np.percentile(agreement, 5)), 5),
+            "samples": int(len(agreement))
+        },
+        "min_required": min_agreement,
+        "passed": bool(agreement.mean() >= min_agreement)
+    }
+    status = "✅" if result["passed"] else "❌"
+    logger.info(f"{status} INT8 recognizer cosine agreement {agreement.mean():.4f} "
+                f"(min {agreement.min():.4f}, required {min_agreement})")
+    return result
+
+def quantize_models(model_path: Path, calibration_dir: Path, holdout_dir: Path,
+                    output_dir: Optional[Path] = None, min_agreement: Optional[float] = None,
+                    max_images: int = 300) -> Dict:
+    """
+    Build the INT8 profile and write its manifest
+    The recognizer is written even when it fails the accuracy gate; the
+    manifest records the agreement and the service refuses to activate it
+    """
+    if not QUANTIZATION_AVAILABLE:
+        raise ValidationException(
+            "onnx / onnxruntime.quantization not installed",
+            code="QUANTIZATION_UNAVAILABLE"
+        )
+    output_dir = output_dir or quantized_model_dir(model_path)
+    min_agreement = min_agreement if min_agreement is not None else multi_kiosk_settings.QUANTIZED_MIN_COSINE_AGREEMENT
+
+    calibration = _load_images(calibration_dir, max_images)
+    holdout = _load_images(holdout_dir, max_images)
+    if not calibration or not holdout:
+        raise ValidationException(
+            "Calibration and held-out folders must contain images",
+            code="QUANTIZATION_NO_IMAGES",
+            details={"calibration_images": len(calibration), "holdout_images": len(holdout)}
+        )
+    logger.info(f"🧮 Quantizing with {len(calibration)} calibration / {len(holdout)} held-out images")
+
+    models = {}
+    detector = _first_existing(model_path, DETECTOR_WEIGHTS)
+    if detector:
+        models["detection"] = _quantize_yolo(detector, OnnxYoloDetector, 640, output_dir, model_path, calibration)
+    anti_spoof = _first_existing(model_path, ANTI_SPOOF_WEIGHTS)
+    if anti_spoof:
+        models["classification"] = _quantize_yolo(anti_spoof, OnnxYoloClassifier, 224, output_dir, model_path, calibration)
+    pack = _first_existing(model_path, RECOGNITION_PACKS)
+    if pack:
+        models["recognition"] = _quantize_recognition(pack, output_dir, model_path, calibration, holdout, min_agreement)
+
+    manifest = {
+        "profile": "int8",
+        "created_at": datetime.now().isoformat(),
+        "calibration_images": len(calibration),
+        "holdout_images": len(holdout),
+        "models": models
+    }
+    output_dir.mkdir(parents=True, exist_ok=True)
+    (output_dir / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2))
+    logger.info(f"📦 INT8 profile written to {output_dir}")
+    return manifest
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the INT8 model profile")
+    parser.add_argument("--calibration", type=Path, required=True, help="Folder of real kiosk captures")
+    parser.add_argument("--holdout", type=Path, required=True, help="Held-out captures for the accuracy gate")
+    parser.add_argument("--models", type=Path, default=Path("data/models"), help="FP32 model directory")
+    parser.add_argument("--output", type=Path, default=None, help="Defaults to <models>_int8")
+    parser.add_argument("--min-agreement", type=float, default=None,
+                        help="Minimum mean cosine agreement (default QUANTIZED_MIN_COSINE_AGREEMENT)")
+    parser.add_argument("--max-images", type=int, default=300)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    result = quantize_models(args.models, args.calibration, args.holdout, args.output,
+                             args.min_agreement, args.max_images)
+    recognition = result["models"].get("recognition")
+    raise SystemExit(0 if recognition is None or recognition["passed"] else 1)
@@ -0,0 +1,102 @@
+"""
+Model Registry
+Loads each model artifact once per process and hands out the shared handle,
+so enrollment, recognition and admin endpoints all use the same instances
+"""
+import os
+import threading
+import time
+import logging
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# Resident memory reporting is best-effort
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+def _resident_bytes() -> Optional[int]:
+    if not PSUTIL_AVAILABLE:
+        return None
+    return psutil.Process(os.getpid()).memory_info().rss
+
+class _ModelEntry:
+    def __init__(self, name: str, handle: Any, artifact: Optional[str],
+                 load_seconds: float, resident_bytes: Optional[int]):
+        self.name = name
+        self.handle = handle
+        self.artifact = artifact
+        self.load_seconds = load_seconds
+        # Growth of process RSS while the model loaded - an estimate of its resident footprint
+        self.resident_bytes = resident_bytes
+        self.requests = 1
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded models keyed by (kind, artifact, options)
+    - get() loads through the given loader on first use, later calls return the same handle
+    - Loads are serialized so two threads never load the same artifact twice
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries: Dict[Hashable, _ModelEntry] = {}
+
+    def get(self, key: Hashable, loader: Callable[[], Any], name: Optional[str] = None,
+            artifact: Optional[str] = None) -> Any:
+        """Shared handle for key, loading it with loader() the first time"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.requests += 1
+                return entry.handle
+
+            rss_before = _resident_bytes()
+            started = time.perf_counter()
+            handle = loader()
+            load_seconds = time.perf_counter() - started
+            rss_after = _resident_bytes()
+
+            resident = max(rss_after - rss_before, 0) if rss_before is not None and rss_after is not None else None
+            self._entries[key] = _ModelEntry(name or str(key), handle, artifact, load_seconds, resident)
+            logger.info(f"📦 Model registered: {name or key} ({load_seconds:.1f}s"
+                        f"{f', ~{resident / (1024 * 1024):.0f}MB resident' if resident is not None else ''})")
+            return handle
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            models = []
+            for entry in self._entries.values():
+                artifact_bytes = None
+                if entry.artifact:
+                    path = Path(entry.artifact)
+                    if path.is_file():
+                        artifact_bytes = path.stat().st_size
+                    elif path.is_dir():
+                        artifact_bytes = sum(f.stat().st_size for f in path.glob("*.onnx"))
+                models.append({
+                    "name": entry.name,
+                    "artifact": entry.artifact,
+                    "artifact_mb": round(artifact_bytes / (1024 * 1024), 1) if artifact_bytes is not None else None,
+                    "resident_mb": round(entry.resident_bytes / (1024 * 1024), 1) if entry.resident_bytes is not None else None,
+                    "load_seconds": round(entry.load_seconds, 2),
+                    "requests": entry.requests
+                })
+            return {
+                "models": models,
+                "process_resident_mb": round(_resident_bytes() / (1024 * 1024), 1) if PSUTIL_AVAILABLE else None
+            }
+
+# Singleton instance
+_model_registry = None
+
+def get_model_registry() -> ModelRegistry:
+    """Get process-wide model registry"""
+    global _model_registry
+    if _model_registry is None:
+        _model_registry = ModelRegistry()
+    return _model_registry
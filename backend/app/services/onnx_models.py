@@ -0,0 +1,215 @@
+"""
+ONNX Runtime YOLO Models
+Ultralytics detector / classifier weights exported once to ONNX and run
+through onnxruntime with vectorized numpy pre/post-processing and NMS,
+so inference needs neither torch nor ultralytics
+"""
+import os
+import ast
+import logging
+from pathlib import Path
+from typing import Dict, List, Tuple
+import numpy as np
+import cv2
+
+# Optional runtime - callers fall back to ultralytics when missing
+try:
+    import onnxruntime as ort
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+ONNX_CACHE_DIR = "onnx"  # Sub-directory next to the .pt weights
+
+def available_providers() -> List[str]:
+    """CUDA first when onnxruntime-gpu is installed"""
+    if "CUDAExecutionProvider" in ort.get_available_providers():
+        return ["CUDAExecutionProvider", "CPUExecutionProvider"]
+    return ["CPUExecutionProvider"]
+
+def export_yolo_onnx(weights: Path, imgsz: int) -> Path:
+    """
+    Export Ultralytics weights to ONNX once; the export is cached under
+    <weights dir>/onnx/ and redone only when the .pt file is newer
+    Needs ultralytics (and torch, see requirements_export.txt) only when an export actually runs
+    """
+    target = weights.parent / ONNX_CACHE_DIR / f"{weights.stem}.onnx"
+    if target.exists() and target.stat().st_mtime >= weights.stat().st_mtime:
+        return target
+
+    from ultralytics import YOLO
+    logger.info(f"📤 Exporting {weights.name} to ONNX ({imgsz}px, dynamic batch)...")
+    exported = Path(YOLO(str(weights)).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True))
+    target.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(exported, target)
+    logger.info(f"✅ ONNX export cached: {target}")
+    return target
+
+def create_session(model_path: Path, session_options=None) -> "ort.InferenceSession":
+    """InferenceSession with every graph optimization enabled"""
+    options = session_options or ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(str(model_path), sess_options=options, providers=available_providers())
+
+def rebind_sessions(models: Dict[str, object], session_options) -> int:
+    """
+    Recreate the InferenceSession of every loaded InsightFace model with session_options
+    InsightFace's model zoo only forwards providers to the sessions it creates, so
+    thread limits have to be applied afterwards; input/output names are unchanged
+    Returns: number of sessions replaced
+    """
+    replaced = 0
+    for model in models.values():
+        model_file = getattr(model, "model_file", None)
+        if model_file is None or getattr(model, "session", None) is None:
+            continue
+        model.session = create_session(Path(model_file), session_options)
+        replaced += 1
+    return replaced
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """Greedy non-maximum suppression; returns kept indices, best first"""
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size:
+        best, rest = order[0], order[1:]
+        keep.append(best)
+        inter_w = (np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest])).clip(0)
+        inter_h = (np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest])).clip(0)
+        inter = inter_w * inter_h
+        iou = inter / (areas[best] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+def to_input_batch(images: List[np.ndarray]) -> np.ndarray:
+    """Same-size BGR HWC uint8 images -> RGB NCHW float32 in [0, 1]"""
+    batch = np.stack(images)[..., ::-1].transpose(0, 3, 1, 2)
+    return np.ascontiguousarray(batch, dtype=np.float32) / 255.0
+
+class OnnxYoloModel:
+    """Shared session handling and Ultralytics export metadata (class names, image size)"""
+
+    def __init__(self, model_path: Path, session_options=None):
+        self.model_path = model_path
+        self.session = create_session(model_path, session_options)
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Exported with dynamic=True the batch dimension is symbolic
+        self.dynamic_batch = not isinstance(model_input.shape[0], int)
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names: Dict[int, str] = ast.literal_eval(metadata["names"]) if "names" in metadata else {}
+        if "imgsz" in metadata:
+            imgsz = ast.literal_eval(metadata["imgsz"])[0]
+        else:
+            # Not an Ultralytics export - use the static input size if the graph has one
+            imgsz = model_input.shape[2] if isinstance(model_input.shape[2], int) else 640
+        self.imgsz = int(imgsz)
+
+    def _run(self, batch: np.ndarray) -> np.ndarray:
+        if self.dynamic_batch:
+            return self.session.run(None, {self.input_name: batch})[0]
+        return np.concatenate([self.session.run(None, {self.input_name: item[None]})[0] for item in batch])
+
+class OnnxYoloDetector(OnnxYoloModel):
+    """YOLOv8/v11 detection head: output (N, 4 + classes, anchors) in letterboxed pixels"""
+
+    def __init__(self, model_path: Path, session_options=None, conf_threshold: float = 0.25,
+                 iou_threshold: float = 0.45, max_detections: int = 100):
+        super().__init__(model_path, session_options)
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+        self.max_detections = max_detections
+
+    def _letterbox(self, image: np.ndarray) -> Tuple[np.ndarray, float, Tuple[float, float]]:
+        """Resize keeping aspect ratio, pad to imgsz x imgsz with gray (same as Ultralytics LetterBox)"""
+        h, w = image.shape[:2]
+        ratio = min(self.imgsz / h, self.imgsz / w)
+        new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+        pad_w, pad_h = (self.imgsz - new_w) / 2, (self.imgsz - new_h) / 2
+
+        resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR) if (new_w, new_h) != (w, h) else image
+        top, left = int(round(pad_h - 0.1)), int(round(pad_w - 0.1))
+        canvas = np.full((self.imgsz, self.imgsz, 3), 114, dtype=np.uint8)
+        canvas[top:top + new_h, left:left + new_w] = resized
+        return canvas, ratio, (left, top)
+
+    def preprocess(self, images: List[np.ndarray]) -> Tuple[np.ndarray, List[tuple]]:
+        """Model input batch for BGR images plus the letterbox parameters per image"""
+        letterboxed = [self._letterbox(image) for image in images]
+        return to_input_batch([canvas for canvas, _, _ in letterboxed]), letterboxed
+
+    def detect(self, images: List[np.ndarray]) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Detect objects in BGR images
+        Returns per image: (boxes xyxy in image pixels, scores, class ids), best first
+        """
+        batch, letterboxed = self.preprocess(images)
+        outputs = self._run(batch)
+
+        results = []
+        for output, image, (_, ratio, (left, top)) in zip(outputs, images, letterboxed):
+            predictions = output.T  # (anchors, 4 + classes)
+            class_scores = predictions[:, 4:]
+            class_ids = class_scores.argmax(axis=1)
+            scores = class_scores[np.arange(len(class_ids)), class_ids]
+            mask = scores >= self.conf_threshold
+            if not mask.any():
+                results.append((np.empty((0, 4), np.float32), np.empty(0, np.float32), np.empty(0, np.int64)))
+                continue
+
+            xywh, scores, class_ids = predictions[mask, :4], scores[mask], class_ids[mask]
+            boxes = np.concatenate([xywh[:, :2] - xywh[:, 2:] / 2, xywh[:, :2] + xywh[:, 2:] / 2], axis=1)
+
+            # Class-aware NMS by offsetting each class into its own coordinate range
+            keep = nms(boxes + class_ids[:, None] * 4096.0, scores, self.iou_threshold)[:self.max_detections]
+            boxes, scores, class_ids = boxes[keep], scores[keep], class_ids[keep]
+
+            # Undo letterbox
+            h, w = image.shape[:2]
+            boxes = (boxes - np.array([left, top, left, top], dtype=np.float32)) / ratio
+            boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, w)
+            boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, h)
+            results.append((boxes, scores, class_ids))
+
+        return results
+
+class OnnxYoloClassifier(OnnxYoloModel):
+    """YOLO classification head: output (N, classes) probabilities"""
+
+    def _crop(self, image: np.ndarray) -> np.ndarray:
+        """Center square crop + resize to imgsz (same as Ultralytics classify CenterCrop)"""
+        h, w = image.shape[:2]
+        side = min(h, w)
+        top, left = (h - side) // 2, (w - side) // 2
+        crop = image[top:top + side, left:left + side]
+        if crop.shape[:2] == (self.imgsz, self.imgsz):
+            return crop
+        return cv2.resize(crop, (self.imgsz, self.imgsz), interpolation=cv2.INTER_LINEAR)
+
+    def preprocess(self, images: List[np.ndarray]) -> np.ndarray:
+        """Model input batch for BGR images"""
+        return to_input_batch([self._crop(image) for image in images])
+
+    def predict(self, images: List[np.ndarray]) -> np.ndarray:
+        """Class probabilities for BGR images, shape (N, classes)"""
+        probs = self._run(self.preprocess(images))
+
+        # Exported classifiers normally end in softmax; normalize if this one doesn't
+        if not np.allclose(probs.sum(axis=1), 1.0, atol=1e-3):
+            exp = np.exp(probs - probs.max(axis=1, keepdims=True))
+            probs = exp / exp.sum(axis=1, keepdims=True)
+        return probs
+
+def load_yolo_onnx(weights: Path, task: str, session_options=None) -> OnnxYoloModel:
+    """ONNX Runtime model for Ultralytics weights (.pt exported on first use, or an .onnx file)"""
+    if weights.suffix == ".pt":
+        model_path = export_yolo_onnx(weights, imgsz=224 if task == "classify" else 640)
+    else:
+        model_path = weights
+    model_class = OnnxYoloClassifier if task == "classify" else OnnxYoloDetector
+    return model_class(model_path, session_options)
@@ -0,0 +1,237 @@
+"""
+Frame Quality Gate
+Cheap checks that reject unusable kiosk frames (too dark, overexposed,
+blurred, face too small) before detection, anti-spoofing and embedding run
+"""
+import threading
+import logging
+from typing import Dict, List, Optional, Sequence, Union
+import numpy as np
+import cv2
+from app.core.exceptions import FrameQualityException, ErrorCodes
+from app.services.frame import Frame, as_frame
+from app.config.multi_kiosk_config_fixed import multi_kiosk_settings
+
+logger = logging.getLogger(__name__)
+
+class QualityGate:
+    """
+    Staged cascade, cheapest stage first; the first failing stage rejects the frame
+    - brightness: mean gray level of the frame's longer side downscaled to analysis_width
+    - sharpness: Laplacian variance of the same downscaled image (face region when the box is known)
+    - face_size: shorter side of the face box in decoded-frame pixels
+    Rejections raise FrameQualityException with the stage, reason and measured value
+    """
+
+    STAGES = ("brightness", "sharpness", "face_size")
+
+    RETAKE_MESSAGES = {
+        "too_dark": "Image too dark - please retake in better light",
+        "overexposed": "Image overexposed - please retake",
+        "blurry": "Image blurred - please hold still and retake",
+        "face_too_small": "Face too small - please move closer and retake",
+        "no_face": "No face found - please face the camera and retake"
+    }
+
+    # Burst ranking: weights of the normalized sharpness / face size / frontal pose / exposure scores
+    BURST_WEIGHTS = {"sharpness": 0.4, "face_size": 0.2, "frontal": 0.3, "exposure": 0.1}
+
+    def __init__(self, enabled: bool = True, analysis_width: int = 320,
+                 min_brightness: float = 40.0, max_brightness: float = 230.0,
+                 min_sharpness: float = 25.0, min_face_px: int = 48):
+        self.enabled = enabled
+        self.analysis_width = analysis_width
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.min_sharpness = min_sharpness
+        self.min_face_px = min_face_px
+        self._stats_lock = threading.Lock()
+        self._checked = 0
+        self._rejected = {stage: 0 for stage in self.STAGES}
+        self._burst_frames = 0
+
+    def check_frame(self, image: Union[np.ndarray, Frame], bbox: Optional[Sequence[float]] = None):
+        """
+        Brightness and sharpness of the frame, plus face size when the kiosk sent a box
+        Raises FrameQualityException on the first failing stage
+        """
+        if not self.enabled:
+            return
+        with self._stats_lock:
+            self._checked += 1
+
+        # Cached on the frame - the detector reuses the downscaled view when sizes match
+        frame = as_frame(image)
+        gray = frame.gray(self.analysis_width)
+        brightness = float(gray.mean())
+        if brightness < self.min_brightness:
+            self._reject("brightness", "too_dark", brightness)
+        if brightness > self.max_brightness:
+            self._reject("brightness", "overexposed", brightness)
+
+        region = gray
+        if bbox is not None:
+            # Box in frame pixels -> analysis scale; background blur doesn't matter
+            scale = gray.shape[1] / frame.width
+            x1, y1, x2, y2 = [int(v * scale) for v in bbox[:4]]
+            crop = gray[max(y1, 0):y2, max(x1, 0):x2]
+            if crop.size >= 64:
+                region = crop
+        sharpness = float(cv2.Laplacian(region, cv2.CV_32F).var())
+        if sharpness < self.min_sharpness:
+            self._reject("sharpness", "blurry", sharpness)
+
+        if bbox is not None:
+            self.check_face_size(bbox)
+
+    def check_face_size(self, bbox: Optional[Sequence[float]]):
+        """Face box from the kiosk or the detector; raises FrameQualityException when too small"""
+        if not self.enabled or bbox is None:
+            return
+        face_px = float(min(bbox[2] - bbox[0], bbox[3] - bbox[1]))
+        if face_px < self.min_face_px:
+            self._reject("face_size", "face_too_small", face_px)
+
+    def score_burst(self, frames: Sequence[Union[np.ndarray, Frame]], faces: Sequence) -> List[Dict]:
+        """
+        Rank a burst of frames of the same attempt, best first
+        faces: located face per frame (bbox + 5 landmarks, or None)
+        Metrics are computed for all frames at once on their downscaled gray views;
+        each entry has index, score and the metrics, plus rejection (None if usable)
+        """
+        frames = [as_frame(frame) for frame in frames]
+        grays = [frame.gray(self.analysis_width) for frame in frames]
+        brightness = np.array([gray.mean() for gray in grays], dtype=np.float32)
+
+        # One vectorized Laplacian per group of equally sized frames (a burst normally is one group)
+        laplacians: List[Optional[np.ndarray]] = [None] * len(frames)
+        shapes: Dict[tuple, List[int]] = {}
+        for i, gray in enumerate(grays):
+            shapes.setdefault(gray.shape, []).append(i)
+        for indices in shapes.values():
+            for i, laplacian in zip(indices, _laplacian(np.stack([grays[i] for i in indices]))):
+                laplacians[i] = laplacian
+
+        sharpness = np.zeros(len(frames), dtype=np.float32)
+        face_px = np.zeros(len(frames), dtype=np.float32)
+        for i, (frame, face) in enumerate(zip(frames, faces)):
+            region = laplacians[i]
+            if face is not None:
+                # Face region at analysis scale (Laplacian is 1px smaller on every side)
+                scale = grays[i].shape[1] / frame.width
+                x1, y1, x2, y2 = [int(v * scale) for v in face.bbox[:4]]
+                crop = region[max(y1 - 1, 0):max(y2 - 1, 0), max(x1 - 1, 0):max(x2 - 1, 0)]
+                if crop.size >= 64:
+                    region = crop
+                face_px[i] = min(face.bbox[2] - face.bbox[0], face.bbox[3] - face.bbox[1])
+            sharpness[i] = region.var()
+
+        frontal = np.zeros(len(frames), dtype=np.float32)
+        located = [i for i, face in enumerate(faces) if face is not None]
+        if located:
+            frontal[located] = frontal_scores(np.stack([faces[i].landmarks for i in located]))
+
+        exposure = 1.0 - np.abs(brightness - 128.0) / 128.0
+        weights = self.BURST_WEIGHTS
+        scores = (
+            weights["sharpness"] * sharpness / max(float(sharpness.max()), 1e-6)
+            + weights["face_size"] * face_px / max(float(face_px.max()), 1e-6)
+            + weights["frontal"] * frontal
+            + weights["exposure"] * exposure
+        )
+
+        ranked = []
+        for i in range(len(frames)):
+            ranked.append({
+                "index": i,
+                "score": round(float(scores[i]), 4),
+                "brightness": round(float(brightness[i]), 2),
+                "sharpness": round(float(sharpness[i]), 2),
+                "face_px": round(float(face_px[i]), 1),
+                "frontal": round(float(frontal[i]), 3),
+                "rejection": self._burst_rejection(brightness[i], sharpness[i], face_px[i], faces[i] is not None)
+            })
+        with self._stats_lock:
+            self._burst_frames += len(frames)
+        # Usable frames first, then by score
+        return sorted(ranked, key=lambda entry: (entry["rejection"] is not None, -entry["score"]))
+
+    def _burst_rejection(self, brightness: float, sharpness: float, face_px: float, has_face: bool) -> Optional[Dict]:
+        """Same thresholds as the cascade, without raising"""
+        if not self.enabled:
+            return None if has_face else {"stage": "face_size", "reason": "no_face", "value": 0.0}
+        checks = (
+            ("brightness", "too_dark", brightness, brightness < self.min_brightness),
+            ("brightness", "overexposed", brightness, brightness > self.max_brightness),
+            ("sharpness", "blurry", sharpness, sharpness < self.min_sharpness),
+            ("face_size", "no_face", 0.0, not has_face),
+            ("face_size", "face_too_small", face_px, face_px < self.min_face_px)
+        )
+        for stage, reason, value, failed in checks:
+            if failed:
+                return {"stage": stage, "reason": reason, "value": round(float(value), 2)}
+        return None
+
+    def _reject(self, stage: str, reason: str, value: float):
+        with self._stats_lock:
+            self._rejected[stage] += 1
+        logger.info(f"🚫 Frame rejected at {stage}: {reason} ({value:.1f})")
+        raise FrameQualityException(
+            self.RETAKE_MESSAGES[reason],
+            code=ErrorCodes.LOW_FRAME_QUALITY,
+            details={"stage": stage, "reason": reason, "value": round(value, 2)}
+        )
+
+    def get_stats(self) -> Dict:
+        with self._stats_lock:
+            rejected = sum(self._rejected.values())
+            return {
+                "enabled": self.enabled,
+                "checked": self._checked,
+                "passed": self._checked - rejected,
+                "rejected": dict(self._rejected),
+                "burst_frames_scored": self._burst_frames,
+                "thresholds": {
+                    "analysis_width": self.analysis_width,
+                    "min_brightness": self.min_brightness,
+                    "max_brightness": self.max_brightness,
+                    "min_sharpness": self.min_sharpness,
+                    "min_face_px": self.min_face_px
+                }
+            }
+
+def _laplacian(grays: np.ndarray) -> np.ndarray:
+    """4-neighbour Laplacian (cv2.Laplacian ksize=1) of a stack of gray images (N, H, W), interior pixels"""
+    g = grays.astype(np.float32)
+    return g[:, :-2, 1:-1] + g[:, 2:, 1:-1] + g[:, 1:-1, :-2] + g[:, 1:-1, 2:] - 4.0 * g[:, 1:-1, 1:-1]
+
+def frontal_scores(landmarks: np.ndarray) -> np.ndarray:
+    """
+    1.0 for a frontal face, falling to 0 with yaw / pitch, from 5-point landmarks
+    (left eye, right eye, nose, left / right mouth corner) of shape (N, 5, 2)
+    """
+    eyes = (landmarks[:, 0] + landmarks[:, 1]) / 2
+    mouth = (landmarks[:, 3] + landmarks[:, 4]) / 2
+    nose = landmarks[:, 2]
+    eye_distance = np.linalg.norm(landmarks[:, 1] - landmarks[:, 0], axis=1)
+    # Yaw: nose shifted sideways from between the eyes; pitch: nose off the middle of eyes-mouth
+    yaw = np.abs(nose[:, 0] - eyes[:, 0]) / np.maximum(eye_distance, 1.0)
+    pitch = np.abs((nose[:, 1] - eyes[:, 1]) / np.maximum(mouth[:, 1] - eyes[:, 1], 1.0) - 0.5)
+    return np.clip(1.0 - 2.0 * yaw - pitch, 0.0, 1.0)
+
+# Singleton instance
+_quality_gate = None
+
+def get_quality_gate() -> QualityGate:
+    """Get process-wide frame quality gate"""
+    global _quality_gate
+    if _quality_gate is None:
+        _quality_gate = QualityGate(
+            enabled=multi_kiosk_settings.QUALITY_GATE_ENABLED,
+            analysis_width=multi_kiosk_settings.QUALITY_ANALYSIS_WIDTH,
+            min_brightness=multi_kiosk_settings.QUALITY_MIN_BRIGHTNESS,
+            max_brightness=multi_kiosk_settings.QUALITY_MAX_BRIGHTNESS,
+            min_sharpness=multi_kiosk_settings.QUALITY_MIN_SHARPNESS,
+            min_face_px=multi_kiosk_settings.QUALITY_MIN_FACE_PX
+        )
+    return _quality_gate
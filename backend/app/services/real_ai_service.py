@@ -5,22 +5,39 @@ Replaces mock_ai_service.py with actual model implementations
 UPDATES:
 - v1.1: Anti-spoofing now uses full image instead of cropped face for better context analysis
 - Recognition still uses face crops via InsightFace's internal detection for optimal accuracy
+- v1.2: Single-pass pipeline - one detector yields bbox + 5-point landmarks, the face is
+  aligned to 112x112 once and only the ArcFace model runs on it (no second detection)
 """
 import cv2
 import numpy as np
 import logging
-from typing import Tuple, Optional, List
+from typing import Tuple, Optional, List, Union
 from pathlib import Path
 import pickle
 import os
+import queue
+import threading
+import time
+import contextlib
 from sqlalchemy.orm import Session
 
 # Import database services
 from app.services.enhanced_face_embedding_service import face_embedding_service as FaceEmbeddingService
 from app.models.employee import Employee
+from app.services.embedding_gallery import EmbeddingGallery
+from app.config.multi_kiosk_config_fixed import multi_kiosk_settings
+from app.services.model_registry import get_model_registry
+from app.services.onnx_models import (
+    OnnxYoloDetector, OnnxYoloClassifier, load_yolo_onnx, rebind_sessions, ONNXRUNTIME_AVAILABLE
+)
+from app.services.spoof_backends import OnnxClassifierSpoofBackend, create_spoof_backend
+from app.services.model_quantization import quantized_model_dir, recognizer_gate
+from app.utils.image_decode import decode_image
+from app.services.frame import Frame, as_frame, as_array
 
 # Will need these dependencies:
-# pip install onnxruntime insightface ultralytics scikit-learn
+# pip install onnxruntime insightface scikit-learn
+# pip install -r requirements_export.txt only to export .pt weights to ONNX, or as fallback runtime
 
 class AIConfig:
     """Configuration class for AI service optimization"""
@@ -33,8 +50,20 @@ class AIConfig:
     EMBEDDING_CACHE_SIZE = 1000
     FACE_CROP_PADDING = 20
     
+    # Single-pass pipeline: InsightFace's detector locates + aligns the face, YOLO is skipped
+    SINGLE_PASS_PIPELINE = True
+    
+    # Adaptive detector input: smallest size at which a QUALITY_MIN_FACE_PX face still
+    # spans DETECTOR_MIN_FACE_PX (SCRFD's smallest anchors are 16px at stride 8)
+    DETECTOR_INPUT_SIZES = (160, 256, 320, 480, 640)
+    DETECTOR_MIN_FACE_PX = 16
+    
+    # Run YOLO detector / anti-spoof classifier on ONNX Runtime instead of PyTorch
+    USE_ONNX_RUNTIME = True
+    
     # Anti-spoofing settings - using direct classification comparison
-    USE_FULL_IMAGE_FOR_SPOOF = True
+    USE_FULL_IMAGE_FOR_SPOOF = True  # YOLO-cls models; native ONNX anti-spoof models always use a face crop
+    SPOOF_FACE_CROP_SCALE = 2.7  # Face-centred crop side = longer bbox side * scale
     
     # Cosine Similarity settings
     NORMALIZE_EMBEDDINGS_BEFORE_COMPARISON = True
@@ -161,64 +190,68 @@ class CosineSimilarityCalculator:
     
     @staticmethod
     def find_best_matches(query_embedding: np.ndarray,
-                         embeddings: List[Tuple[str, np.ndarray]],
+                         embeddings: Union[List[Tuple[str, np.ndarray]], EmbeddingGallery],
                          threshold: float = 0.7,
                          top_k: int = 1) -> List[Tuple[str, float]]:
         """
-        Find top-k best matches using cosine similarity
+        Find top-k best matching employees using cosine similarity
         
         Args:
             query_embedding: Query embedding vector
-            embeddings: List of (id, embedding) tuples
+            embeddings: Pre-stacked EmbeddingGallery (preferred) or list of (id, embedding) tuples
             threshold: Minimum similarity threshold (use 0.0 to get all matches)
-            top_k: Number of top matches to return
+            top_k: Number of top employees to return
             
         Returns:
-            List of (id, similarity) sorted by similarity (descending)
+            List of (id, similarity) sorted by similarity (descending), one entry per id
         """
         try:
-            if not embeddings:
+            if not len(embeddings):
                 return []
             
-            # Extract embeddings and IDs
-            ids = [item[0] for item in embeddings]
-            embedding_matrix = np.array([item[1] for item in embeddings])
+            # Stacking a list costs a copy per call - callers should keep a gallery
+            gallery = embeddings if isinstance(embeddings, EmbeddingGallery) else EmbeddingGallery.from_pairs(embeddings)
             
-            # Calculate similarities in batch
-            similarities = CosineSimilarityCalculator.batch_calculate(
-                query_embedding, embedding_matrix, normalize=AIConfig.NORMALIZE_EMBEDDINGS_BEFORE_COMPARISON
-            )
-            
-            # If threshold is 0, return all matches (for debugging)
-            if threshold <= 0.0:
-                # Get ALL matches, sorted by similarity
-                all_pairs = list(zip(ids, similarities))
-                sorted_pairs = sorted(all_pairs, key=lambda x: x[1], reverse=True)
-                return sorted_pairs[:top_k]
-            else:
-                # Filter by threshold and get top-k
-                valid_indices = similarities >= threshold
-                valid_similarities = similarities[valid_indices]
-                valid_ids = [ids[i] for i in range(len(ids)) if valid_indices[i]]
-                
-                # Sort by similarity (descending)
-                sorted_pairs = sorted(zip(valid_ids, valid_similarities), 
-                                    key=lambda x: x[1], reverse=True)
-                
-                return sorted_pairs[:top_k]
+            # argpartition top-k over per-employee segment maxima
+            return gallery.top_k(query_embedding, k=top_k, threshold=threshold)
             
         except Exception as e:
             import logging
             logging.getLogger(__name__).error(f"Best matches finding error: {e}")
             return []
 
+class AlignedFace:
+    """
+    One detected face, produced once per frame and shared by every stage
+    (anti-spoofing, quality scoring, embedding) so none of them re-detects
+    - bbox: (x1, y1, x2, y2) in full-image coordinates
+    - landmarks: 5-point landmarks (eyes, nose, mouth corners) in full-image coordinates
+    - aligned: similarity-transformed 112x112 RGB crop fed to the recognition model
+    """
+    
+    __slots__ = ("bbox", "landmarks", "det_score", "aligned", "embedding")
+    
+    def __init__(self, bbox: tuple, landmarks: np.ndarray, det_score: float, aligned: np.ndarray):
+        self.bbox = bbox
+        self.landmarks = landmarks
+        self.det_score = det_score
+        self.aligned = aligned
+        self.embedding: Optional[np.ndarray] = None
+
 class RealAIService:
     """
     Production AI service with real model implementations
     Optimized for performance and reliability
     """
     
-    def __init__(self, model_path: str = None):
+    def __init__(self, model_path: str = None, num_threads: Optional[int] = None, replica: int = 0):
+        # Threads each ONNX Runtime session may use (None = runtime default, all cores)
+        self.num_threads = num_threads
+        # Pool slot; ONNX Runtime / InsightFace sessions are thread-safe and shared by
+        # every replica through the registry - only the torch fallback is per replica
+        self.replica = replica
+        self.registry = get_model_registry()
+        
         # Set default model path relative to backend directory
         if model_path is None:
             backend_root = Path(__file__).parent.parent.parent
@@ -232,6 +265,9 @@ class RealAIService:
         self.face_detector = None
         self.anti_spoof_model = None  
         self.face_recognizer = None
+        # Detector / ArcFace models inside the InsightFace pack, used directly by the single-pass pipeline
+        self.det_model = None
+        self.rec_model = None
         
         # Performance optimization caches
         self.embedding_cache = {}
@@ -245,6 +281,50 @@ class RealAIService:
         
         self._load_models()
     
+    def _shared_yolo(self, model_path: str, task: str = "detect"):
+        """
+        YOLO model loaded once through the registry
+        Local weights run on ONNX Runtime (exported and cached on first use), one
+        session per process shared by all replicas; Ultralytics/torch is only the
+        fallback and gets a copy per replica
+        """
+        if AIConfig.USE_ONNX_RUNTIME and ONNXRUNTIME_AVAILABLE and Path(model_path).exists():
+            try:
+                return self.registry.get(
+                    ("yolo-onnx", model_path, task, self.num_threads),
+                    lambda: load_yolo_onnx(Path(model_path), task, self._session_options()),
+                    name=f"{Path(model_path).stem}.onnx",
+                    artifact=model_path
+                )
+            except Exception as e:
+                self.logger.warning(f"⚠️ ONNX Runtime load failed for {Path(model_path).name}, using Ultralytics: {e}")
+        
+        from ultralytics import YOLO
+        return self.registry.get(
+            ("yolo", model_path, self.replica),
+            lambda: YOLO(model_path),
+            name=f"{Path(model_path).name} (replica {self.replica})",
+            artifact=model_path
+        )
+    
+    def _profile_artifact(self, model_path: Path) -> Path:
+        """INT8 counterpart of a local model when MODEL_PROFILE=int8 and it has been built"""
+        if multi_kiosk_settings.MODEL_PROFILE != "int8":
+            return model_path
+        relative = model_path.relative_to(self.model_path)
+        quantized = quantized_model_dir(self.model_path) / (relative if model_path.is_dir() else relative.with_suffix(".onnx"))
+        return quantized if quantized.exists() else model_path
+    
+    def _session_options(self):
+        """ONNX Runtime session options pinned to this instance's thread budget"""
+        if not self.num_threads:
+            return None
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.num_threads
+        options.inter_op_num_threads = 1
+        return options
+    
     def _load_models(self):
         """Load all AI models with optimized error handling and logging"""
         self.logger.info(f"Loading AI models from: {self.model_path}")
@@ -292,99 +372,99 @@ class RealAIService:
     
     def _load_face_detector(self) -> bool:
         """Load face detection model with optimized priority order"""
-        try:
-            from ultralytics import YOLO
-            
-            # Priority order for face detection models (most reliable first)
-            detector_options = [
-                ("Local YOLOv11s", self.model_path / "detection" / "yolov11s.pt"),
-                ("Local YOLOv8n-face", self.model_path / "detection" / "yolov8n-face.pt"),
-                ("Local YOLOv8n", self.model_path / "detection" / "yolov8n.pt"),
-                ("Auto-download YOLOv11s", "yolov11s.pt"),
-                ("Auto-download YOLOv8n", "yolov8n.pt")
-            ]
-            
-            for model_name, model_path in detector_options:
-                try:
-                    if isinstance(model_path, Path):
-                        if model_path.exists():
-                            size_mb = model_path.stat().st_size / (1024*1024)
-                            self.logger.info(f"Loading {model_name} ({size_mb:.1f}MB)...")
-                            self.face_detector = YOLO(str(model_path))
-                            self.logger.info(f"✅ {model_name} loaded successfully")
-                            return True
-                        else:
-                            self.logger.debug(f"⏭️ {model_name} not found: {model_path}")
-                            continue
-                    else:
-                        # Auto-download option
-                        self.logger.info(f"Attempting {model_name}...")
-                        self.face_detector = YOLO(model_path)
-                        self.logger.info(f"✅ {model_name} downloaded and loaded")
+        # Priority order for face detection models (most reliable first)
+        detector_options = [
+            ("Local YOLOv11s", self.model_path / "detection" / "yolov11s.pt"),
+            ("Local YOLOv8n-face", self.model_path / "detection" / "yolov8n-face.pt"),
+            ("Local YOLOv8n", self.model_path / "detection" / "yolov8n.pt"),
+            ("Auto-download YOLOv11s", "yolov11s.pt"),
+            ("Auto-download YOLOv8n", "yolov8n.pt")
+        ]
+        
+        for model_name, model_path in detector_options:
+            try:
+                if isinstance(model_path, Path):
+                    if model_path.exists():
+                        model_path = self._profile_artifact(model_path)
+                        size_mb = model_path.stat().st_size / (1024*1024)
+                        self.logger.info(f"Loading {model_name} ({size_mb:.1f}MB{', INT8' if model_path.suffix == '.onnx' else ''})...")
+                        self.face_detector = self._shared_yolo(str(model_path))
+                        self.logger.info(f"✅ {model_name} loaded successfully")
                         return True
-                        
-                except Exception as e:
-                    self.logger.warning(f"❌ Failed to load {model_name}: {e}")
-                    continue
-            
-            self.logger.error("❌ No face detection model could be loaded")
-            return False
-            
-        except ImportError as e:
-            self.logger.error(f"❌ Ultralytics not installed: {e}")
-            self.logger.info("💡 Install with: pip install ultralytics")
-            return False
+                    else:
+                        self.logger.debug(f"⏭️ {model_name} not found: {model_path}")
+                        continue
+                else:
+                    # Auto-download option
+                    self.logger.info(f"Attempting {model_name}...")
+                    self.face_detector = self._shared_yolo(model_path)
+                    self.logger.info(f"✅ {model_name} downloaded and loaded")
+                    return True
+                    
+            except Exception as e:
+                self.logger.warning(f"❌ Failed to load {model_name}: {e}")
+                continue
+        
+        self.logger.error("❌ No face detection model could be loaded")
+        return False
     
     def _load_anti_spoof_model(self) -> bool:
         """Load anti-spoofing model with graceful degradation"""
-        try:
-            from ultralytics import YOLO
-            
-            # Priority order for anti-spoofing models
-            spoof_options = [
-                ("Local YOLOv11s-cls", self.model_path / "classification" / "yolov11s-cls.pt", "yolo"),
-                ("Local ONNX Anti-spoof", self.model_path / "classification" / "antispoofing.onnx", "onnx"),
-                ("Local YOLOv8n-cls", self.model_path / "classification" / "yolov8n-cls.pt", "yolo"),
-                ("Auto-download YOLOv11s-cls", "yolov11s-cls.pt", "yolo")
-            ]
-            
-            for model_name, model_path, model_type in spoof_options:
-                try:
-                    if isinstance(model_path, Path):
-                        if model_path.exists():
-                            size_mb = model_path.stat().st_size / (1024*1024)
-                            self.logger.info(f"Loading {model_name} ({size_mb:.1f}MB)...")
-                            
-                            if model_type == "yolo":
-                                self.anti_spoof_model = YOLO(str(model_path))
-                            elif model_type == "onnx":
-                                import onnxruntime as ort
-                                self.anti_spoof_model = ort.InferenceSession(str(model_path))
-                            
-                            self.logger.info(f"✅ {model_name} loaded successfully")
-                            return True
-                        else:
-                            self.logger.debug(f"⏭️ {model_name} not found: {model_path}")
-                            continue
-                    else:
-                        # Auto-download option
-                        self.logger.info(f"Attempting {model_name}...")
-                        self.anti_spoof_model = YOLO(model_path)
-                        self.logger.info(f"✅ {model_name} downloaded and loaded")
-                        return True
+        # Priority order for anti-spoofing models
+        spoof_options = [
+            ("Local YOLOv11s-cls", self.model_path / "classification" / "yolov11s-cls.pt", "yolo"),
+            ("Local ONNX Anti-spoof", self.model_path / "classification" / "antispoofing.onnx", "onnx"),
+            ("Local YOLOv8n-cls", self.model_path / "classification" / "yolov8n-cls.pt", "yolo"),
+            ("Auto-download YOLOv11s-cls", "yolov11s-cls.pt", "yolo")
+        ]
+        
+        for model_name, model_path, model_type in spoof_options:
+            try:
+                if isinstance(model_path, Path):
+                    if model_path.exists():
+                        size_mb = model_path.stat().st_size / (1024*1024)
+                        self.logger.info(f"Loading {model_name} ({size_mb:.1f}MB)...")
                         
-                except Exception as e:
-                    self.logger.warning(f"❌ Failed to load {model_name}: {e}")
-                    continue
-            
-            self.logger.warning("⚠️ No anti-spoofing model loaded - using permissive mode")
-            self.anti_spoof_model = None
-            return False  # Not critical, graceful degradation
-            
-        except ImportError as e:
-            self.logger.warning(f"⚠️ Anti-spoofing dependencies missing: {e}")
-            self.anti_spoof_model = None
-            return False
+                        if model_type == "yolo":
+                            model = self._shared_yolo(str(self._profile_artifact(model_path)), task="classify")
+                            self.anti_spoof_model = create_spoof_backend(model, self._yolo_spoof_crop_scale())
+                        elif model_type == "onnx":
+                            # Native anti-spoof graph: classified on a face-centred crop, never the full frame
+                            classifier = self.registry.get(
+                                ("onnx-classify", str(model_path), self.num_threads),
+                                lambda: OnnxYoloClassifier(model_path, self._session_options()),
+                                name=model_path.name,
+                                artifact=str(model_path)
+                            )
+                            self.anti_spoof_model = OnnxClassifierSpoofBackend(
+                                classifier, AIConfig.SPOOF_FACE_CROP_SCALE, model_type="ONNX anti-spoof"
+                            )
+                        
+                        self.logger.info(f"✅ {model_name} loaded successfully")
+                        return True
+                    else:
+                        self.logger.debug(f"⏭️ {model_name} not found: {model_path}")
+                        continue
+                else:
+                    # Auto-download option
+                    self.logger.info(f"Attempting {model_name}...")
+                    self.anti_spoof_model = create_spoof_backend(
+                        self._shared_yolo(model_path, task="classify"), self._yolo_spoof_crop_scale()
+                    )
+                    self.logger.info(f"✅ {model_name} downloaded and loaded")
+                    return True
+                    
+            except Exception as e:
+                self.logger.warning(f"❌ Failed to load {model_name}: {e}")
+                continue
+        
+        self.logger.warning("⚠️ No anti-spoofing model loaded - using permissive mode")
+        self.anti_spoof_model = None
+        return False  # Not critical, graceful degradation
+    
+    def _yolo_spoof_crop_scale(self) -> Optional[float]:
+        """YOLO-cls anti-spoof models see the full frame unless configured otherwise"""
+        return None if AIConfig.USE_FULL_IMAGE_FOR_SPOOF else AIConfig.SPOOF_FACE_CROP_SCALE
     
     def _load_face_recognizer(self) -> bool:
         """Load face recognition model with optimized provider selection"""
@@ -413,20 +493,35 @@ class RealAIService:
                 providers = ['CPUExecutionProvider']
                 self.logger.warning("⚠️ ONNXRuntime not found, using default providers")
             
+            # Landmark / gender-age models are never used - don't load them
+            module_kwargs = {"allowed_modules": ["detection", "recognition"]} if AIConfig.SINGLE_PASS_PIPELINE else {}
+            
             for model_name, model_key, model_path in recognition_options:
                 try:
                     if model_path and model_path.exists():
+                        quantized_path = self._profile_artifact(model_path)
+                        if quantized_path != model_path:
+                            # Refuse an INT8 recognizer that drifted from the FP32 embeddings
+                            allowed, agreement = recognizer_gate(
+                                quantized_model_dir(self.model_path),
+                                multi_kiosk_settings.QUANTIZED_MIN_COSINE_AGREEMENT
+                            )
+                            if allowed:
+                                self.logger.info(f"🧮 Using INT8 {model_key} (cosine agreement {agreement:.4f})")
+                                model_path = quantized_path
+                            else:
+                                self.logger.error(
+                                    f"❌ INT8 {model_key} not activated - cosine agreement {agreement} below "
+                                    f"{multi_kiosk_settings.QUANTIZED_MIN_COSINE_AGREEMENT}, using FP32"
+                                )
+                        
                         # Calculate total size for local models
                         total_size = sum(f.stat().st_size for f in model_path.glob('*.onnx'))
                         size_mb = total_size / (1024*1024)
                         self.logger.info(f"Loading {model_name} ({size_mb:.1f}MB)...")
                         
                         # Load from local path with custom root
-                        self.face_recognizer = insightface.app.FaceAnalysis(
-                            name=model_key,
-                            root=str(model_path.parent),
-                            providers=providers
-                        )
+                        root_kwargs = {"root": str(model_path.parent)}
                     else:
                         if model_path:
                             self.logger.debug(f"⏭️ {model_name} not found: {model_path}")
@@ -434,13 +529,31 @@ class RealAIService:
                         
                         # Auto-download option
                         self.logger.info(f"Attempting {model_name}...")
-                        self.face_recognizer = insightface.app.FaceAnalysis(
+                        root_kwargs = {}
+                    
+                    def load_face_analysis():
+                        face_analysis = insightface.app.FaceAnalysis(
                             name=model_key,
-                            providers=providers
+                            providers=providers,
+                            **root_kwargs,
+                            **module_kwargs
                         )
+                        # Prepare the model
+                        face_analysis.prepare(ctx_id=0, det_size=(640, 640))
+                        if self.num_threads:
+                            # The model zoo ignores sess_options - pin SCRFD / ArcFace to the thread budget here
+                            rebind_sessions(face_analysis.models, self._session_options())
+                        return face_analysis
                     
-                    # Prepare the model
-                    self.face_recognizer.prepare(ctx_id=0, det_size=(640, 640))
+                    self.face_recognizer = self.registry.get(
+                        ("insightface", model_key, root_kwargs.get("root"), AIConfig.SINGLE_PASS_PIPELINE,
+                         self.num_threads),
+                        load_face_analysis,
+                        name=f"InsightFace {model_key}",
+                        artifact=str(model_path) if model_path else None
+                    )
+                    self.det_model = getattr(self.face_recognizer, "det_model", None)
+                    self.rec_model = getattr(self.face_recognizer, "models", {}).get("recognition")
                     self.logger.info(f"✅ {model_name} loaded and prepared successfully")
                     
                     # Test the model with dummy data
@@ -491,7 +604,7 @@ class RealAIService:
             self.logger.warning(f"Image preprocessing failed: {e}")
             return image
 
-    def detect_face(self, image: np.ndarray) -> Tuple[bool, Optional[tuple]]:
+    def detect_face(self, image: Union[np.ndarray, Frame]) -> Tuple[bool, Optional[tuple]]:
         """
         Detect face in image using YOLOv11s
         Returns: (found, bbox) where bbox is (x1, y1, x2, y2)
@@ -500,18 +613,28 @@ class RealAIService:
             if self.face_detector is None:
                 return False, None
             
-            results = self.face_detector(image, verbose=False)
-            
-            if len(results) == 0 or len(results[0].boxes) == 0:
-                return False, None
-            
-            # Get the most confident face detection
-            boxes = results[0].boxes
-            best_box = boxes[boxes.conf.argmax()]
-            
-            # Convert to (x1, y1, x2, y2) format
-            bbox = best_box.xyxy[0].cpu().numpy().astype(int)
-            confidence = best_box.conf[0].cpu().numpy()
+            image = as_array(image)
+            if isinstance(self.face_detector, OnnxYoloDetector):
+                boxes, scores, _ = self.face_detector.detect([image])[0]
+                if len(scores) == 0:
+                    return False, None
+                
+                # Detections come back sorted, most confident first
+                bbox = boxes[0].astype(int)
+                confidence = scores[0]
+            else:
+                results = self.face_detector(image, verbose=False)
+                
+                if len(results) == 0 or len(results[0].boxes) == 0:
+                    return False, None
+                
+                # Get the most confident face detection
+                boxes = results[0].boxes
+                best_box = boxes[boxes.conf.argmax()]
+                
+                # Convert to (x1, y1, x2, y2) format
+                bbox = best_box.xyxy[0].cpu().numpy().astype(int)
+                confidence = best_box.conf[0].cpu().numpy()
             
             # Only accept high-confidence detections
             if confidence < AIConfig.DETECTION_CONFIDENCE_THRESHOLD:
@@ -523,95 +646,226 @@ class RealAIService:
             self.logger.error(f"Face detection error: {e}")
             return False, None
     
-    def anti_spoofing(self, image: np.ndarray, bbox: tuple = None) -> bool:
+    def anti_spoofing(self, image: Union[np.ndarray, Frame], bbox: tuple = None) -> bool:
         """
-        Check if face is real (anti-spoofing) using YOLOv11s-cls
-        Uses full image instead of cropped face for better context analysis
+        Check if face is real (anti-spoofing)
+        bbox: face box in frame pixels, used by backends that classify a face-centred crop
         Returns: True if real face, False if spoof detected
         """
+        return self.batch_anti_spoofing([image], [bbox])[0]
+    
+    def batch_anti_spoofing(self, images: List[Union[np.ndarray, Frame]],
+                            bboxes: Optional[List[Optional[tuple]]] = None) -> List[bool]:
+        """
+        Anti-spoofing for several frames with one batched forward pass
+        Returns: one True (real) / False (spoof) per image
+        """
         try:
             if self.anti_spoof_model is None:
                 # If model not available, assume real face
                 self.logger.warning("Anti-spoofing model not loaded, skipping spoof detection")
-                return True
-            
-            # Use full image for anti-spoofing detection
-            # This provides better context and environmental information
-            # that helps distinguish between real faces and spoofed images
-            results = self.anti_spoof_model(image, verbose=False)
-            
-            if len(results) == 0:
-                self.logger.warning("Anti-spoofing model returned no results")
-                return True  # Default to real if uncertain
-            
-            # Get classification result
-            probs = results[0].probs
-            if probs is not None:
-                # Get class names from model if available
-                class_names = getattr(self.anti_spoof_model, 'names', None)
+                return [True] * len(images)
+            
+            bboxes = list(bboxes) if bboxes else [None] * len(images)
+            if self.anti_spoof_model.crop_scale is not None:
+                # Face-centred crops need a box; locate_face is cached on Frames and reused by alignment
+                for i, image in enumerate(images):
+                    if bboxes[i] is None:
+                        face = self.locate_face(image)
+                        bboxes[i] = face.bbox if face is not None else None
+            
+            return self.anti_spoof_model.is_real([as_array(image) for image in images], bboxes)
+            
+        except Exception as e:
+            self.logger.error(f"Anti-spoofing error: {e}")
+            return [True] * len(images)  # Default to allowing if error
+    
+    def _prepare_embedding_input(self, image: Union[np.ndarray, Frame], bbox: tuple = None) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """
+        Padded face crop (or full image) converted to the RGB layout InsightFace expects
+        The conversion is cached on the frame, so later stages reuse it
+        Returns: (rgb_image, (x_offset, y_offset)) - offset of the crop in the full image
+        """
+        frame = as_frame(image)
+        
+        # If bbox provided, crop the face region for more consistent recognition
+        if bbox:
+            return frame.face_crop(bbox, AIConfig.FACE_CROP_PADDING)
+        return frame.rgb(), (0, 0)
+    
+    @property
+    def single_pass_available(self) -> bool:
+        """Detector and ArcFace models are reachable inside the InsightFace pack"""
+        return self.det_model is not None and self.rec_model is not None
+    
+    @property
+    def adaptive_detection_available(self) -> bool:
+        """Detector graph has symbolic height/width (det_10g does), so it can run below 640"""
+        if not multi_kiosk_settings.ADAPTIVE_DETECTOR_SIZE or self.det_model is None:
+            return False
+        session = getattr(self.det_model, "session", None)
+        return session is not None and not isinstance(session.get_inputs()[0].shape[2], int)
+    
+    def _detector_input_size(self, height: int, width: int) -> int:
+        """Smallest detector input that still resolves a QUALITY_MIN_FACE_PX face in this frame"""
+        longest = max(height, width)
+        for size in AIConfig.DETECTOR_INPUT_SIZES:
+            if multi_kiosk_settings.QUALITY_MIN_FACE_PX * min(size / longest, 1.0) >= AIConfig.DETECTOR_MIN_FACE_PX:
+                return size
+        return AIConfig.DETECTOR_INPUT_SIZES[-1]
+    
+    def _detect_adaptive(self, frame: Frame) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Detect on the frame's view downscaled to the adaptive input size
+        Returns: (x1, y1, x2, y2, score) and 5 landmarks of the best face in full-image pixels, or None
+        """
+        size = self._detector_input_size(frame.height, frame.width)
+        scale = frame.scale_for(size)
+        
+        det_boxes, kpss = self.det_model.detect(frame.rgb(size), input_size=(size, size), max_num=0, metric='default')
+        if det_boxes.shape[0] == 0 or kpss is None:
+            return None
+        box = det_boxes[0].copy()
+        box[:4] /= scale
+        return box, kpss[0] / scale
+    
+    def detect_faces(self, image: Union[np.ndarray, Frame]) -> List[Tuple[tuple, float]]:
+        """
+        Every confident face in the frame (streaming kiosks track them across frames)
+        Returns: [((x1, y1, x2, y2), score)] in frame pixels, most confident first
+        """
+        try:
+            frame = as_frame(image)
+            if self.det_model is not None:
+                size = self._detector_input_size(frame.height, frame.width) if self.adaptive_detection_available else None
+                scale = frame.scale_for(size)
+                if size:
+                    det_boxes, _ = self.det_model.detect(frame.rgb(size), input_size=(size, size), max_num=0, metric='default')
+                else:
+                    det_boxes, _ = self.det_model.detect(frame.rgb(), max_num=0, metric='default')
+                boxes, scores = det_boxes[:, :4] / scale, det_boxes[:, 4]
+            elif isinstance(self.face_detector, OnnxYoloDetector):
+                boxes, scores, _ = self.face_detector.detect([frame.image])[0]
+            elif self.face_detector is not None:
+                result = self.face_detector(frame.image, verbose=False)[0]
+                boxes, scores = result.boxes.xyxy.cpu().numpy(), result.boxes.conf.cpu().numpy()
+            else:
+                return []
+            
+            return [
+                (tuple(int(v) for v in box), float(score))
+                for box, score in zip(boxes, scores)
+                if score >= AIConfig.DETECTION_CONFIDENCE_THRESHOLD
+            ]
+        except Exception as e:
+            self.logger.error(f"Face detection error: {e}")
+            return []
+    
+    def detect_and_align(self, image: Union[np.ndarray, Frame], bbox: tuple = None) -> Optional[AlignedFace]:
+        """
+        Run InsightFace's detector once and align the most confident face to 112x112
+        Args:
+            image: Full BGR image or Frame (result cached on the frame)
+            bbox: Optional region (x1, y1, x2, y2) to search in, e.g. from an upstream detector
+        Returns: AlignedFace or None if no face was found
+        """
+        if not self.single_pass_available:
+            return None
+        
+        frame = as_frame(image)
+        region = tuple(int(v) for v in bbox[:4]) if bbox is not None else None
+        return frame.view(("aligned", region), lambda: self._detect_and_align(frame, bbox))
+    
+    def _detect_and_align(self, frame: Frame, bbox: tuple = None) -> Optional[AlignedFace]:
+        try:
+            from insightface.utils import face_align
+            
+            if bbox is None and self.adaptive_detection_available:
+                detected = self._detect_adaptive(frame)
+                if detected is None:
+                    return None
+                (x1, y1, x2, y2, score), landmarks = detected
                 
-                if class_names:
-                    self.logger.debug(f"🏷️ Model classes: {class_names}")
-                    
-                    # Find real and fake/spoof class indices
-                    real_idx = None
-                    fake_idx = None
-                    
-                    for idx, name in class_names.items():
-                        name_lower = name.lower()
-                        if name_lower in ['real', 'live', 'person', 'human']:
-                            real_idx = idx
-                        elif name_lower in ['fake', 'spoof', 'photo', 'video', 'attack']:
-                            fake_idx = idx
-                    
-                    if real_idx is not None and fake_idx is not None:
-                        real_confidence = probs.data[real_idx].cpu().numpy()
-                        fake_confidence = probs.data[fake_idx].cpu().numpy()
-                        
-                        self.logger.info(f"🔍 Anti-spoofing scores - Real({class_names[real_idx]}): {real_confidence:.3f}, Fake({class_names[fake_idx]}): {fake_confidence:.3f}")
-                        
-                        is_real = real_confidence > fake_confidence
-                        self.logger.info(f"🔍 Anti-spoofing result: {'REAL' if is_real else 'SPOOF'}")
-                        return is_real
-                    else:
-                        self.logger.warning(f"⚠️ Could not identify real/fake classes in: {class_names}")
+                # Align from a full-resolution crop around the face; the rest of the frame is never converted
+                margin = int(max(x2 - x1, y2 - y1) * 0.5)
+                rgb_crop, (x_offset, y_offset) = frame.face_crop((x1 - margin, y1 - margin, x2 + margin, y2 + margin))
+                aligned = face_align.norm_crop(
+                    rgb_crop, landmark=landmarks - np.array([x_offset, y_offset], dtype=landmarks.dtype),
+                    image_size=self.rec_model.input_size[0]
+                )
+                return AlignedFace(
+                    bbox=(int(x1), int(y1), int(x2), int(y2)),
+                    landmarks=landmarks,
+                    det_score=float(score),
+                    aligned=aligned
+                )
+            
+            rgb_image, (x_offset, y_offset) = self._prepare_embedding_input(frame, bbox)
+            det_boxes, kpss = self.det_model.detect(rgb_image, max_num=0, metric='default')
+            if det_boxes.shape[0] == 0 or kpss is None:
+                return None
+            
+            # Detections are sorted by score - take the first, like FaceAnalysis.get()
+            x1, y1, x2, y2, score = det_boxes[0]
+            aligned = face_align.norm_crop(rgb_image, landmark=kpss[0], image_size=self.rec_model.input_size[0])
+            
+            return AlignedFace(
+                bbox=(int(x1) + x_offset, int(y1) + y_offset, int(x2) + x_offset, int(y2) + y_offset),
+                landmarks=kpss[0] + np.array([x_offset, y_offset], dtype=kpss.dtype),
+                det_score=float(score),
+                aligned=aligned
+            )
+            
+        except Exception as e:
+            self.logger.error(f"Face detection/alignment error: {e}")
+            return None
+    
+    def locate_face(self, image: Union[np.ndarray, Frame]) -> Optional[AlignedFace]:
+        """
+        Pipeline entry point: find, landmark and align the face in a frame
+        - Single-pass mode: InsightFace's detector only
+        - Otherwise: YOLO box first, then landmarks from InsightFace's detector on the crop
+        """
+        if AIConfig.SINGLE_PASS_PIPELINE and self.single_pass_available:
+            face = self.detect_and_align(image)
+            if face is None or face.det_score < AIConfig.DETECTION_CONFIDENCE_THRESHOLD:
+                return None
+            return face
+        
+        found, bbox = self.detect_face(image)
+        if not found:
+            return None
+        return self.detect_and_align(image, bbox)
+    
+    def embed_faces(self, faces: List[AlignedFace]) -> List[Optional[np.ndarray]]:
+        """
+        ArcFace embeddings for aligned faces, in batches of AIConfig.BATCH_SIZE
+        Also stored on each face as face.embedding
+        Returns: one normalized 512-dim embedding per face
+        """
+        embeddings: List[Optional[np.ndarray]] = [None] * len(faces)
+        if not faces or self.rec_model is None:
+            return embeddings
+        
+        try:
+            for start in range(0, len(faces), AIConfig.BATCH_SIZE):
+                batch = faces[start:start + AIConfig.BATCH_SIZE]
+                features = np.asarray(
+                    self.rec_model.get_feat([face.aligned for face in batch]), dtype=np.float32
+                ).reshape(len(batch), -1)
+                features /= np.linalg.norm(features, axis=1, keepdims=True)
                 
-                # Fallback: assume standard binary classification
-                # Try both possibilities to see which makes more sense
-                if len(probs.data) >= 2:
-                    conf_0 = probs.data[0].cpu().numpy()
-                    conf_1 = probs.data[1].cpu().numpy()
-                    
-                    self.logger.info(f"🔍 Raw classification scores - Class 0: {conf_0:.3f}, Class 1: {conf_1:.3f}")
-                    
-                    # Log top prediction
-                    top_class = results[0].probs.top1
-                    top_conf = results[0].probs.top1conf.cpu().numpy()
-                    self.logger.info(f"🎯 Top prediction: Class {top_class} with confidence {top_conf:.3f}")
-                    
-                    # Based on verified class mapping: Class 0='fake', Class 1='real'
-                    # Use the higher confidence as real if it's above threshold
-                    if top_conf > 0.7:  # High confidence threshold
-                        # Verified class mapping: Class 0='fake', Class 1='real'
-                        is_real = (top_class == 1)  # Class 1 is 'real'
-                        self.logger.info(f"🔍 High confidence prediction: {'REAL' if is_real else 'SPOOF'}")
-                        return is_real
-                    else:
-                        # Low confidence, default to real for safety
-                        self.logger.warning(f"⚠️ Low confidence ({top_conf:.3f}), defaulting to REAL")
-                        return True
-                        
-                else:
-                    self.logger.warning("⚠️ Unexpected number of classes in model output")
-                    return True
+                for offset, (face, feature) in enumerate(zip(batch, features)):
+                    face.embedding = feature
+                    embeddings[start + offset] = feature
             
-            return True
+            return embeddings
             
         except Exception as e:
-            self.logger.error(f"Anti-spoofing error: {e}")
-            return True  # Default to allowing if error
+            self.logger.error(f"Embedding extraction error: {e}")
+            return embeddings
     
-    def extract_embedding(self, image: np.ndarray, bbox: tuple = None) -> Optional[np.ndarray]:
+    def extract_embedding(self, image: Union[np.ndarray, Frame], bbox: tuple = None) -> Optional[np.ndarray]:
         """
         Extract 512-dimensional face embedding using InsightFace
         Args:
@@ -623,33 +877,12 @@ class RealAIService:
             if self.face_recognizer is None:
                 return None
             
-            # If bbox provided, crop the face region for more consistent recognition
-            if bbox:
-                x1, y1, x2, y2 = bbox
-                # Add configurable padding around the face
-                padding = AIConfig.FACE_CROP_PADDING
-                h, w = image.shape[:2]
-                x1 = max(0, x1 - padding)
-                y1 = max(0, y1 - padding)
-                x2 = min(w, x2 + padding)
-                y2 = min(h, y2 + padding)
-                
-                face_crop = image[y1:y2, x1:x2]
-                
-                # Ensure we have a valid crop
-                if face_crop.size == 0:
-                    self.logger.warning("Invalid face crop, using full image")
-                    working_image = image
-                else:
-                    working_image = face_crop
-            else:
-                working_image = image
+            if self.single_pass_available:
+                face = self.detect_and_align(image, bbox)
+                return self.embed_faces([face])[0] if face is not None else None
             
-            # InsightFace expects RGB
-            if len(working_image.shape) == 3 and working_image.shape[2] == 3:
-                rgb_image = cv2.cvtColor(working_image, cv2.COLOR_BGR2RGB)
-            else:
-                rgb_image = working_image
+            # Unknown FaceAnalysis layout - full InsightFace pipeline
+            rgb_image, _ = self._prepare_embedding_input(image, bbox)
             
             faces = self.face_recognizer.get(rgb_image)
             
@@ -669,15 +902,47 @@ class RealAIService:
             self.logger.error(f"Embedding extraction error: {e}")
             return None
     
+    def batch_extract_embeddings(self, images: List[np.ndarray],
+                                 bboxes: Optional[List[tuple]] = None) -> List[Optional[np.ndarray]]:
+        """
+        Extract embeddings for many images with batched recognition inference
+        Detection + alignment run per image, then the aligned 112x112 crops go
+        through the ArcFace model in batches of AIConfig.BATCH_SIZE
+        Returns: one normalized 512-dim embedding (or None) per image, same as extract_embedding
+        """
+        embeddings: List[Optional[np.ndarray]] = [None] * len(images)
+        if self.face_recognizer is None or not images:
+            return embeddings
+        
+        if not self.single_pass_available:
+            # Unknown FaceAnalysis layout - fall back to the single-image path
+            return [
+                self.extract_embedding(image, bboxes[i] if bboxes and i < len(bboxes) else None)
+                for i, image in enumerate(images)
+            ]
+        
+        faces = []
+        positions = []
+        for i, image in enumerate(images):
+            face = self.detect_and_align(image, bboxes[i] if bboxes and i < len(bboxes) else None)
+            if face is not None:
+                faces.append(face)
+                positions.append(i)
+        
+        for position, embedding in zip(positions, self.embed_faces(faces)):
+            embeddings[position] = embedding
+        
+        return embeddings
+    
     def match_embedding(self, query_embedding: np.ndarray, 
-                       employee_embeddings: List[Tuple[str, np.ndarray]], 
+                       employee_embeddings: Union[List[Tuple[str, np.ndarray]], EmbeddingGallery], 
                        threshold: float = None) -> Tuple[Optional[str], float]:
         """
         Match query embedding against database of employee embeddings using optimized Cosine Similarity
         
         Args:
             query_embedding: 512-dim query vector (normalized)
-            employee_embeddings: List of (employee_id, embedding) tuples
+            employee_embeddings: EmbeddingGallery or list of (employee_id, embedding) tuples
             threshold: Minimum similarity threshold (TEMPORARILY DISABLED for debugging)
             
         Returns: (employee_id, confidence) or (None, 0.0) if no match
@@ -692,7 +957,7 @@ class RealAIService:
             self.logger.info(f"🔍 DEBUG: Matching against {len(employee_embeddings)} employees (threshold disabled)")
             
             # Find ALL matches, sorted by similarity
-            if AIConfig.USE_OPTIMIZED_COSINE_SIMILARITY:
+            if AIConfig.USE_OPTIMIZED_COSINE_SIMILARITY or isinstance(employee_embeddings, EmbeddingGallery):
                 # Get ALL matches above 0 threshold, sort by best
                 matches = CosineSimilarityCalculator.find_best_matches(
                     query_embedding=query_embedding,
@@ -778,8 +1043,7 @@ class RealAIService:
         try:
             # 1. Decode image from different sources
             if isinstance(image_data, bytes):
-                nparr = np.frombuffer(image_data, np.uint8)
-                image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                image, _ = decode_image(image_data, multi_kiosk_settings.DECODE_TARGET_SIDE)
             elif isinstance(image_data, np.ndarray):
                 image = image_data
             else:
@@ -807,9 +1071,9 @@ class RealAIService:
             
             # 3. Face detection with enhanced logging
             self.logger.debug(f"Processing image: {width}x{height}")
-            found, bbox = self.detect_face(image)
+            face = self.locate_face(image)
             
-            if not found:
+            if face is None:
                 return {
                     "face_detected": False,
                     "message": "No face detected in image",
@@ -817,7 +1081,8 @@ class RealAIService:
                     "image_size": f"{width}x{height}"
                 }
             
-            # 4. Face quality assessment
+            # 4. Face quality assessment (reuses the detection box)
+            bbox = face.bbox
             x1, y1, x2, y2 = bbox
             face_width = x2 - x1
             face_height = y2 - y1
@@ -860,8 +1125,8 @@ class RealAIService:
                     "quality_score": quality_score
                 }
             
-            # 6. Extract embedding from face crop for better consistency
-            embedding = self.extract_embedding(image, bbox)
+            # 6. Embed the already aligned face - no second detection
+            embedding = self.embed_faces([face])[0]
             if embedding is None:
                 return {
                     "face_detected": True,
@@ -901,9 +1166,8 @@ class RealAIService:
         Complete face recognition pipeline with database integration
         """
         try:
-            # 1. Decode image
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            # 1. Decode image (large JPEGs at reduced resolution)
+            image, _ = decode_image(image_bytes, multi_kiosk_settings.DECODE_TARGET_SIDE)
             
             if image is None:
                 return {
@@ -912,14 +1176,15 @@ class RealAIService:
                     "device_id": device_id
                 }
             
-            # 2. Detect face
-            found, bbox = self.detect_face(image)
-            if not found:
+            # 2. Detect + align face
+            face = self.locate_face(image)
+            if face is None:
                 return {
                     "success": False,
                     "message": "No face detected",
                     "device_id": device_id
                 }
+            bbox = face.bbox
             
             # 3. Anti-spoofing check
             if not self.anti_spoofing(image, bbox):
@@ -929,8 +1194,8 @@ class RealAIService:
                     "device_id": device_id
                 }
             
-            # 4. Extract embedding from face crop for better consistency
-            embedding = self.extract_embedding(image, bbox)
+            # 4. Embed the aligned face
+            embedding = self.embed_faces([face])[0]
             if embedding is None:
                 return {
                     "success": False,
@@ -1009,23 +1274,23 @@ class RealAIService:
                     "message": f"Employee {employee_id} not found"
                 }
             
-            # 3. Detect face
-            found, bbox = self.detect_face(image)
-            if not found:
+            # 3. Detect + align face
+            face = self.locate_face(image)
+            if face is None:
                 return {
                     "success": False,
                     "message": "No face detected in registration image"
                 }
             
             # 4. Anti-spoofing check
-            if not self.anti_spoofing(image, bbox):
+            if not self.anti_spoofing(image, face.bbox):
                 return {
                     "success": False,
                     "message": "Spoof detected in registration image"
                 }
             
-            # 5. Extract embedding from face crop for better consistency
-            embedding = self.extract_embedding(image, bbox)
+            # 5. Embed the aligned face
+            embedding = self.embed_faces([face])[0]
             if embedding is None:
                 return {
                     "success": False,
@@ -1080,17 +1345,9 @@ class RealAIService:
         """
         Process multiple images in batch for better performance
         """
-        embeddings = []
-        for image in image_list:
-            # Use same pipeline as single image
-            found, bbox = self.detect_face(image)
-            if found:
-                embedding = self.extract_embedding(image, bbox)
-                embeddings.append(embedding)
-            else:
-                embeddings.append(None)
-        
-        return embeddings
+        faces = [self.locate_face(image) for image in image_list]
+        embeddings = iter(self.embed_faces([face for face in faces if face is not None]))
+        return [next(embeddings) if face is not None else None for face in faces]
     
     def warm_up_models(self):
         """
@@ -1128,6 +1385,7 @@ class RealAIService:
         try:
             model_info = {
                 "model_path": str(self.model_path),
+                "model_profile": multi_kiosk_settings.MODEL_PROFILE,
                 "models_loaded": {},
                 "system_info": {},
                 "performance": {}
@@ -1139,7 +1397,7 @@ class RealAIService:
                     model_info["models_loaded"]["face_detection"] = {
                         "status": "loaded",
                         "type": "YOLOv11s",
-                        "framework": "Ultralytics",
+                        "framework": "ONNXRuntime" if isinstance(self.face_detector, OnnxYoloDetector) else "Ultralytics",
                         "device": str(self.face_detector.device) if hasattr(self.face_detector, 'device') else "unknown"
                     }
                 except:
@@ -1151,8 +1409,10 @@ class RealAIService:
             if self.anti_spoof_model is not None:
                 model_info["models_loaded"]["anti_spoofing"] = {
                     "status": "loaded",
-                    "type": "YOLOv11s-cls" if hasattr(self.anti_spoof_model, 'model') else "ONNX",
-                    "framework": "Ultralytics" if hasattr(self.anti_spoof_model, 'model') else "ONNXRuntime"
+                    "type": self.anti_spoof_model.model_type,
+                    "framework": self.anti_spoof_model.framework,
+                    "input": "face_crop" if self.anti_spoof_model.crop_scale is not None else "full_frame",
+                    "classes": self.anti_spoof_model.names
                 }
             else:
                 model_info["models_loaded"]["anti_spoofing"] = {"status": "not_loaded", "fallback": "permissive_mode"}
@@ -1165,7 +1425,8 @@ class RealAIService:
                         "type": "InsightFace Buffalo_L",
                         "framework": "InsightFace",
                         "embedding_dim": 512,
-                        "det_size": "640x640"
+                        "det_size": "640x640",
+                        "pipeline": "single_pass" if AIConfig.SINGLE_PASS_PIPELINE and self.single_pass_available else "yolo_then_insightface"
                     }
                 except:
                     model_info["models_loaded"]["face_recognition"] = {"status": "loaded", "details": "limited_info"}
@@ -1195,17 +1456,106 @@ class RealAIService:
             self.logger.error(f"Error getting model info: {e}")
             return {"error": str(e), "model_path": str(self.model_path)}
 
+class AIServicePool:
+    """
+    AI_SERVICE_POOL_SIZE instances that requests check out, bounding concurrent inference
+    The instances share one ONNX Runtime / InsightFace session per model artifact
+    (InferenceSession.run is thread-safe); each session gets cpu_count // size
+    intra-op threads (torch uses the same count) so the concurrent runs never
+    oversubscribe the cores
+    """
+    
+    def __init__(self, size: int = 1, threads_per_instance: Optional[int] = None):
+        self.size = max(1, size)
+        self.threads_per_instance = threads_per_instance or max(1, (os.cpu_count() or 1) // self.size)
+        self.logger = logging.getLogger(__name__)
+        
+        try:
+            import torch
+            torch.set_num_threads(self.threads_per_instance)
+        except ImportError:
+            pass
+        
+        self.instances: List[RealAIService] = []
+        for i in range(self.size):
+            instance = RealAIService(num_threads=self.threads_per_instance, replica=i)
+            instance.warm_up_models()
+            self.instances.append(instance)
+        
+        self._free: "queue.Queue[RealAIService]" = queue.Queue()
+        for instance in self.instances:
+            self._free.put(instance)
+        
+        self._stats_lock = threading.Lock()
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._checkouts = 0
+        self._waited = 0
+        self._total_wait_ms = 0.0
+        self.logger.info(f"✅ AI service pool ready: {self.size} instances x {self.threads_per_instance} threads")
+    
+    @property
+    def primary(self) -> RealAIService:
+        """Instance shared by callers that don't check out (admin / registration paths)"""
+        return self.instances[0]
+    
+    @contextlib.contextmanager
+    def checkout(self, timeout: Optional[float] = None):
+        """Borrow an instance for one inference call; blocks while all are busy"""
+        started = time.perf_counter()
+        try:
+            instance = self._free.get_nowait()
+            waited = False
+        except queue.Empty:
+            instance = self._free.get(timeout=timeout)
+            waited = True
+        
+        wait_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+            self._checkouts += 1
+            self._waited += int(waited)
+            self._total_wait_ms += wait_ms
+        try:
+            yield instance
+        finally:
+            with self._stats_lock:
+                self._in_use -= 1
+            self._free.put(instance)
+    
+    def get_stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "size": self.size,
+                "threads_per_instance": self.threads_per_instance,
+                "in_use": self._in_use,
+                "occupancy": round(self._in_use / self.size, 3),
+                "peak_in_use": self._peak_in_use,
+                "checkouts": self._checkouts,
+                "waited": self._waited,
+                "avg_wait_ms": round(self._total_wait_ms / self._checkouts, 3) if self._checkouts else 0.0
+            }
+
 # Global instance
-ai_service = None
+ai_service_pool = None
+
+def get_ai_service_pool() -> AIServicePool:
+    """Get or create the model instance pool"""
+    global ai_service_pool
+    if ai_service_pool is None:
+        ai_service_pool = AIServicePool(size=multi_kiosk_settings.AI_SERVICE_POOL_SIZE)
+    return ai_service_pool
+
+def get_ai_service_pool_stats() -> dict:
+    """Pool occupancy without creating the pool (and loading models) as a side effect"""
+    if ai_service_pool is None:
+        return {"initialized": False}
+    return {"initialized": True, **ai_service_pool.get_stats()}
 
 def get_ai_service() -> RealAIService:
-    """Get or create AI service singleton with health check"""
-    global ai_service
-    if ai_service is None:
-        ai_service = RealAIService()
-        # Warm up models on first creation
-        ai_service.warm_up_models()
-    return ai_service
+    """Get the shared AI service instance (first instance of the pool)"""
+    return get_ai_service_pool().primary
 
 def health_check() -> dict:
     """
@@ -0,0 +1,135 @@
+"""
+Anti-Spoofing Backends
+One interface over every liveness model the service can load - Ultralytics
+and ONNX-exported YOLO classifiers, and native ONNX anti-spoof classifiers.
+Real/fake class indices are resolved once at load time and each backend
+scores a whole batch of frames per call
+"""
+import logging
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+import cv2
+from app.services.onnx_models import OnnxYoloClassifier
+
+logger = logging.getLogger(__name__)
+
+REAL_CLASS_NAMES = ("real", "live", "person", "human")
+FAKE_CLASS_NAMES = ("fake", "spoof", "photo", "video", "attack")
+
+# Without usable class names: verified mapping of the shipped models (0 = fake, 1 = real),
+# trusted only above this confidence - anything less counts as real
+FALLBACK_REAL_CLASS = 1
+FALLBACK_MIN_CONFIDENCE = 0.7
+
+class SpoofBackend:
+    """
+    Batched liveness classifier
+    - crop_scale: None scores the full frame; otherwise a square crop centred on the
+      face box, crop_scale times its longer side (the frame centre when no box is known)
+    - predict(): class probabilities (N, classes) for prepared BGR images
+    """
+
+    framework = "unknown"
+    model_type = "unknown"
+
+    def __init__(self, names: Optional[Dict[int, str]], crop_scale: Optional[float] = None):
+        self.names = dict(names or {})
+        self.crop_scale = crop_scale
+        self.real_idx = self.fake_idx = None
+        for idx, name in self.names.items():
+            if name.lower() in REAL_CLASS_NAMES:
+                self.real_idx = idx
+            elif name.lower() in FAKE_CLASS_NAMES:
+                self.fake_idx = idx
+
+        if self.real_idx is not None and self.fake_idx is not None:
+            logger.info(f"🏷️ Anti-spoof classes: real={self.names[self.real_idx]} ({self.real_idx}), "
+                        f"fake={self.names[self.fake_idx]} ({self.fake_idx})")
+        else:
+            logger.warning(f"⚠️ Could not identify real/fake classes in {self.names or 'model without names'} - "
+                           f"using class {FALLBACK_REAL_CLASS} = real above {FALLBACK_MIN_CONFIDENCE} confidence")
+
+    @property
+    def class_mapping_known(self) -> bool:
+        return self.real_idx is not None and self.fake_idx is not None
+
+    def predict(self, images: List[np.ndarray]) -> np.ndarray:
+        raise NotImplementedError
+
+    def face_crop(self, image: np.ndarray, bbox: Optional[Sequence[float]]) -> np.ndarray:
+        """Square crop centred on the face; out-of-frame parts are zero padded"""
+        h, w = image.shape[:2]
+        if bbox is None:
+            cx, cy, side = w / 2, h / 2, min(h, w)
+        else:
+            x1, y1, x2, y2 = bbox[:4]
+            cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+            side = max(x2 - x1, y2 - y1) * self.crop_scale
+        side = max(int(round(side)), 1)
+        left, top = int(round(cx - side / 2)), int(round(cy - side / 2))
+
+        crop = image[max(top, 0):min(top + side, h), max(left, 0):min(left + side, w)]
+        if crop.shape[:2] == (side, side):
+            return crop
+        pad_top, pad_left = max(-top, 0), max(-left, 0)
+        return cv2.copyMakeBorder(
+            crop, pad_top, side - crop.shape[0] - pad_top, pad_left, side - crop.shape[1] - pad_left,
+            cv2.BORDER_CONSTANT, value=0
+        )
+
+    def is_real(self, images: List[np.ndarray], bboxes: Optional[List[Optional[Sequence[float]]]] = None) -> List[bool]:
+        """One liveness decision per BGR frame (bboxes in frame pixels, optional per frame)"""
+        if self.crop_scale is not None:
+            bboxes = bboxes or [None] * len(images)
+            images = [self.face_crop(image, bbox) for image, bbox in zip(images, bboxes)]
+        probs = self.predict(images)
+
+        if self.class_mapping_known:
+            decisions = probs[:, self.real_idx] > probs[:, self.fake_idx]
+            logger.debug(f"🔍 Anti-spoofing real scores: {np.round(probs[:, self.real_idx], 3).tolist()}")
+        elif probs.shape[1] >= 2:
+            top_class = probs.argmax(axis=1)
+            top_conf = probs.max(axis=1)
+            # Low confidence defaults to real for safety
+            decisions = np.where(top_conf > FALLBACK_MIN_CONFIDENCE, top_class == FALLBACK_REAL_CLASS, True)
+            logger.debug(f"🔍 Anti-spoofing top classes: {top_class.tolist()} ({np.round(top_conf, 3).tolist()})")
+        else:
+            logger.warning("⚠️ Unexpected number of classes in anti-spoofing output")
+            return [True] * len(images)
+        return [bool(is_real) for is_real in decisions]
+
+class UltralyticsSpoofBackend(SpoofBackend):
+    """YOLO classifier running on PyTorch (fallback runtime)"""
+
+    framework = "Ultralytics"
+    model_type = "YOLO-cls"
+
+    def __init__(self, model, crop_scale: Optional[float] = None):
+        self.model = model
+        super().__init__(getattr(model, "names", None), crop_scale)
+
+    def predict(self, images: List[np.ndarray]) -> np.ndarray:
+        results = self.model(images, verbose=False)
+        return np.stack([result.probs.data.cpu().numpy() for result in results])
+
+class OnnxClassifierSpoofBackend(SpoofBackend):
+    """
+    Classifier on ONNX Runtime - YOLO-cls exports and native anti-spoof graphs
+    Preprocessing is vectorized over the batch (square crop -> imgsz, NCHW RGB in [0, 1])
+    """
+
+    framework = "ONNXRuntime"
+
+    def __init__(self, classifier: OnnxYoloClassifier, crop_scale: Optional[float] = None, model_type: str = "YOLO-cls"):
+        self.classifier = classifier
+        self.model_type = model_type
+        super().__init__(classifier.names, crop_scale)
+
+    def predict(self, images: List[np.ndarray]) -> np.ndarray:
+        return self.classifier.predict(images)
+
+def create_spoof_backend(model, crop_scale: Optional[float] = None) -> SpoofBackend:
+    """Backend for a loaded YOLO classifier (ONNX Runtime or Ultralytics)"""
+    if isinstance(model, OnnxYoloClassifier):
+        return OnnxClassifierSpoofBackend(model, crop_scale)
+    return UltralyticsSpoofBackend(model, crop_scale)
@@ -0,0 +1,891 @@
+"""
+Template Index Service
+Process-wide in-memory matrix of face templates for fast recognition
+"""
+import contextlib
+import threading
+import time
+import numpy as np
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.models.face_template import FaceTemplate
+from app.config.multi_kiosk_config_fixed import multi_kiosk_settings
+from app.services.matcher_backends import create_matcher_backend
+from app.services.template_snapshot import TemplateSnapshotStore
+from app.services.embedding_gallery import group_segments, segment_max, top_k_indices
+from app.utils.embedding_codec import as_embedding_array, embedding_query_columns, first_stored
+
+logger = logging.getLogger(__name__)
+
+class TemplateIndex:
+    """
+    Resident template matrix used by recognition
+    - All templates kept as one contiguous, L2-normalized N x 512 matrix
+    - Parallel arrays map each row to its template id and employee
+    - Matching is one matrix-vector product; employee top-k uses a segment max
+    - Row-level upsert/remove so writes cost O(changed rows), not a reload
+    - Large galleries can use an ANN backend (HNSW/IVF) for candidates,
+      which are always re-ranked with exact cosine scores
+    - Scan storage can be quantized (per-row scaled int8 or float16) with
+      optional float32 re-ranking of the top scan results
+    - Full versions are written as an on-disk snapshot that other worker
+      processes memory-map read-only instead of scanning the database; row
+      changes in between are appended to the snapshot's change log and
+      replayed row by row, and only every TEMPLATE_SNAPSHOT_MAX_CHANGES
+      change versions is the snapshot rewritten
+    """
+
+    EMBEDDING_DIM = 512
+    INITIAL_CAPACITY = 1024
+
+    # Compact once more than this fraction of the rows are free slots
+    COMPACT_FREE_RATIO = 0.5
+
+    # Quantized rows are widened to float32 in cache-sized blocks while scanning
+    SCORE_BLOCK_ROWS = 4096
+
+    # Queries scored per GEMM in match_batch (bounds the rows x queries score matrix)
+    MATCH_BATCH_QUERIES = 64
+
+    STORAGE_DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+        self._lock = threading.RLock()
+        self._loaded = False
+        self.version = 0
+
+        # Candidate generation; exact search below ANN_MIN_TEMPLATES
+        self.backend = create_matcher_backend(multi_kiosk_settings.MATCHER_BACKEND, dim, multi_kiosk_settings)
+        self.ann_top_k = multi_kiosk_settings.ANN_TOP_K
+        self.ann_min_templates = multi_kiosk_settings.ANN_MIN_TEMPLATES
+        self._bulk_loading = False
+
+        # Scan storage precision; a float32 copy is only kept for re-ranking
+        storage = multi_kiosk_settings.INDEX_STORAGE_DTYPE.lower()
+        if storage not in self.STORAGE_DTYPES:
+            logger.warning(f"Unknown index storage dtype '{storage}', using float32")
+            storage = "float32"
+        self.storage_dtype = np.dtype(self.STORAGE_DTYPES[storage])
+        self.rerank_top_k = multi_kiosk_settings.INDEX_RERANK_TOP_K if storage != "float32" else 0
+
+        # Shared snapshot; arrays stay read-only memmaps until this worker writes
+        self.snapshot_store = None
+        if multi_kiosk_settings.TEMPLATE_SNAPSHOT_ENABLED:
+            try:
+                self.snapshot_store = TemplateSnapshotStore(multi_kiosk_settings.EMBEDDINGS_CACHE_PATH)
+            except OSError as e:
+                logger.warning(f"⚠️ Template snapshots disabled: {e}")
+        self.snapshot_poll_seconds = multi_kiosk_settings.TEMPLATE_SNAPSHOT_POLL_SECONDS
+        self.snapshot_max_changes = multi_kiosk_settings.TEMPLATE_SNAPSHOT_MAX_CHANGES
+        # Snapshot version the rows are based on, read position in its change log,
+        # and change versions applied on top of it
+        self._base_version = 0
+        self._changes_offset = 0
+        self._changes_since_base = 0
+        self._snapshot_checked_at = 0.0
+        self._snapshot_mapped = False
+        self._force_db_reload = False
+
+        # Rows grouped by employee for segment reductions, cached per version
+        self._segments = None
+
+        # Gallery partition rows, cached per (index version, partition version)
+        self._partition_rows: Dict[str, Tuple] = {}
+
+        self._reset_storage(self.INITIAL_CAPACITY)
+
+    def _reset_storage(self, capacity: int):
+        self._allocate_rows(capacity)
+        self._snapshot_mapped = False
+        self._size = 0
+        self._free_rows: List[int] = []
+
+        # template_id -> row, employee_id -> template ids, employee_id <-> code
+        self._row_by_template: Dict[int, int] = {}
+        self._templates_by_employee: Dict[str, set] = {}
+        self._employee_ids: List[str] = []
+        self._employee_code_by_id: Dict[str, int] = {}
+
+    def _allocate_rows(self, capacity: int):
+        # Row-aligned storage; rows [0, _size) are in use or free slots
+        self._matrix = np.zeros((capacity, self.dim), dtype=self.storage_dtype)
+        self._scales = np.ones(capacity, dtype=np.float32)
+        if self.storage_dtype == np.float32:
+            self._exact = self._matrix
+        elif self.rerank_top_k > 0:
+            self._exact = np.zeros((capacity, self.dim), dtype=np.float32)
+        else:
+            self._exact = None
+        self._template_ids = np.full(capacity, -1, dtype=np.int64)
+        self._employee_codes = np.zeros(capacity, dtype=np.int32)
+        self._alive = np.zeros(capacity, dtype=bool)
+
+    def _copy_rows(self, source_rows, target_rows, arrays: Tuple):
+        """Copy row data from the given (matrix, scales, exact, ids, codes, alive) arrays"""
+        matrix, scales, exact, template_ids, employee_codes, alive = arrays
+        self._matrix[target_rows] = matrix[source_rows]
+        self._scales[target_rows] = scales[source_rows]
+        if self._exact is not None and self._exact is not self._matrix:
+            self._exact[target_rows] = exact[source_rows]
+        self._template_ids[target_rows] = template_ids[source_rows]
+        self._employee_codes[target_rows] = employee_codes[source_rows]
+        self._alive[target_rows] = alive[source_rows]
+
+    def _row_arrays(self) -> Tuple:
+        return (self._matrix, self._scales, self._exact,
+                self._template_ids, self._employee_codes, self._alive)
+
+    def __len__(self) -> int:
+        return len(self._row_by_template)
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded
+
+    def invalidate(self):
+        """Drop the resident matrix so the next match reloads it from the database"""
+        with self._lock:
+            self._loaded = False
+            # The snapshot may be just as stale - rebuild from rows and republish
+            self._force_db_reload = True
+        logger.info("Template index invalidated")
+
+    def ensure_loaded(self, db: Session):
+        """
+        Make the index resident: map the shared snapshot if there is a usable one,
+        otherwise load from the database and publish a snapshot for other workers
+        """
+        if self._loaded:
+            self.refresh_snapshot()
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            if not self._force_db_reload and self._load_snapshot(db):
+                return
+            with self._snapshot_lock():
+                self.load_from_db(db)
+                self._publish_snapshot()
+            self._force_db_reload = False
+
+    def refresh_snapshot(self, force: bool = False) -> bool:
+        """
+        Catch up with other workers: replay new change-log records row by row,
+        or map a newer snapshot once one has been rewritten
+        Polls at most every TEMPLATE_SNAPSHOT_POLL_SECONDS unless forced
+
+        Returns: True if the index moved to a newer version
+        """
+        if self.snapshot_store is None:
+            return False
+        now = time.monotonic()
+        if not force and now - self._snapshot_checked_at < self.snapshot_poll_seconds:
+            return False
+        self._snapshot_checked_at = now
+
+        manifest = self.snapshot_store.read_manifest()
+        if not manifest:
+            return False
+        with self._lock:
+            if not self._loaded:
+                return False
+            if manifest.get("stale"):
+                # Committed changes are missing from the snapshot - rebuild from the database
+                self._loaded = False
+                self._force_db_reload = True
+                logger.warning(f"Template snapshot v{manifest['version']} is stale - reloading from database")
+                return False
+            previous_version = self.version
+            if manifest["version"] != self._base_version:
+                if not self._snapshot_compatible(manifest):
+                    return False
+                if manifest["version"] > self.version:
+                    self._adopt_snapshot(manifest)
+                else:
+                    # Rewrite of rows already replayed - just follow its change log
+                    self._base_version = manifest["version"]
+                    self._changes_offset = 0
+                    self._changes_since_base = 0
+            self._replay_changes(manifest)
+            return self.version != previous_version
+
+    def _replay_changes(self, manifest: Dict):
+        """Apply change-log records other workers appended since the last read"""
+        records, self._changes_offset = self.snapshot_store.read_changes(manifest, self._changes_offset)
+        records = [(version, changes) for version, changes in records if version > self.version]
+        if not records:
+            return
+
+        self._ensure_writable()
+        for version, changes in records:
+            self._apply_rows(changes)
+            self.version = version
+            self._changes_since_base += 1
+        self._maybe_compact()
+        if self.backend.needs_rebuild:
+            self._rebuild_backend()
+        logger.info(f"🔄 Template index replayed {len(records)} published change sets (version {self.version})")
+
+    def _snapshot_lock(self):
+        return self.snapshot_store.lock() if self.snapshot_store is not None else contextlib.nullcontext()
+
+    def _snapshot_compatible(self, manifest: Dict) -> bool:
+        """Snapshots written with other dim/storage settings are ignored"""
+        compatible = (
+            manifest.get("dim") == self.dim
+            and manifest.get("dtype") == str(self.storage_dtype)
+            and (self._exact_is_separate() is False or "exact" in manifest.get("arrays", ()))
+        )
+        if not compatible:
+            logger.info(f"Template snapshot v{manifest.get('version')} does not match index settings, ignoring")
+        return compatible
+
+    def _exact_is_separate(self) -> bool:
+        return self.storage_dtype != np.float32 and self.rerank_top_k > 0
+
+    def _load_snapshot(self, db: Session) -> bool:
+        """Cold start from the shared snapshot - no embedding scan"""
+        if self.snapshot_store is None:
+            return False
+        manifest = self.snapshot_store.read_manifest()
+        if not manifest or manifest.get("stale") or not self._snapshot_compatible(manifest):
+            return False
+
+        try:
+            self._adopt_snapshot(manifest)
+            self._replay_changes(manifest)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not map template snapshot v{manifest['version']}: {e}")
+            self._loaded = False
+            return False
+
+        # Cheap sanity check against writes made while no worker was running
+        database_count = db.query(FaceTemplate.id).count()
+        if database_count != len(self):
+            logger.info(f"Template snapshot v{self.version} has {len(self)} templates, "
+                        f"database has {database_count} - reloading from database")
+            self._loaded = False
+            return False
+        return True
+
+    def _adopt_snapshot(self, manifest: Dict):
+        """Point the index at a snapshot's memory-mapped arrays"""
+        arrays = self.snapshot_store.load(manifest)
+        count = int(manifest["templates"])
+
+        self._matrix = arrays["matrix"]
+        self._scales = arrays["scales"]
+        if self._exact_is_separate():
+            self._exact = arrays["exact"]
+        else:
+            self._exact = self._matrix if self.storage_dtype == np.float32 else None
+        self._template_ids = arrays["template_ids"]
+        self._employee_codes = arrays["employee_codes"]
+        self._alive = np.ones(count, dtype=bool)
+        self._size = count
+        self._free_rows = []
+
+        self._employee_ids = [str(employee_id) for employee_id in arrays["employee_ids"]]
+        self._employee_code_by_id = {employee_id: code for code, employee_id in enumerate(self._employee_ids)}
+        self._row_by_template = {}
+        self._templates_by_employee = {}
+        for row, (template_id, code) in enumerate(zip(self._template_ids.tolist(), self._employee_codes.tolist())):
+            self._row_by_template[template_id] = row
+            self._templates_by_employee.setdefault(self._employee_ids[code], set()).add(template_id)
+
+        self._rebuild_backend()
+        self._snapshot_mapped = True
+        self._loaded = True
+        self.version = manifest["version"]
+        self._base_version = manifest["version"]
+        self._changes_offset = 0
+        self._changes_since_base = 0
+        logger.info(f"✅ Template index mapped snapshot v{self.version}: {count} templates")
+
+    def _ensure_writable(self):
+        """Copy-on-write: move mapped snapshot arrays into private memory before mutating"""
+        if not self._snapshot_mapped:
+            return
+        self._grow(max(self.INITIAL_CAPACITY, len(self._template_ids)))
+        self._snapshot_mapped = False
+
+    def _publish_snapshot(self):
+        """Write the live rows as the next snapshot version (caller holds the snapshot lock)"""
+        if self.snapshot_store is None:
+            return
+        # Versions are global across workers
+        self.version = max(self.version, self.snapshot_store.latest_version() + 1)
+
+        alive_rows = np.flatnonzero(self._alive[:self._size])
+        arrays = {
+            "matrix": self._matrix[alive_rows],
+            "scales": self._scales[alive_rows],
+            "template_ids": self._template_ids[alive_rows],
+            "employee_codes": self._employee_codes[alive_rows],
+            "employee_ids": np.array(self._employee_ids, dtype=str)
+        }
+        if self._exact_is_separate():
+            arrays["exact"] = self._exact[alive_rows]
+
+        try:
+            self.snapshot_store.write(self.version, arrays, {
+                "templates": int(len(alive_rows)),
+                "dim": self.dim,
+                "dtype": str(self.storage_dtype)
+            })
+            self._base_version = self.version
+            self._changes_offset = 0
+            self._changes_since_base = 0
+        except OSError as e:
+            # Other workers keep their current version and reload on their own
+            logger.error(f"Failed to write template snapshot v{self.version}: {e}")
+
+    def load_from_db(self, db: Session):
+        """Full (re)load of the template matrix"""
+        rows = db.query(
+            FaceTemplate.id,
+            FaceTemplate.employee_id,
+            *embedding_query_columns(FaceTemplate)
+        ).yield_per(5000)
+        # Blobs decode zero-copy once the model has them; otherwise the legacy array
+        self.build((row[0], row[1], first_stored(row[2:])) for row in rows)
+
+    def build(self, rows: Iterable[Tuple[int, str, Iterable[float]]]):
+        """
+        Build the matrix from (template_id, employee_id, embedding) rows
+        embedding may be a float32 blob, an array or a list of floats
+        """
+        rows = list(rows)
+        with self._lock:
+            self._reset_storage(max(self.INITIAL_CAPACITY, len(rows)))
+            self._bulk_loading = True
+            try:
+                for template_id, employee_id, embedding in rows:
+                    self._upsert_row(template_id, employee_id, embedding)
+            finally:
+                self._bulk_loading = False
+            self._rebuild_backend()
+            self._loaded = True
+            self.version += 1
+
+        logger.info(f"✅ Template index loaded: {len(self)} templates, "
+                    f"{len(self._employee_code_by_id)} employees (version {self.version})")
+
+    def apply_changes(self, changes: List[Tuple]) -> int:
+        """
+        Apply row-level changes committed to the database
+
+        Each change is one of:
+            ("upsert", template_id, employee_id, embedding)
+            ("remove", template_id)
+            ("remove_employee", employee_id)
+
+        Changes are published to the shared snapshot even when this worker
+        has nothing resident - other workers may be serving from it
+
+        Returns: index version after the changes
+        """
+        with self._lock:
+            with self._snapshot_lock():
+                # Apply on top of whatever other workers have published meanwhile
+                self.refresh_snapshot(force=True)
+                if not self._loaded:
+                    # Nothing resident to update (or the snapshot went stale) -
+                    # the next ensure_loaded() reads fresh rows
+                    return self._publish_unloaded_changes(changes)
+                self._ensure_writable()
+                self._apply_rows(changes)
+
+                self._maybe_compact()
+                if self.backend.needs_rebuild:
+                    self._rebuild_backend()
+                self.version += 1
+                self._publish_changes(changes)
+
+            logger.info(f"🔄 Template index applied {len(changes)} changes (version {self.version})")
+            return self.version
+
+    def _apply_rows(self, changes: List[Tuple]):
+        for change in changes:
+            op = change[0]
+            if op == "upsert":
+                self._upsert_row(change[1], change[2], change[3])
+            elif op == "remove":
+                self._remove_row(change[1])
+            elif op == "remove_employee":
+                self._remove_employee(change[1])
+            else:
+                logger.warning(f"Unknown template index change: {op}")
+
+    def _publish_changes(self, changes: List[Tuple]):
+        """
+        Append this version's changes to the snapshot's change log (caller holds the snapshot lock)
+        The full snapshot is only rewritten every TEMPLATE_SNAPSHOT_MAX_CHANGES versions,
+        or when there is no snapshot to append to
+        """
+        if self.snapshot_store is None:
+            return
+        manifest = self.snapshot_store.read_manifest()
+        if (manifest is None or manifest["version"] != self._base_version
+                or self._changes_since_base >= self.snapshot_max_changes):
+            self._publish_snapshot()
+            return
+        try:
+            self._changes_offset += self.snapshot_store.append_changes(manifest, self.version, changes)
+            self._changes_since_base += 1
+        except OSError as e:
+            # Other workers miss this version until the next rewrite - force one
+            logger.error(f"Failed to append template changes v{self.version}: {e}")
+            self._changes_since_base = self.snapshot_max_changes
+
+    def _publish_unloaded_changes(self, changes: List[Tuple]) -> int:
+        """
+        Append changes committed by a worker without a resident index (caller holds the snapshot lock)
+        If they cannot be appended the snapshot is marked stale so readers reload from the database
+        """
+        if self.snapshot_store is None:
+            return self.version
+        manifest = self.snapshot_store.read_manifest()
+        if manifest is None or manifest.get("stale"):
+            # No usable snapshot - workers load fresh rows from the database anyway
+            return self.version
+        try:
+            version = self.snapshot_store.last_change_version(manifest) + 1
+            self.snapshot_store.append_changes(manifest, version, changes)
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Failed to append template changes to snapshot v{manifest['version']}: {e}")
+            try:
+                self.snapshot_store.mark_stale()
+            except OSError as stale_error:
+                logger.error(f"Failed to mark template snapshot stale: {stale_error}")
+            return self.version
+        logger.info(f"🔄 Published {len(changes)} template changes to snapshot change log (version {version})")
+        return version
+
+    def _rebuild_backend(self):
+        """Rebuild the ANN structure over all live rows"""
+        alive_rows = np.flatnonzero(self._alive[:self._size])
+        self.backend.rebuild(self._vectors(alive_rows), alive_rows)
+
+    def _vectors(self, rows) -> np.ndarray:
+        """Normalized float32 vectors for the given rows"""
+        if self._exact is not None:
+            return self._exact[rows]
+        return self._matrix[rows].astype(np.float32) * self._scales[rows, None]
+
+    def _encode(self, vector: np.ndarray) -> Tuple[np.ndarray, float]:
+        """Quantize a normalized vector into scan storage: (codes, scale)"""
+        if self.storage_dtype == np.int8:
+            peak = float(np.max(np.abs(vector)))
+            scale = peak / 127.0 if peak > 0 else 1.0
+            return np.rint(vector / scale).astype(np.int8), scale
+        return vector.astype(self.storage_dtype), 1.0
+
+    def _employee_code(self, employee_id: str) -> int:
+        code = self._employee_code_by_id.get(employee_id)
+        if code is None:
+            code = len(self._employee_ids)
+            self._employee_code_by_id[employee_id] = code
+            self._employee_ids.append(employee_id)
+        return code
+
+    def _allocate_row(self) -> int:
+        if self._free_rows:
+            return self._free_rows.pop()
+
+        if self._size == len(self._template_ids):
+            self._grow(max(self.INITIAL_CAPACITY, 2 * self._size))
+
+        row = self._size
+        self._size += 1
+        return row
+
+    def _grow(self, capacity: int):
+        """Double the row capacity - amortized O(1) per insert"""
+        old_rows = slice(0, len(self._template_ids))
+        old_arrays = self._row_arrays()
+        self._allocate_rows(capacity)
+        self._copy_rows(old_rows, old_rows, old_arrays)
+
+    def _upsert_row(self, template_id: int, employee_id: str, embedding) -> bool:
+        vector = as_embedding_array(embedding)
+        if vector is None or vector.shape[0] != self.dim:
+            logger.warning(f"Skipping template {template_id}: invalid embedding")
+            self._remove_row(template_id)
+            return False
+
+        norm = np.linalg.norm(vector)
+        vector = vector / norm if norm > 0 else np.zeros(self.dim, dtype=np.float32)
+
+        row = self._row_by_template.get(template_id)
+        if row is None:
+            row = self._allocate_row()
+            self._row_by_template[template_id] = row
+        else:
+            # Template may have been re-assigned to another employee
+            previous_employee = self._employee_ids[self._employee_codes[row]]
+            self._templates_by_employee.get(previous_employee, set()).discard(template_id)
+            if not self._bulk_loading:
+                self.backend.remove(row)
+
+        self._matrix[row], self._scales[row] = self._encode(vector)
+        if self._exact is not None and self._exact is not self._matrix:
+            self._exact[row] = vector
+        self._template_ids[row] = template_id
+        self._employee_codes[row] = self._employee_code(employee_id)
+        self._alive[row] = True
+        self._templates_by_employee.setdefault(employee_id, set()).add(template_id)
+        if not self._bulk_loading:
+            self.backend.add(row, vector)
+        return True
+
+    def _remove_row(self, template_id: int):
+        row = self._row_by_template.pop(template_id, None)
+        if row is None:
+            return
+
+        employee_id = self._employee_ids[self._employee_codes[row]]
+        self._templates_by_employee.get(employee_id, set()).discard(template_id)
+
+        # Zero rows score 0 and can never be the best match
+        self._matrix[row] = 0
+        if self._exact is not None:
+            self._exact[row] = 0.0
+        self._template_ids[row] = -1
+        self._alive[row] = False
+        self._free_rows.append(row)
+        if not self._bulk_loading:
+            self.backend.remove(row)
+
+    def _remove_employee(self, employee_id: str):
+        for template_id in list(self._templates_by_employee.pop(employee_id, ())):
+            self._remove_row(template_id)
+
+    def _maybe_compact(self):
+        """Rebuild dense storage once free slots dominate"""
+        if self._size < self.INITIAL_CAPACITY:
+            return
+        if len(self._free_rows) < self._size * self.COMPACT_FREE_RATIO:
+            return
+
+        # Move live rows down as stored - no re-quantization
+        alive_rows = np.flatnonzero(self._alive[:self._size])
+        count = len(alive_rows)
+        old_arrays = self._row_arrays()
+        self._allocate_rows(max(self.INITIAL_CAPACITY, count))
+        self._copy_rows(alive_rows, slice(0, count), old_arrays)
+
+        self._size = count
+        self._free_rows = []
+        self._row_by_template = {
+            int(template_id): row for row, template_id in enumerate(self._template_ids[:count])
+        }
+        self._rebuild_backend()
+        logger.info(f"Template index compacted to {count} rows")
+
+    def _prepare_query(self, query_embedding: np.ndarray) -> Optional[np.ndarray]:
+        query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        if query.shape[0] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dim query, got {query.shape[0]}")
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return None
+        return query / norm
+
+    def _candidate_rows(self, query: np.ndarray, size: int) -> Optional[np.ndarray]:
+        """Live rows proposed by the ANN backend, or None for a full scan"""
+        rows = self.backend.search(query, self.ann_top_k)
+        if rows is None:
+            return None
+        # Drop tombstoned graph entries and rows freed since they were indexed
+        rows = rows[rows < size]
+        return rows[self._alive[rows]]
+
+    def _scan_scores(self, query: np.ndarray, size: int) -> np.ndarray:
+        """
+        Scores for rows [0, size) from scan storage, top rows re-ranked in float32
+        query is one vector (dim,) or a column stack of queries (dim, Q)
+        """
+        if self._matrix.dtype == np.float32:
+            return self._matrix[:size] @ query
+
+        scores = np.empty((size,) + query.shape[1:], dtype=np.float32)
+        for start in range(0, size, self.SCORE_BLOCK_ROWS):
+            end = min(start + self.SCORE_BLOCK_ROWS, size)
+            scores[start:end] = self._matrix[start:end].astype(np.float32) @ query
+        scores *= self._scales[:size].reshape((size,) + (1,) * (query.ndim - 1))
+
+        if self.rerank_top_k > 0 and self._exact is not None:
+            k = min(self.rerank_top_k, size)
+            columns = scores.reshape(size, -1)
+            queries = query.reshape(self.dim, -1)
+            for column in range(columns.shape[1]):
+                top_rows = np.argpartition(columns[:, column], size - k)[size - k:]
+                columns[top_rows, column] = self._exact[top_rows] @ queries[:, column]
+        return scores
+
+    def _rows_for_partition(self, partition, size: int) -> np.ndarray:
+        """Live rows whose employee belongs to a gallery partition"""
+        key = (self.version, size, partition.version)
+        cached = self._partition_rows.get(partition.site_id)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        allowed = np.fromiter(
+            (partition.includes(employee_id) for employee_id in self._employee_ids),
+            dtype=bool, count=len(self._employee_ids)
+        )
+        rows = np.flatnonzero(self._alive[:size] & allowed[self._employee_codes[:size]])
+        self._partition_rows[partition.site_id] = (key, rows)
+        return rows
+
+    def _score(self, query: np.ndarray, use_ann: Optional[bool] = None, partition=None):
+        """
+        Exact cosine scores for the candidate rows
+
+        use_ann: None picks ANN only for galleries of at least ANN_MIN_TEMPLATES
+        partition: GalleryPartition to restrict the search to (exact scan of its rows)
+        Returns: (scores, employee_codes, template_ids, employee_ids) or None if empty
+        """
+        with self._lock:
+            size = self._size
+            if len(self._row_by_template) == 0:
+                return None
+
+            if partition is not None:
+                rows = self._rows_for_partition(partition, size)
+            else:
+                if use_ann is None:
+                    use_ann = len(self._row_by_template) >= self.ann_min_templates
+                rows = self._candidate_rows(query, size) if use_ann else None
+
+            if rows is None:
+                # One matrix-vector product for all templates
+                scores = self._scan_scores(query, size)
+                employee_codes = self._employee_codes[:size].copy()
+                template_ids = self._template_ids[:size].copy()
+            else:
+                # Exact scores for ANN candidates / partition rows
+                scores = self._vectors(rows) @ query
+                employee_codes = self._employee_codes[rows]
+                template_ids = self._template_ids[rows]
+            employee_ids = self._employee_ids
+
+        # Clamped like CosineSimilarityCalculator
+        np.clip(scores, 0.0, 1.0, out=scores)
+        return scores, employee_codes, template_ids, employee_ids
+
+    @staticmethod
+    def _best_match(scored) -> Optional[Tuple[int, str, float]]:
+        if scored is None or len(scored[0]) == 0:
+            return None
+        scores, employee_codes, template_ids, employee_ids = scored
+
+        # The best template also belongs to the best employee - no reduction needed for top-1
+        best_row = int(np.argmax(scores))
+        best_similarity = float(scores[best_row])
+        if best_similarity <= 0.0:
+            return None
+
+        return int(template_ids[best_row]), employee_ids[employee_codes[best_row]], best_similarity
+
+    def _employee_segments(self, size: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Rows [0, size) grouped by employee; rebuilt only when the index version changes"""
+        key = (self.version, size)
+        if self._segments is None or self._segments[0] != key:
+            self._segments = (key,) + group_segments(self._employee_codes[:size])
+        return self._segments[1:]
+
+    def top_employees(self, query_embedding: np.ndarray, k: int = 5) -> List[Tuple[str, float]]:
+        """
+        Employee-level top-k: per-employee max over that employee's templates
+        (vectorized segment max) followed by argpartition top-k
+
+        Returns: [(employee_id, similarity)] best first
+        """
+        query = self._prepare_query(query_embedding)
+        if query is None:
+            return []
+
+        with self._lock:
+            size = self._size
+            if len(self._row_by_template) == 0:
+                return []
+
+            use_ann = len(self._row_by_template) >= self.ann_min_templates
+            rows = self._candidate_rows(query, size) if use_ann else None
+
+            if rows is None:
+                order, starts, segment_codes = self._employee_segments(size)
+                scores = self._scan_scores(query, size)[order]
+            else:
+                order, starts, segment_codes = group_segments(self._employee_codes[rows])
+                scores = self._vectors(rows[order]) @ query
+            employee_ids = self._employee_ids
+
+        np.clip(scores, 0.0, 1.0, out=scores)
+        employee_best = segment_max(scores, starts)
+
+        return [
+            (employee_ids[segment_codes[i]], float(employee_best[i]))
+            for i in top_k_indices(employee_best, k)
+            if employee_best[i] > 0.0
+        ]
+
+    def match(self, query_embedding: np.ndarray, partition=None) -> Optional[Tuple[int, str, float]]:
+        """
+        Find the best matching template, optionally within a gallery partition
+
+        Returns: (template_id, employee_id, similarity) or None if nothing matches
+        """
+        query = self._prepare_query(query_embedding)
+        if query is None:
+            return None
+        return self._best_match(self._score(query, partition=partition))
+
+    def match_batch(self, query_embeddings, partition=None) -> List[Optional[Tuple[int, str, float]]]:
+        """
+        Best matching template for each of Q query embeddings
+
+        Queries are stacked into a Q x dim matrix and scored against all
+        templates (or the partition's rows) with one GEMM per MATCH_BATCH_QUERIES queries
+
+        Returns: one (template_id, employee_id, similarity) or None per query
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(-1, self.dim)
+        results: List[Optional[Tuple[int, str, float]]] = [None] * len(queries)
+
+        norms = np.linalg.norm(queries, axis=1)
+        positions = np.flatnonzero(norms > 0)
+        if len(positions) == 0:
+            return results
+        queries = queries[positions] / norms[positions, None]
+
+        if partition is None and self.backend.approximate and len(self) >= self.ann_min_templates:
+            # ANN candidates are per query - no shared GEMM to batch
+            for position, query in zip(positions, queries):
+                results[position] = self._best_match(self._score(query))
+            return results
+
+        for start in range(0, len(queries), self.MATCH_BATCH_QUERIES):
+            chunk = queries[start:start + self.MATCH_BATCH_QUERIES]
+            with self._lock:
+                size = self._size
+                if len(self._row_by_template) == 0:
+                    return results
+                # rows x queries
+                if partition is not None:
+                    rows = self._rows_for_partition(partition, size)
+                    scores = self._vectors(rows) @ chunk.T
+                    template_ids = self._template_ids[rows]
+                    employee_codes = self._employee_codes[rows]
+                else:
+                    scores = self._scan_scores(chunk.T, size)
+                    template_ids = self._template_ids[:size].copy()
+                    employee_codes = self._employee_codes[:size].copy()
+                employee_ids = self._employee_ids
+
+            if len(template_ids) == 0:
+                return results
+
+            # The best template also belongs to the best employee
+            best_rows = np.argmax(scores, axis=0)
+            best_scores = np.clip(scores[best_rows, np.arange(len(chunk))], 0.0, 1.0)
+
+            for position, row, similarity in zip(positions[start:start + len(chunk)], best_rows, best_scores):
+                if similarity <= 0.0:
+                    continue
+                results[position] = (
+                    int(template_ids[row]), employee_ids[employee_codes[row]], float(similarity)
+                )
+        return results
+
+    def measure_recall(self, sample_size: int = 200, noise: float = 0.3, seed: int = 0) -> Dict:
+        """
+        Compare ANN candidates against exact search on perturbed copies of stored templates
+
+        Returns: recall@1 of the final match, candidate recall and average latencies
+        """
+        with self._lock:
+            alive_rows = np.flatnonzero(self._alive[:self._size])
+            if len(alive_rows) == 0:
+                return {"backend": self.backend.name, "samples": 0}
+            rng = np.random.default_rng(seed)
+            sample_rows = rng.choice(alive_rows, size=min(sample_size, len(alive_rows)), replace=False)
+            base = self._vectors(sample_rows)
+
+        # Noise scaled so each query sits at a realistic distance from its template
+        queries = base + rng.standard_normal(base.shape).astype(np.float32) * (noise / np.sqrt(self.dim))
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+        matches = 0
+        candidate_hits = 0
+        exact_time = 0.0
+        ann_time = 0.0
+        for query in queries:
+            start = time.perf_counter()
+            exact = self._best_match(self._score(query, use_ann=False))
+            exact_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            approx = self._best_match(self._score(query, use_ann=True))
+            ann_time += time.perf_counter() - start
+
+            if exact is None:
+                matches += approx is None
+                candidate_hits += 1
+                continue
+            matches += approx is not None and approx[0] == exact[0]
+            with self._lock:
+                exact_row = self._row_by_template.get(exact[0])
+                candidates = self._candidate_rows(query, self._size)
+            candidate_hits += candidates is None or exact_row in candidates
+
+        samples = len(queries)
+        return {
+            "backend": self.backend.name,
+            "samples": samples,
+            "top_k": self.ann_top_k,
+            "recall_at_1": matches / samples,
+            "candidate_recall": candidate_hits / samples,
+            "avg_exact_ms": exact_time / samples * 1000,
+            "avg_ann_ms": ann_time / samples * 1000
+        }
+
+    def get_stats(self) -> Dict:
+        """Index size and memory usage"""
+        with self._lock:
+            return {
+                "loaded": self._loaded,
+                "version": self.version,
+                "templates": len(self._row_by_template),
+                "employees": sum(1 for ids in self._templates_by_employee.values() if ids),
+                "rows_allocated": self._size,
+                "free_rows": len(self._free_rows),
+                "dim": self.dim,
+                "dtype": str(self._matrix.dtype),
+                "matrix_bytes": int(self._matrix.nbytes + self._scales.nbytes),
+                "rerank_top_k": self.rerank_top_k,
+                "rerank_matrix_bytes": int(self._exact.nbytes) if self._exact is not None and self._exact is not self._matrix else 0,
+                "snapshot_enabled": self.snapshot_store is not None,
+                "snapshot_mapped": self._snapshot_mapped,
+                "backend": self.backend.name,
+                "backend_params": self.backend.get_params(),
+                "ann_top_k": self.ann_top_k,
+                "ann_min_templates": self.ann_min_templates
+            }
+
+# Singleton instance
+_template_index = None
+
+def get_template_index() -> TemplateIndex:
+    """Get process-wide template index"""
+    global _template_index
+    if _template_index is None:
+        _template_index = TemplateIndex()
+        # Keep the index in step with committed face_templates / employees writes
+        from app.services.template_index_sync import install_template_index_sync
+        install_template_index_sync()
+    return _template_index
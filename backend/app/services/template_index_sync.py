@@ -0,0 +1,144 @@
+"""
+Template Index Sync
+Change tracking that keeps the resident template index in step with
+committed writes to face_templates and employees
+"""
+import logging
+from typing import List, Tuple
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, attributes
+from app.models.face_template import FaceTemplate
+from app.models.employee import Employee
+from app.services.template_index import get_template_index
+from app.utils.embedding_codec import embedding_query_columns, first_stored, has_embedding_blob, stored_embedding
+
+logger = logging.getLogger(__name__)
+
+# Key in Session.info holding row changes of the current transaction
+PENDING_CHANGES_KEY = "template_index_changes"
+
+# Only these FaceTemplate columns affect the matrix (embedding_blob once the model has it)
+INDEXED_TEMPLATE_COLUMNS = tuple(
+    column for column in ("embedding_blob", "embedding_vector", "employee_id")
+    if column != "embedding_blob" or has_embedding_blob(FaceTemplate)
+)
+
+_installed = False
+
+def _pending_changes(session: Session) -> List[Tuple]:
+    return session.info.setdefault(PENDING_CHANGES_KEY, [])
+
+def _template_changed(template: FaceTemplate) -> bool:
+    """True if a dirty template changed a column the index cares about"""
+    return any(
+        attributes.get_history(template, column).has_changes()
+        for column in INDEXED_TEMPLATE_COLUMNS
+    )
+
+def _after_flush(session: Session, flush_context):
+    """Record FaceTemplate / Employee row changes written by this flush"""
+    changes = _pending_changes(session)
+
+    for obj in session.new:
+        if isinstance(obj, FaceTemplate):
+            changes.append(("upsert", obj.id, obj.employee_id, stored_embedding(obj)))
+
+    for obj in session.dirty:
+        # match_count / last_matched updates after every recognition are ignored here
+        if isinstance(obj, FaceTemplate) and _template_changed(obj):
+            changes.append(("upsert", obj.id, obj.employee_id, stored_embedding(obj)))
+
+    for obj in session.deleted:
+        if isinstance(obj, FaceTemplate):
+            changes.append(("remove", obj.id))
+        elif isinstance(obj, Employee):
+            changes.append(("remove_employee", obj.employee_id))
+
+def _do_orm_execute(orm_execute_state):
+    """
+    Record rows touched by bulk Query.delete()/update() statements,
+    which bypass the unit of work and never show up in after_flush
+    """
+    if not (orm_execute_state.is_delete or orm_execute_state.is_update):
+        return None
+
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ not in (FaceTemplate, Employee):
+        return None
+
+    session = orm_execute_state.session
+    statement = orm_execute_state.statement
+    whereclause = statement.whereclause
+    changes = _pending_changes(session)
+
+    if mapper.class_ is FaceTemplate:
+        if orm_execute_state.is_delete:
+            id_query = select(FaceTemplate.id)
+            if whereclause is not None:
+                id_query = id_query.where(whereclause)
+            template_ids = session.execute(id_query).scalars().all()
+
+            result = orm_execute_state.invoke_statement()
+            changes.extend(("remove", template_id) for template_id in template_ids)
+            return result
+
+        # Bulk update: re-read the affected rows inside the same transaction
+        id_query = select(FaceTemplate.id)
+        if whereclause is not None:
+            id_query = id_query.where(whereclause)
+        template_ids = session.execute(id_query).scalars().all()
+
+        result = orm_execute_state.invoke_statement()
+        if template_ids:
+            rows = session.execute(
+                select(
+                    FaceTemplate.id,
+                    FaceTemplate.employee_id,
+                    *embedding_query_columns(FaceTemplate)
+                ).where(FaceTemplate.id.in_(template_ids))
+            ).all()
+            changes.extend(("upsert", row[0], row[1], first_stored(row[2:])) for row in rows)
+        return result
+
+    if orm_execute_state.is_delete:
+        id_query = select(Employee.employee_id)
+        if whereclause is not None:
+            id_query = id_query.where(whereclause)
+        employee_ids = session.execute(id_query).scalars().all()
+
+        result = orm_execute_state.invoke_statement()
+        changes.extend(("remove_employee", employee_id) for employee_id in employee_ids)
+        return result
+
+    return None
+
+def _after_commit(session: Session):
+    """Apply the committed changes to the resident index"""
+    changes = session.info.pop(PENDING_CHANGES_KEY, None)
+    if not changes:
+        return
+
+    template_index = get_template_index()
+    try:
+        template_index.apply_changes(changes)
+    except Exception as e:
+        # Never leave a half-applied index behind - fall back to a full reload
+        logger.error(f"Failed to apply template index changes: {e}")
+        template_index.invalidate()
+
+def _after_rollback(session: Session):
+    """Rolled back writes never reach the index"""
+    session.info.pop(PENDING_CHANGES_KEY, None)
+
+def install_template_index_sync():
+    """Register the SQLAlchemy session listeners once per process"""
+    global _installed
+    if _installed:
+        return
+
+    event.listen(Session, "after_flush", _after_flush)
+    event.listen(Session, "do_orm_execute", _do_orm_execute)
+    event.listen(Session, "after_commit", _after_commit)
+    event.listen(Session, "after_rollback", _after_rollback)
+    _installed = True
+    logger.info("Template index change tracking installed")
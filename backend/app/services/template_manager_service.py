@@ -9,6 +9,7 @@ from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from app.models.face_template import FaceTemplate
 from app.models.employee import Employee
+from app.utils.embedding_codec import embedding_columns
 import logging
 
 logger = logging.getLogger(__name__)
@@ -75,7 +76,7 @@ class TemplateManagerService:
             template = FaceTemplate(
                 employee_id=employee_id,
                 image_id=image_id,
-                embedding_vector=embedding.tolist(),
+                **embedding_columns(FaceTemplate, embedding),
                 template_order=1,
                 created_from='ADMIN_UPLOAD',
                 quality_score=quality_score,
@@ -145,7 +146,7 @@ class TemplateManagerService:
             template = FaceTemplate(
                 employee_id=employee_id,
                 image_id=image_id,
-                embedding_vector=embedding.tolist(),
+                **embedding_columns(FaceTemplate, embedding),
                 template_order=template_order,
                 created_from='ATTENDANCE',
                 quality_score=quality_score,
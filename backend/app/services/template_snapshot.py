@@ -0,0 +1,206 @@
+"""
+Template Snapshot Store
+Versioned on-disk snapshot of the template index that every worker process
+memory-maps read-only, so all workers share one page-cache copy, plus an
+append-only change log so individual template writes publish O(changed rows)
+"""
+import os
+import json
+import base64
+import time
+import shutil
+import logging
+import contextlib
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from app.utils.embedding_codec import as_embedding_array, encode_embedding
+
+# Cross-process lock (POSIX only - Windows dev setups run a single worker)
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+class TemplateSnapshotStore:
+    """
+    Snapshot layout under EMBEDDINGS_CACHE_PATH:
+        template_index.json     manifest of the current version (swapped atomically)
+        template_index.lock     serializes writers across workers
+        v0000000042/*.npy       flat arrays: matrix, scales, template ids, employee table
+        v0000000042/changes.log row changes published on top of that version, one JSON line
+                                per version ({"version": 43, "changes": [...]})
+    """
+
+    MANIFEST_NAME = "template_index.json"
+    CHANGES_NAME = "changes.log"
+    LOCK_NAME = "template_index.lock"
+    KEEP_VERSIONS = 2
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._manifest = None
+        self._manifest_mtime = None
+
+    def read_manifest(self) -> Optional[Dict]:
+        """Current manifest; only re-parsed when the file changes"""
+        manifest_path = self.path / self.MANIFEST_NAME
+        try:
+            mtime = manifest_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+        if mtime != self._manifest_mtime:
+            try:
+                self._manifest = json.loads(manifest_path.read_text())
+                self._manifest_mtime = mtime
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read template snapshot manifest: {e}")
+                return None
+        return self._manifest
+
+    def latest_version(self) -> int:
+        manifest = self.read_manifest()
+        return manifest["version"] if manifest else 0
+
+    @contextlib.contextmanager
+    def lock(self):
+        """Exclusive writer lock shared by all worker processes"""
+        if not FCNTL_AVAILABLE:
+            yield
+            return
+        with open(self.path / self.LOCK_NAME, "a+") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def write(self, version: int, arrays: Dict[str, np.ndarray], meta: Dict) -> Dict:
+        """
+        Write a new snapshot version and publish it
+        Readers only ever see complete versions: arrays are written to a temp
+        directory that is renamed into place before the manifest is swapped
+        """
+        name = f"v{version:010d}"
+        temp_dir = self.path / f"{name}.tmp-{os.getpid()}"
+        target_dir = self.path / name
+
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        temp_dir.mkdir()
+        for key, array in arrays.items():
+            np.save(temp_dir / f"{key}.npy", np.ascontiguousarray(array), allow_pickle=False)
+        shutil.rmtree(target_dir, ignore_errors=True)
+        os.replace(temp_dir, target_dir)
+
+        manifest = {
+            "version": version,
+            "directory": name,
+            "arrays": list(arrays),
+            "created_at": time.time(),
+            **meta
+        }
+        temp_manifest = self.path / f"{self.MANIFEST_NAME}.tmp-{os.getpid()}"
+        temp_manifest.write_text(json.dumps(manifest))
+        os.replace(temp_manifest, self.path / self.MANIFEST_NAME)
+
+        self._cleanup()
+        logger.info(f"💾 Template snapshot v{version} written: {meta.get('templates', 0)} templates")
+        return manifest
+
+    def append_changes(self, manifest: Dict, version: int, changes: List[Tuple]) -> int:
+        """
+        Append one version's row changes to the snapshot's change log (caller holds the lock)
+        Returns: bytes written
+        """
+        record = json.dumps({"version": version, "changes": [_encode_change(change) for change in changes]})
+        data = (record + "\n").encode()
+        with open(self.path / manifest["directory"] / self.CHANGES_NAME, "ab") as log_file:
+            log_file.write(data)
+            log_file.flush()
+        return len(data)
+
+    def last_change_version(self, manifest: Dict) -> int:
+        """Version of the last complete change-log record, or the snapshot's own version"""
+        try:
+            data = (self.path / manifest["directory"] / self.CHANGES_NAME).read_bytes()
+        except FileNotFoundError:
+            return manifest["version"]
+        end = data.rfind(b"\n")
+        if end < 0:
+            return manifest["version"]
+        start = data.rfind(b"\n", 0, end) + 1
+        return json.loads(data[start:end])["version"]
+
+    def mark_stale(self):
+        """
+        Flag the current snapshot as missing committed changes (caller holds the lock)
+        Workers drop it and reload from the database; the next full write clears the flag
+        """
+        manifest = self.read_manifest()
+        if manifest is None:
+            return
+        temp_manifest = self.path / f"{self.MANIFEST_NAME}.tmp-{os.getpid()}"
+        temp_manifest.write_text(json.dumps({**manifest, "stale": True}))
+        os.replace(temp_manifest, self.path / self.MANIFEST_NAME)
+        logger.warning(f"⚠️ Template snapshot v{manifest['version']} marked stale")
+
+    def read_changes(self, manifest: Dict, offset: int) -> Tuple[List[Tuple[int, List[Tuple]]], int]:
+        """
+        Change records appended after byte offset; a line still being written is left for the next read
+        Returns: ([(version, changes)], new offset)
+        """
+        log_path = self.path / manifest["directory"] / self.CHANGES_NAME
+        try:
+            size = log_path.stat().st_size
+        except FileNotFoundError:
+            return [], offset
+        if size <= offset:
+            return [], offset
+
+        with open(log_path, "rb") as log_file:
+            log_file.seek(offset)
+            data = log_file.read(size - offset)
+        end = data.rfind(b"\n") + 1
+        records = []
+        for line in data[:end].splitlines():
+            record = json.loads(line)
+            records.append((record["version"], [_decode_change(change) for change in record["changes"]]))
+        return records, offset + end
+
+    def load(self, manifest: Dict) -> Dict[str, np.ndarray]:
+        """Memory-map every array of a snapshot read-only"""
+        directory = self.path / manifest["directory"]
+        # Empty arrays cannot be mapped
+        mmap_mode = "r" if manifest.get("templates") else None
+        return {
+            key: np.load(directory / f"{key}.npy", mmap_mode=mmap_mode, allow_pickle=False)
+            for key in manifest["arrays"]
+        }
+
+    def _cleanup(self):
+        """Drop old versions; workers still mapping them keep their open pages"""
+        versions = sorted(
+            entry for entry in self.path.iterdir()
+            if entry.is_dir() and entry.name.startswith("v") and ".tmp-" not in entry.name
+        )
+        for old_dir in versions[:-self.KEEP_VERSIONS]:
+            # Fails on Windows while another process has the files mapped - retried next write
+            shutil.rmtree(old_dir, ignore_errors=True)
+
+def _encode_change(change: Tuple) -> list:
+    """JSON form of an index change; upsert embeddings travel as base64 float32"""
+    if change[0] == "upsert":
+        vector = as_embedding_array(change[3])
+        embedding = base64.b64encode(encode_embedding(vector)).decode() if vector is not None else None
+        return ["upsert", int(change[1]), change[2], embedding]
+    return list(change)
+
+def _decode_change(change: list) -> Tuple:
+    if change[0] == "upsert" and change[3] is not None:
+        return ("upsert", change[1], change[2], base64.b64decode(change[3]))
+    return tuple(change)
@@ -0,0 +1,104 @@
+"""
+Utility functions for binary embedding storage
+Embeddings are stored as little-endian float32 blobs (bytea) with their
+dimension and the model version that produced them
+"""
+import numpy as np
+from typing import Dict, List, Optional, Sequence
+from sqlalchemy import Column, Integer, LargeBinary, String
+
+EMBEDDING_DTYPE = np.dtype("<f4")
+DEFAULT_MODEL_VERSION = "buffalo_l"
+
+def encode_embedding(vector) -> bytes:
+    """Serialize an embedding to a float32 blob"""
+    return np.ascontiguousarray(vector, dtype=EMBEDDING_DTYPE).reshape(-1).tobytes()
+
+def decode_embedding(blob, dim: Optional[int] = None) -> np.ndarray:
+    """
+    Zero-copy read-only float32 view over a stored blob
+    Copy the result before modifying it in place
+    """
+    vector = np.frombuffer(blob, dtype=EMBEDDING_DTYPE)
+    if dim is not None and vector.shape[0] != dim:
+        raise ValueError(f"Embedding blob has {vector.shape[0]} values, expected {dim}")
+    return vector
+
+def as_embedding_array(embedding) -> Optional[np.ndarray]:
+    """float32 vector from a blob, numpy array or legacy list of floats"""
+    if embedding is None:
+        return None
+    if isinstance(embedding, (bytes, bytearray, memoryview)):
+        return decode_embedding(embedding)
+    return np.asarray(embedding, dtype=np.float32).reshape(-1)
+
+def has_embedding_blob(model) -> bool:
+    """True once the model (class or instance) declares EmbeddingBlobMixin's columns"""
+    return hasattr(model, "embedding_blob")
+
+def embedding_columns(model, vector) -> Dict:
+    """
+    Column values that store an embedding on FaceTemplate / FaceEmbedding
+    The legacy embedding_vector array is always written; the float32 blob is
+    written as well once the model declares EmbeddingBlobMixin
+    """
+    values = {"embedding_vector": np.asarray(vector, dtype=np.float32).reshape(-1).tolist()}
+    if has_embedding_blob(model):
+        blob = encode_embedding(vector)
+        values.update(
+            embedding_blob=blob,
+            embedding_dim=len(blob) // EMBEDDING_DTYPE.itemsize,
+            model_version=DEFAULT_MODEL_VERSION
+        )
+    return values
+
+def store_embedding(obj, vector):
+    """Write an embedding onto an existing FaceTemplate / FaceEmbedding row"""
+    for column, value in embedding_columns(obj, vector).items():
+        setattr(obj, column, value)
+
+def embedding_query_columns(model) -> List:
+    """Stored embedding columns to select, preferred first (blob only once the model has it)"""
+    if has_embedding_blob(model):
+        return [model.embedding_blob, model.embedding_vector]
+    return [model.embedding_vector]
+
+def first_stored(values: Sequence):
+    """First non-NULL of the values selected with embedding_query_columns()"""
+    return next((value for value in values if value is not None), None)
+
+def stored_embedding(obj):
+    """Stored embedding of a row - blob when present, else the legacy array"""
+    return first_stored([getattr(obj, "embedding_blob", None), obj.embedding_vector])
+
+class EmbeddingBlobMixin:
+    """
+    Binary embedding columns and accessors for FaceTemplate / FaceEmbedding
+    - embedding_blob:  float32 bytes, written next to the ARRAY(Float) embedding_vector
+    - embedding_dim:   vector length, checked on decode
+    - model_version:   recognition model that produced the embedding
+    Until the legacy array is dropped, writers store both (embedding_columns());
+    rows without a blob fall back to embedding_vector
+    No model declares it yet: the migration adding and backfilling these columns
+    ships together with the model change, so the blob never exists unread
+    """
+
+    embedding_blob = Column(LargeBinary, nullable=True)
+    embedding_dim = Column(Integer, nullable=True)
+    model_version = Column(String(50), nullable=True)
+
+    @property
+    def embedding(self) -> Optional[np.ndarray]:
+        """Read-only float32 view of the stored embedding"""
+        if self.embedding_blob is not None:
+            return decode_embedding(self.embedding_blob, self.embedding_dim)
+        return as_embedding_array(getattr(self, "embedding_vector", None))
+
+    @embedding.setter
+    def embedding(self, vector):
+        self.set_embedding(vector)
+
+    def set_embedding(self, vector, model_version: str = DEFAULT_MODEL_VERSION):
+        """Store an embedding as a float32 blob and in the legacy array"""
+        store_embedding(self, vector)
+        self.model_version = model_version
@@ -0,0 +1,61 @@
+"""
+Image decoding utilities
+Large kiosk JPEGs are decoded directly at 1/2 or 1/4 scale: libjpeg scales
+the DCT blocks while decoding, so it never materializes the full-size frame
+"""
+import struct
+from typing import Optional, Tuple
+import numpy as np
+import cv2
+
+REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4
+}
+
+# Start-of-frame markers (baseline, progressive, lossless, arithmetic variants)
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+def jpeg_dimensions(data: bytes) -> Optional[Tuple[int, int]]:
+    """(width, height) read from the JPEG frame header; None if data is not a JPEG"""
+    if data[:2] != b"\xff\xd8":
+        return None
+    pos = 2
+    while pos + 9 <= len(data):
+        if data[pos] != 0xFF:
+            pos += 1
+            continue
+        marker = data[pos + 1]
+        if marker == 0xFF or marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # Fill byte / markers without a length field
+            pos += 1 if marker == 0xFF else 2
+            continue
+        if marker in _SOF_MARKERS:
+            height, width = struct.unpack(">HH", data[pos + 5:pos + 9])
+            return width, height
+        pos += 2 + struct.unpack(">H", data[pos + 2:pos + 4])[0]
+    return None
+
+def reduced_decode_factor(width: int, height: int, target_side: int) -> int:
+    """Largest of 4 / 2 / 1 that keeps the longer side at or above target_side"""
+    for factor in (4, 2):
+        if max(width, height) // factor >= target_side:
+            return factor
+    return 1
+
+def decode_image(data: bytes, target_side: int = 0) -> Tuple[Optional[np.ndarray], int]:
+    """
+    Decode uploaded image bytes to BGR
+    Args:
+        data: Encoded image (JPEG gets reduced decoding, other formats decode at full size)
+        target_side: Minimum longer side to keep; 0 decodes at full resolution
+    Returns: (image or None if undecodable, reduction factor applied)
+    """
+    factor = 1
+    if target_side:
+        dimensions = jpeg_dimensions(data)
+        if dimensions is not None:
+            factor = reduced_decode_factor(*dimensions, target_side)
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), REDUCED_DECODE_FLAGS[factor])
+    return image, factor
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Tests import the backend as the app package, like uvicorn does from backend/
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
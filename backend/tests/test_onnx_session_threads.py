@@ -0,0 +1,44 @@
+"""
+InsightFace models get their sessions rebuilt with the instance's thread budget
+(the model zoo drops sess_options, so FaceAnalysis alone would use every core)
+"""
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+onnx = pytest.importorskip("onnx")
+ort = pytest.importorskip("onnxruntime")
+
+from app.services.onnx_models import rebind_sessions
+
+def _identity_model(path):
+    """Smallest valid graph standing in for SCRFD / ArcFace"""
+    tensor = onnx.helper.make_tensor_value_info("input.1", onnx.TensorProto.FLOAT, [1, 3, 4, 4])
+    output = onnx.helper.make_tensor_value_info("output", onnx.TensorProto.FLOAT, [1, 3, 4, 4])
+    graph = onnx.helper.make_graph([onnx.helper.make_node("Identity", ["input.1"], ["output"])], "identity", [tensor], [output])
+    model = onnx.helper.make_model(graph, opset_imports=[onnx.helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, str(path))
+    return path
+
+def test_rebind_sessions_applies_thread_budget(tmp_path):
+    model_file = _identity_model(tmp_path / "det_10g.onnx")
+    default_session = ort.InferenceSession(str(model_file), providers=["CPUExecutionProvider"])
+    models = {
+        "detection": SimpleNamespace(model_file=str(model_file), session=default_session),
+        "recognition": SimpleNamespace(model_file=str(model_file), session=default_session)
+    }
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = 2
+    options.inter_op_num_threads = 1
+
+    assert rebind_sessions(models, options) == 2
+    for model in models.values():
+        assert model.session is not default_session
+        assert model.session.get_session_options().intra_op_num_threads == 2
+        assert model.session.get_inputs()[0].name == "input.1"
+
+def test_rebind_sessions_skips_models_without_session(tmp_path):
+    models = {"landmark": SimpleNamespace(model_file=None, session=None)}
+    assert rebind_sessions(models, ort.SessionOptions()) == 0
@@ -0,0 +1,75 @@
+"""
+Template index changes published through the shared snapshot reach workers
+that serve from it, including changes committed by a worker that never loaded
+"""
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.config.multi_kiosk_config_fixed import multi_kiosk_settings
+from app.services.template_index import TemplateIndex
+
+DIM = 8
+
+def _vector(seed: int) -> "np.ndarray":
+    vector = np.random.default_rng(seed).standard_normal(DIM).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+@pytest.fixture
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(multi_kiosk_settings, "EMBEDDINGS_CACHE_PATH", str(tmp_path))
+    monkeypatch.setattr(multi_kiosk_settings, "TEMPLATE_SNAPSHOT_ENABLED", True)
+    monkeypatch.setattr(multi_kiosk_settings, "MATCHER_BACKEND", "exact")
+    monkeypatch.setattr(multi_kiosk_settings, "INDEX_STORAGE_DTYPE", "float32")
+    return tmp_path
+
+def _serving_reader() -> TemplateIndex:
+    """Worker serving from a published snapshot of templates 1 (E1) and 2 (E2)"""
+    reader = TemplateIndex(dim=DIM)
+    reader.build([(1, "E1", _vector(1)), (2, "E2", _vector(2))])
+    with reader._snapshot_lock():
+        reader._publish_snapshot()
+    return reader
+
+def test_unloaded_writer_changes_reach_snapshot_readers(snapshot_dir):
+    reader = _serving_reader()
+    writer = TemplateIndex(dim=DIM)
+    assert not writer.is_loaded  # never calls ensure_loaded()
+
+    writer.apply_changes([("remove_employee", "E1"), ("upsert", 3, "E3", _vector(3))])
+    writer.apply_changes([("upsert", 2, "E2", _vector(4))])
+
+    assert reader.refresh_snapshot(force=True)
+    assert len(reader) == 2
+    assert reader.match(_vector(1))[1] != "E1"
+    assert reader.match(_vector(3))[:2] == (3, "E3")
+    template_id, employee_id, similarity = reader.match(_vector(4))
+    assert (template_id, employee_id) == (2, "E2")
+    assert similarity == pytest.approx(1.0, abs=1e-5)
+
+def test_loaded_writer_continues_unloaded_writer_versions(snapshot_dir):
+    reader = _serving_reader()
+    TemplateIndex(dim=DIM).apply_changes([("remove", 1)])
+
+    reader.apply_changes([("upsert", 5, "E5", _vector(5))])
+
+    # Cold start of another worker: map the snapshot and replay its change log
+    late = TemplateIndex(dim=DIM)
+    manifest = late.snapshot_store.read_manifest()
+    late._adopt_snapshot(manifest)
+    late._replay_changes(manifest)
+    assert late.version == reader.version
+    assert sorted(late._row_by_template) == [2, 5]
+
+def test_failed_append_marks_snapshot_stale(snapshot_dir, monkeypatch):
+    reader = _serving_reader()
+    writer = TemplateIndex(dim=DIM)
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+    monkeypatch.setattr(writer.snapshot_store, "append_changes", fail)
+    writer.apply_changes([("remove", 1)])
+
+    assert reader.snapshot_store.read_manifest().get("stale")
+    assert not reader.refresh_snapshot(force=True)
+    assert not reader.is_loaded